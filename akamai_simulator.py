@@ -0,0 +1,727 @@
+import io
+import re
+import json
+import gzip
+import time
+import random
+import socket
+import tarfile
+import argparse
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from harper_standin import parse_latency_spec
+
+
+# ============================================================
+# SIMULATED DEFAULTS
+# ============================================================
+DEFAULT_RULE_TREE_PATH = "data/rule.json"
+
+
+def load_default_rules(path=DEFAULT_RULE_TREE_PATH):
+    """data/rule.json holds the body of a rules document ("rules": {...})."""
+    with open(path, "r") as f:
+        text = f.read().strip()
+    if not text.startswith("{"):
+        text = "{" + text + "}"
+    return json.loads(text)["rules"]
+
+
+def strip_prefix(value, prefix):
+    return str(value or "").replace(prefix, "")
+
+
+# ============================================================
+# STATE
+# ============================================================
+class SimulatorState:
+    """
+    In-memory PAPI / GTM / EdgeWorkers account. Activations complete after
+    activation_delay seconds; GTM propagation after gtm_propagation_polls
+    status reads.
+    """
+
+    def __init__(self, default_rules, activation_delay=0.0, gtm_propagation_polls=0):
+        self.lock = threading.Lock()
+        self.default_rules = default_rules
+        self.activation_delay = activation_delay
+        self.gtm_propagation_polls = gtm_propagation_polls
+
+        self.properties = {}
+        self.cpcodes = {}
+        self.activations = {}
+        self.gtm_domains = {}
+        self.edgeworkers = {}
+        self.next_id = 100000
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    # ---------------- PAPI ----------------
+    def add_property(self, name, contractId, groupId, productId="prd_SPM", rules=None, hostnames=()):
+        pid = f"prp_{self.new_id()}"
+        self.properties[pid] = {
+            "propertyId": pid,
+            "propertyName": name,
+            "contractId": f"ctr_{strip_prefix(contractId, 'ctr_')}",
+            "groupId": f"grp_{strip_prefix(groupId, 'grp_')}",
+            "productId": productId,
+            "versions": {
+                1: {
+                    "rules": json.loads(json.dumps(rules or self.default_rules)),
+                    "hostnames": [new_hostname(h, added=0) for h in hostnames],
+                    "etag": f"etag-{pid}-1"
+                }
+            }
+        }
+        return pid
+
+    def active_version(self, prop, network):
+        """Latest ACTIVE activation on a network (evaluated lazily)."""
+        now = time.time()
+        best = None
+        for act in self.activations.values():
+            if act["propertyId"] == prop["propertyId"] and act["network"] == network \
+                    and now - act["created"] >= self.activation_delay:
+                if best is None or act["created"] >= best["created"]:
+                    best = act
+        return best["propertyVersion"] if best else None
+
+    def version_status(self, prop, version, network):
+        if self.active_version(prop, network) == version:
+            return "ACTIVE"
+        for act in self.activations.values():
+            if act["propertyId"] == prop["propertyId"] and act["network"] == network \
+                    and act["propertyVersion"] == version and self.activation_status(act) == "PENDING":
+                return "PENDING"
+        return "INACTIVE"
+
+    def version_item(self, prop, version):
+        return {
+            "propertyVersion": version,
+            "etag": prop["versions"][version]["etag"],
+            "productId": prop["productId"],
+            "stagingStatus": self.version_status(prop, version, "STAGING"),
+            "productionStatus": self.version_status(prop, version, "PRODUCTION")
+        }
+
+    def activation_status(self, act):
+        return "ACTIVE" if time.time() - act["created"] >= self.activation_delay else "PENDING"
+
+    # ---------------- GTM ----------------
+    def gtm_status(self, domain):
+        dom = self.gtm_domains[domain]
+        dom["statusPolls"] += 1
+        return "COMPLETE" if dom["statusPolls"] > self.gtm_propagation_polls else "PENDING"
+
+
+# ============================================================
+# ROUTES
+# ============================================================
+ROUTES = []
+
+
+def route(method, pattern, template):
+    def register(fn):
+        ROUTES.append((method, re.compile(pattern + r"$"), template, fn))
+        return fn
+    return register
+
+
+def not_found(what):
+    return 404, {"type": "not_found", "title": "Not Found", "detail": f"{what} not found"}
+
+
+# ---------------- PAPI: properties ----------------
+@route("GET", r"/papi/v1/properties", "/papi/v1/properties")
+def list_properties(state, m, query, body):
+    contract = strip_prefix(query.get("contractId"), "ctr_")
+    group = strip_prefix(query.get("groupId"), "grp_")
+
+    items = []
+    for p in state.properties.values():
+        if contract and strip_prefix(p["contractId"], "ctr_") != contract:
+            continue
+        if group and strip_prefix(p["groupId"], "grp_") != group:
+            continue
+        items.append({
+            "propertyId": p["propertyId"],
+            "propertyName": p["propertyName"],
+            "contractId": p["contractId"],
+            "groupId": p["groupId"],
+            "latestVersion": max(p["versions"]),
+            "stagingVersion": state.active_version(p, "STAGING"),
+            "productionVersion": state.active_version(p, "PRODUCTION")
+        })
+    return 200, {"properties": {"items": items}}
+
+
+@route("POST", r"/papi/v1/properties", "/papi/v1/properties")
+def create_property(state, m, query, body):
+    name = body.get("propertyName")
+    if any(p["propertyName"] == name for p in state.properties.values()):
+        return 400, {"type": "property-name-exists", "title": "Property name already exists", "detail": name}
+
+    pid = state.add_property(name, query.get("contractId"), query.get("groupId"), body.get("productId", "prd_SPM"))
+    return 201, {"propertyLink": f"/papi/v1/properties/{pid}?contractId={query.get('contractId')}&groupId={query.get('groupId')}"}
+
+
+@route("GET", r"/papi/v1/properties/(prp_\d+)", "/papi/v1/properties/{propertyId}")
+def get_property(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    if not p:
+        return not_found("property")
+    return 200, {"properties": {"items": [{
+        "propertyId": p["propertyId"],
+        "propertyName": p["propertyName"],
+        "contractId": p["contractId"],
+        "groupId": p["groupId"],
+        "latestVersion": max(p["versions"]),
+        "stagingVersion": state.active_version(p, "STAGING"),
+        "productionVersion": state.active_version(p, "PRODUCTION")
+    }]}}
+
+
+# ---------------- PAPI: versions ----------------
+@route("GET", r"/papi/v1/properties/(prp_\d+)/versions", "/papi/v1/properties/{propertyId}/versions")
+def list_versions(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    if not p:
+        return not_found("property")
+    items = [state.version_item(p, v) for v in sorted(p["versions"], reverse=True)]
+    return 200, {"propertyId": p["propertyId"], "versions": {"items": items}}
+
+
+@route("GET", r"/papi/v1/properties/(prp_\d+)/versions/latest", "/papi/v1/properties/{propertyId}/versions/latest")
+def latest_version(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    if not p:
+        return not_found("property")
+
+    network = query.get("activatedOn")
+    version = state.active_version(p, network.upper()) if network else max(p["versions"])
+    if version is None:
+        return not_found(f"{network} version")
+
+    return 200, {"propertyId": p["propertyId"], "versions": {"items": [state.version_item(p, version)]}}
+
+
+@route("POST", r"/papi/v1/properties/(prp_\d+)/versions", "/papi/v1/properties/{propertyId}/versions")
+def create_version(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    if not p:
+        return not_found("property")
+
+    base = int(body.get("createFromVersion", max(p["versions"])))
+    if base not in p["versions"]:
+        return not_found(f"version {base}")
+
+    new_version = max(p["versions"]) + 1
+    source = p["versions"][base]
+    p["versions"][new_version] = {
+        "rules": json.loads(json.dumps(source["rules"])),
+        "hostnames": list(source["hostnames"]),
+        "etag": f"etag-{p['propertyId']}-{new_version}"
+    }
+    return 201, {"versionLink": f"/papi/v1/properties/{p['propertyId']}/versions/{new_version}?contractId={p['contractId']}"}
+
+
+# ---------------- PAPI: rules ----------------
+def rules_document(p, version):
+    v = p["versions"][version]
+    return {
+        "accountId": "act_SIMULATOR",
+        "contractId": p["contractId"],
+        "groupId": p["groupId"],
+        "propertyId": p["propertyId"],
+        "propertyName": p["propertyName"],
+        "propertyVersion": version,
+        "etag": v["etag"],
+        "ruleFormat": "latest",
+        "rules": v["rules"]
+    }
+
+
+@route("GET", r"/papi/v1/properties/(prp_\d+)/versions/(\d+)/rules", "/papi/v1/properties/{propertyId}/versions/{version}/rules")
+def get_rules(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    if not p or int(m.group(2)) not in p["versions"]:
+        return not_found("property version")
+    return 200, rules_document(p, int(m.group(2)))
+
+
+@route("PUT", r"/papi/v1/properties/(prp_\d+)/versions/(\d+)/rules", "/papi/v1/properties/{propertyId}/versions/{version}/rules")
+def put_rules(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    version = int(m.group(2))
+    if not p or version not in p["versions"]:
+        return not_found("property version")
+    if not isinstance(body, dict) or "rules" not in body:
+        return 400, {"type": "invalid-rules", "title": "Body must contain rules"}
+
+    v = p["versions"][version]
+    v["rules"] = body["rules"]
+    v["etag"] = f"etag-{p['propertyId']}-{version}-{state.new_id()}"
+    return 200, rules_document(p, version)
+
+
+# ---------------- PAPI: hostnames ----------------
+def new_hostname(h, added=None):
+    return dict(h, added=time.time() if added is None else added)
+
+
+def hostnames_document(state, p, version, query):
+    """certStatus only with includeCertStatus; a new DEFAULT cert deploys after activation_delay."""
+    items = []
+    for h in p["versions"][version]["hostnames"]:
+        item = {k: v for k, v in h.items() if k != "added"}
+        if query.get("includeCertStatus") == "true":
+            status = "DEPLOYED" if time.time() - h["added"] >= state.activation_delay else "PENDING"
+            item["certStatus"] = {"staging": [{"status": status}], "production": [{"status": status}]}
+        items.append(item)
+    return {"propertyId": p["propertyId"], "propertyVersion": version, "hostnames": {"items": items}}
+
+
+@route("GET", r"/papi/v1/properties/(prp_\d+)/versions/(\d+)/hostnames", "/papi/v1/properties/{propertyId}/versions/{version}/hostnames")
+def get_hostnames(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    if not p or int(m.group(2)) not in p["versions"]:
+        return not_found("property version")
+    return 200, hostnames_document(state, p, int(m.group(2)), query)
+
+
+@route("PUT", r"/papi/v1/properties/(prp_\d+)/versions/(\d+)/hostnames", "/papi/v1/properties/{propertyId}/versions/{version}/hostnames")
+def put_hostnames(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    version = int(m.group(2))
+    if not p or version not in p["versions"]:
+        return not_found("property version")
+
+    p["versions"][version]["hostnames"] = [new_hostname(h) for h in (body or [])]
+    return 200, hostnames_document(state, p, version, query)
+
+
+@route("PATCH", r"/papi/v1/properties/(prp_\d+)/versions/(\d+)/hostnames", "/papi/v1/properties/{propertyId}/versions/{version}/hostnames")
+def patch_hostnames(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    version = int(m.group(2))
+    if not p or version not in p["versions"]:
+        return not_found("property version")
+
+    remove = {name.lower() for name in body.get("remove", [])}
+    kept = [h for h in p["versions"][version]["hostnames"] if h["cnameFrom"].lower() not in remove]
+    existing = {h["cnameFrom"].lower() for h in kept}
+
+    duplicates = [h["cnameFrom"] for h in body.get("add", []) if h["cnameFrom"].lower() in existing]
+    if duplicates:
+        return 400, {"type": "duplicate-hostnames", "title": "Hostnames already on the property",
+                     "detail": ", ".join(duplicates)}
+
+    p["versions"][version]["hostnames"] = kept + [new_hostname(h) for h in body.get("add", [])]
+    return 200, hostnames_document(state, p, version, query)
+
+
+# ---------------- PAPI: cpcodes ----------------
+@route("GET", r"/papi/v1/cpcodes", "/papi/v1/cpcodes")
+def list_cpcodes(state, m, query, body):
+    contract = strip_prefix(query.get("contractId", ""), "ctr_")
+    group = strip_prefix(query.get("groupId", ""), "grp_")
+    items = [c for c in state.cpcodes.values()
+             if strip_prefix(c["contractId"] or "", "ctr_") == contract
+             and strip_prefix(c["groupId"] or "", "grp_") == group]
+    return 200, {"cpcodes": {"items": items}}
+
+
+@route("POST", r"/papi/v1/cpcodes", "/papi/v1/cpcodes")
+def create_cpcode(state, m, query, body):
+    cid = f"cpc_{state.new_id()}"
+    state.cpcodes[cid] = {
+        "cpcodeId": cid,
+        "cpcodeName": body.get("cpcodeName"),
+        "productIds": [body.get("productId")],
+        "contractId": query.get("contractId"),
+        "groupId": query.get("groupId")
+    }
+    return 201, {"cpcodeLink": f"/papi/v1/cpcodes/{cid}?contractId={query.get('contractId')}&groupId={query.get('groupId')}"}
+
+
+# ---------------- PAPI: activations ----------------
+def activation_view(state, act):
+    return {
+        "activationId": act["activationId"],
+        "propertyId": act["propertyId"],
+        "propertyVersion": act["propertyVersion"],
+        "network": act["network"],
+        "status": state.activation_status(act),
+        "note": act.get("note", "")
+    }
+
+
+@route("POST", r"/papi/v1/properties/(prp_\d+)/activations", "/papi/v1/properties/{propertyId}/activations")
+def activate(state, m, query, body):
+    p = state.properties.get(m.group(1))
+    if not p:
+        return not_found("property")
+
+    version = int(body.get("propertyVersion", 0))
+    if version not in p["versions"]:
+        return 400, {"type": "invalid-version", "title": f"Version {version} does not exist"}
+
+    aid = f"atv_{state.new_id()}"
+    state.activations[aid] = {
+        "activationId": aid,
+        "propertyId": p["propertyId"],
+        "propertyVersion": version,
+        "network": str(body.get("network", "STAGING")).upper(),
+        "note": body.get("note", ""),
+        "created": time.time()
+    }
+    return 201, {"activationLink": f"/papi/v1/properties/{p['propertyId']}/activations/{aid}"}
+
+
+@route("GET", r"/papi/v1/properties/(prp_\d+)/activations", "/papi/v1/properties/{propertyId}/activations")
+def list_activations(state, m, query, body):
+    items = [activation_view(state, a) for a in state.activations.values() if a["propertyId"] == m.group(1)]
+    return 200, {"activations": {"items": items}}
+
+
+@route("GET", r"/papi/v1/properties/(prp_\d+)/activations/(atv_\d+)", "/papi/v1/properties/{propertyId}/activations/{activationId}")
+def get_activation(state, m, query, body):
+    act = state.activations.get(m.group(2))
+    if not act or act["propertyId"] != m.group(1):
+        return not_found("activation")
+    return 200, {"activations": {"items": [activation_view(state, act)]}}
+
+
+# ---------------- GTM ----------------
+GTM_DOMAIN = r"/config-gtm/v1/domains/([^/]+)"
+
+
+@route("GET", GTM_DOMAIN, "/config-gtm/v1/domains/{domain}")
+def get_gtm_domain(state, m, query, body):
+    dom = state.gtm_domains.get(m.group(1))
+    if not dom:
+        return not_found("domain")
+    return 200, dict(dom["config"], datacenters=list(dom["datacenters"].values()),
+                     properties=list(dom["properties"].values()))
+
+
+@route("POST", r"/config-gtm/v1/domains", "/config-gtm/v1/domains")
+def create_gtm_domain(state, m, query, body):
+    name = body.get("name")
+    if name in state.gtm_domains:
+        return 409, {"title": "Domain already exists"}
+    state.gtm_domains[name] = {"config": body, "datacenters": {}, "properties": {}, "statusPolls": 0}
+    return 201, {"resource": body, "status": {"propagationStatus": "PENDING"}}
+
+
+@route("GET", GTM_DOMAIN + r"/datacenters", "/config-gtm/v1/domains/{domain}/datacenters")
+def list_gtm_datacenters(state, m, query, body):
+    dom = state.gtm_domains.get(m.group(1))
+    if not dom:
+        return not_found("domain")
+    return 200, {"items": list(dom["datacenters"].values())}
+
+
+@route("POST", GTM_DOMAIN + r"/datacenters", "/config-gtm/v1/domains/{domain}/datacenters")
+def create_gtm_datacenter(state, m, query, body):
+    dom = state.gtm_domains.get(m.group(1))
+    if not dom:
+        return not_found("domain")
+    dc_id = 3000 + len(dom["datacenters"]) + 1
+    dc = dict(body, datacenterId=dc_id)
+    dom["datacenters"][dc_id] = dc
+    dom["statusPolls"] = 0
+    return 201, {"resource": dc, "status": {"propagationStatus": "PENDING"}}
+
+
+@route("GET", GTM_DOMAIN + r"/properties", "/config-gtm/v1/domains/{domain}/properties")
+def list_gtm_properties(state, m, query, body):
+    dom = state.gtm_domains.get(m.group(1))
+    if not dom:
+        return not_found("domain")
+    return 200, {"items": list(dom["properties"].values())}
+
+
+@route("PUT", GTM_DOMAIN + r"/properties/([^/]+)", "/config-gtm/v1/domains/{domain}/properties/{property}")
+def put_gtm_property(state, m, query, body):
+    dom = state.gtm_domains.get(m.group(1))
+    if not dom:
+        return not_found("domain")
+    status = 200 if m.group(2) in dom["properties"] else 201
+    dom["properties"][m.group(2)] = body
+    dom["statusPolls"] = 0
+    return status, {"resource": body, "status": {"propagationStatus": "PENDING"}}
+
+
+@route("GET", GTM_DOMAIN + r"/status/current", "/config-gtm/v1/domains/{domain}/status/current")
+def gtm_status(state, m, query, body):
+    if m.group(1) not in state.gtm_domains:
+        return not_found("domain")
+    return 200, {"propagationStatus": state.gtm_status(m.group(1))}
+
+
+# ---------------- EdgeWorkers ----------------
+@route("GET", r"/edgeworkers/v1/ids", "/edgeworkers/v1/ids")
+def list_edgeworkers(state, m, query, body):
+    group = query.get("groupId")
+    return 200, {"edgeWorkerIds": [
+        {k: v for k, v in ew.items() if k not in ("versions", "activations")}
+        for ew in state.edgeworkers.values()
+        if not group or str(ew["groupId"]) == str(group)
+    ]}
+
+
+@route("POST", r"/edgeworkers/v1/ids", "/edgeworkers/v1/ids")
+def create_edgeworker(state, m, query, body):
+    ew_id = state.new_id()
+    state.edgeworkers[ew_id] = {
+        "edgeWorkerId": ew_id,
+        "name": body.get("name"),
+        "groupId": body.get("groupId"),
+        "resourceTierId": body.get("resourceTierId"),
+        "description": body.get("description"),
+        "versions": [],
+        "activations": []
+    }
+    return 201, {k: v for k, v in state.edgeworkers[ew_id].items() if k not in ("versions", "activations")}
+
+
+@route("GET", r"/edgeworkers/v1/ids/(\d+)", "/edgeworkers/v1/ids/{edgeWorkerId}")
+def get_edgeworker(state, m, query, body):
+    ew = state.edgeworkers.get(int(m.group(1)))
+    if not ew:
+        return not_found("EdgeWorker")
+    return 200, {k: v for k, v in ew.items() if k not in ("versions", "activations")}
+
+
+@route("POST", r"/edgeworkers/v1/ids/(\d+)/versions", "/edgeworkers/v1/ids/{edgeWorkerId}/versions")
+def upload_edgeworker_version(state, m, query, body):
+    ew = state.edgeworkers.get(int(m.group(1)))
+    if not ew:
+        return not_found("EdgeWorker")
+
+    try:
+        with tarfile.open(fileobj=io.BytesIO(body), mode="r:gz") as tgz:
+            names = tgz.getnames()
+            bundle = json.load(tgz.extractfile("bundle.json"))
+    except Exception as e:
+        return 400, {"title": "Invalid bundle", "detail": str(e)}
+
+    if "main.js" not in names:
+        return 400, {"title": "Invalid bundle", "detail": "main.js missing"}
+
+    version = bundle.get("edgeworker-version")
+    if any(v["version"] == version for v in ew["versions"]):
+        return 409, {"title": "Version already exists", "detail": version}
+
+    entry = {"edgeWorkerId": ew["edgeWorkerId"], "version": version,
+             "sequenceNumber": len(ew["versions"]) + 1, "bundleBytes": len(body)}
+    ew["versions"].append(entry)
+    return 201, entry
+
+
+@route("GET", r"/edgeworkers/v1/ids/(\d+)/versions", "/edgeworkers/v1/ids/{edgeWorkerId}/versions")
+def list_edgeworker_versions(state, m, query, body):
+    ew = state.edgeworkers.get(int(m.group(1)))
+    if not ew:
+        return not_found("EdgeWorker")
+    return 200, {"versions": ew["versions"]}
+
+
+def ew_activation_view(state, act):
+    done = time.time() - act["created"] >= state.activation_delay
+    return dict({k: v for k, v in act.items() if k != "created"}, status="COMPLETE" if done else "PENDING")
+
+
+@route("POST", r"/edgeworkers/v1/ids/(\d+)/activations", "/edgeworkers/v1/ids/{edgeWorkerId}/activations")
+def activate_edgeworker(state, m, query, body):
+    ew = state.edgeworkers.get(int(m.group(1)))
+    if not ew:
+        return not_found("EdgeWorker")
+    if not any(v["version"] == body.get("version") for v in ew["versions"]):
+        return 400, {"title": "Unknown version", "detail": body.get("version")}
+
+    act = {"activationId": state.new_id(), "edgeWorkerId": ew["edgeWorkerId"],
+           "version": body.get("version"), "network": str(body.get("network")).upper(),
+           "created": time.time()}
+    ew["activations"].append(act)
+    return 201, ew_activation_view(state, act)
+
+
+@route("GET", r"/edgeworkers/v1/ids/(\d+)/activations", "/edgeworkers/v1/ids/{edgeWorkerId}/activations")
+def list_edgeworker_activations(state, m, query, body):
+    ew = state.edgeworkers.get(int(m.group(1)))
+    if not ew:
+        return not_found("EdgeWorker")
+    return 200, {"activations": [ew_activation_view(state, a) for a in reversed(ew["activations"])]}
+
+
+@route("GET", r"/edgeworkers/v1/ids/(\d+)/activations/(\d+)", "/edgeworkers/v1/ids/{edgeWorkerId}/activations/{activationId}")
+def get_edgeworker_activation(state, m, query, body):
+    ew = state.edgeworkers.get(int(m.group(1)))
+    act = next((a for a in (ew or {}).get("activations", []) if a["activationId"] == int(m.group(2))), None)
+    if not act:
+        return not_found("activation")
+    return 200, ew_activation_view(state, act)
+
+
+# ============================================================
+# HTTP SERVER
+# ============================================================
+class AkamaiSimulator:
+    """
+    Local stand-in for the PAPI, GTM and EdgeWorkers endpoints this project
+    calls, with latency, 5xx and 429 injection. Counts calls per
+    "METHOD /endpoint/{template}".
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency="fixed:0", error_rate=0.0,
+                 throttle_rate=0.0, activation_delay=0.0, gtm_propagation_polls=0,
+                 seed=None, default_rules=None):
+        self.host = host
+        self.port = port
+        self.latency = parse_latency_spec(latency)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.state = SimulatorState(
+            default_rules if default_rules is not None else load_default_rules(),
+            activation_delay, gtm_propagation_polls
+        )
+        self.calls = Counter()
+        self.injected = Counter()
+        self.server = None
+        self.thread = None
+
+    @property
+    def baseurl(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), self.make_handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def dispatch(self, method, target, headers, raw):
+        parts = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+
+        for route_method, pattern, template, fn in ROUTES:
+            if route_method != method:
+                continue
+            m = pattern.match(parts.path)
+            if not m:
+                continue
+
+            with self.state.lock:
+                self.calls[f"{method} {template}"] += 1
+                roll = self.random.random()
+
+            time.sleep(max(0.0, self.latency()) / 1000.0)
+
+            if roll < self.throttle_rate:
+                self.injected["429"] += 1
+                return 429, {"title": "Too Many Requests"}, {"Retry-After": "1"}
+            if roll < self.throttle_rate + self.error_rate:
+                self.injected["5xx"] += 1
+                return 503, {"title": "Injected error"}, {}
+
+            if headers.get("Content-Encoding", "").lower() == "gzip":
+                raw = gzip.decompress(raw)
+
+            if template.endswith("/versions") and method == "POST" and template.startswith("/edgeworkers"):
+                body = raw
+            else:
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    return 400, {"title": "Invalid JSON"}, {}
+
+            with self.state.lock:
+                status, payload = fn(self.state, m, query, body)
+            return status, payload, {}
+
+        with self.state.lock:
+            self.calls[f"{method} <unmatched>"] += 1
+        return 404, {"title": "Not Found", "detail": f"No simulated endpoint for {method} {parts.path}"}, {}
+
+    def make_handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # headers and body go out as separate writes; without this,
+                # Nagle + delayed ACK add ~40ms to every response
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle_any(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+
+                status, payload, extra = simulator.dispatch(self.command, self.path, self.headers, raw)
+                data = json.dumps(payload).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in extra.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_any
+
+        return Handler
+
+
+# ============================================================
+# STANDALONE ENTRY
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Local PAPI / GTM / EdgeWorkers simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:0", help="Per-call latency spec, e.g. lognormal:80:0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls answered 429")
+    parser.add_argument("--activation-delay", type=float, default=0.0, help="Seconds until activations complete")
+    parser.add_argument("--seed-property", action="append", default=[],
+                        help="name:contractId:groupId of a pre-existing property (repeatable)")
+    args = parser.parse_args()
+
+    sim = AkamaiSimulator(args.host, args.port, args.latency, args.error_rate,
+                          args.throttle_rate, args.activation_delay)
+    for spec in args.seed_property:
+        name, contract, group = spec.split(":")
+        print(f"[INFO] Seeded {sim.state.add_property(name, contract, group)} = {name}")
+
+    sim.start()
+    print(f"[INFO] Akamai simulator listening on {sim.baseurl}")
+
+    try:
+        sim.thread.join()
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import statistics
+import tracemalloc
+import contextlib
+
+import requests
+
+import main as pipeline
+from caches import clear_caches
+from akamai_simulator import AkamaiSimulator
+from manage_gtm import run_gtm_workflow
+from config_model import compile_config
+
+
+# ============================================================
+# WORKSPACE
+# ============================================================
+# main.py reads requirements.json and data/ relative to the working
+# directory and rewrites data/edgeworker/main.js; each iteration runs in a
+# scratch copy so the checkout is never touched.
+WORKSPACE_FILES = ("requirements.json",)
+WORKSPACE_DIRS = ("data",)
+
+
+def make_workspace(root):
+    for name in WORKSPACE_FILES:
+        shutil.copy(name, os.path.join(root, name))
+    for name in WORKSPACE_DIRS:
+        shutil.copytree(name, os.path.join(root, name),
+                        ignore=shutil.ignore_patterns("build", "__pycache__"))
+
+
+def simulator_session_factory(sim):
+    """Replaces init_edgegrid_session: plain HTTP, no EdgeGrid signing."""
+    def init_session(config, **kwargs):
+        session = requests.Session()
+        session.headers.update({"Content-Type": "application/json"})
+        return session, sim.baseurl
+    return init_session
+
+
+# ============================================================
+# ONE RUN
+# ============================================================
+def run_once(args, iteration):
+    sim = AkamaiSimulator(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        activation_delay=args.activation_delay,
+        seed=None if args.seed is None else args.seed + iteration
+    )
+
+    original_cwd = os.getcwd()
+    original_argv = sys.argv
+    original_init = pipeline.init_edgegrid_session
+
+    with tempfile.TemporaryDirectory(prefix="harper-bench-") as workdir:
+        make_workspace(workdir)
+
+        with open(os.path.join(workdir, "requirements.json"), "r") as f:
+            config = json.load(f)
+
+        cf = config["propertyManager"]["customerFacingHostname"]
+        sim.state.add_property(cf["propertyName"], config["contractId"], config["groupId"])
+        sim.start()
+        # a fresh simulator is a fresh account: nothing listed earlier exists
+        clear_caches()
+
+        sys.argv = ["main.py", "--activation-network", args.activation_network]
+        if args.profile:
+            sys.argv.append("--profile")
+        pipeline.init_edgegrid_session = simulator_session_factory(sim)
+        sink = open(os.devnull, "w") if not args.show_output else None
+
+        try:
+            os.chdir(workdir)
+            tracemalloc.start()
+            started = time.perf_counter()
+
+            with contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext():
+                if args.include_gtm:
+                    session, baseurl = pipeline.init_edgegrid_session(config)
+                    run_gtm_workflow(session, baseurl, compile_config(config), args.activation_network, None, False)
+                pipeline.main()
+
+            wall = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+
+            with open("result.json", "r") as f:
+                result = json.load(f)
+
+            if args.profile:
+                profile_path = f"{args.profile}.{iteration}.json"
+                shutil.copy("profile.json", os.path.join(original_cwd, profile_path))
+        finally:
+            tracemalloc.stop()
+            os.chdir(original_cwd)
+            sys.argv = original_argv
+            pipeline.init_edgegrid_session = original_init
+            if sink:
+                sink.close()
+            sim.stop()
+
+    errors = {k: v for k, v in result.items() if k.endswith("_error")}
+
+    return {
+        "iteration": iteration,
+        "wallTimeS": round(wall, 4),
+        "apiCalls": sum(sim.calls.values()),
+        "callsByEndpoint": dict(sorted(sim.calls.items())),
+        "injected": dict(sim.injected),
+        "peakTracedBytes": peak,
+        "errors": errors
+    }
+
+
+# ============================================================
+# REPORT
+# ============================================================
+def summarize_runs(runs):
+    walls = [r["wallTimeS"] for r in runs]
+    return {
+        "iterations": len(runs),
+        "wallTimeS": {
+            "min": min(walls),
+            "median": round(statistics.median(walls), 4),
+            "mean": round(statistics.mean(walls), 4),
+            "max": max(walls)
+        },
+        "apiCalls": runs[-1]["apiCalls"],
+        "callsByEndpoint": runs[-1]["callsByEndpoint"],
+        "peakTracedBytes": max(r["peakTracedBytes"] for r in runs),
+        # ru_maxrss is KiB on Linux
+        "maxRssBytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "failedRuns": sum(1 for r in runs if r["errors"])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the main.py pipeline against the local Akamai simulator")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--activation-network", default="staging", choices=["staging", "production", "saveonly"])
+    parser.add_argument("--latency", default="fixed:0", help="Simulated API latency spec, e.g. lognormal:120:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of API calls answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of API calls answered 429")
+    parser.add_argument("--activation-delay", type=float, default=0.0, help="Seconds until simulated activations complete")
+    parser.add_argument("--include-gtm", action="store_true", help="Also run the GTM workflow (disabled in main.py)")
+    parser.add_argument("--seed", type=int, help="Seed for latency / error injection")
+    parser.add_argument("--show-output", action="store_true", help="Do not silence the pipeline's console output")
+    parser.add_argument("--output", help="Write the full report JSON here")
+    parser.add_argument("--profile", metavar="PREFIX",
+                        help="Run main.py with --profile and keep each run's profile as PREFIX.<iteration>.json")
+    args = parser.parse_args()
+
+    runs = [run_once(args, i) for i in range(args.iterations)]
+    summary = summarize_runs(runs)
+
+    print(f"\n{'iter':>4} {'wall':>9} {'calls':>6} {'peak mem':>10}  errors")
+    for r in runs:
+        print(f"{r['iteration']:>4} {r['wallTimeS']:>8.3f}s {r['apiCalls']:>6} "
+              f"{r['peakTracedBytes'] / 1024:>8.0f}KB  {', '.join(r['errors']) or '-'}")
+
+    print("\nCalls per endpoint (last run):")
+    for endpoint, count in summary["callsByEndpoint"].items():
+        print(f"  {count:>4}  {endpoint}")
+
+    wall = summary["wallTimeS"]
+    print(f"\n[INFO] wall min/median/max = {wall['min']}s / {wall['median']}s / {wall['max']}s, "
+          f"{summary['apiCalls']} API calls, peak traced {summary['peakTracedBytes'] / 1024:.0f}KB, "
+          f"max RSS {summary['maxRssBytes'] / 1024 / 1024:.1f}MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "runs": runs, "settings": vars(args)}, f, indent=4)
+        print(f"[SUCCESS] Report written to {args.output}")
+
+    if summary["failedRuns"] and not (args.error_rate or args.throttle_rate):
+        print(f"[ERROR] {summary['failedRuns']} run(s) reported workflow errors")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import gc
+import gzip
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import contextlib
+
+import json_codec
+from akamai_simulator import load_default_rules
+from manage_property_manager import (
+    update_origin_behavior,
+    remove_offload_origin_children,
+    update_cpcode_in_traffic_reporting
+)
+from manage_customer_property import (
+    load_harper_rule,
+    inject_edgeworker_id,
+    inject_required_variables,
+    insert_harper_rule
+)
+
+
+# ============================================================
+# SETTINGS
+# ============================================================
+DEFAULT_BASELINE = "data/benchmarks/rule_tree_baseline.json"
+
+# name -> (total rules, nesting depth); depth None = balanced tree
+SHAPES = {
+    "rules-100": (100, None),
+    "rules-1k": (1000, None),
+    "rules-10k": (10000, None),
+    "rules-50k": (50000, None),
+    "deep-200": (5000, 200)
+}
+
+FANOUT = 20
+
+# A result regresses when its best (min) time exceeds baseline * (1 + tolerance)
+# and the difference is larger than the absolute floor (timer noise on tiny
+# ops). The minimum is far less sensitive to a busy machine than the median.
+DEFAULT_TOLERANCE = 0.5
+NOISE_FLOOR_MS = 0.2
+
+
+# ============================================================
+# SYNTHETIC RULE TREES (modeled on data/rule.json)
+# ============================================================
+def collect_templates(node, out):
+    """Rules with criteria and behaviors — the shape of customer match rules."""
+    for child in node.get("children", []):
+        if child.get("criteria") and child.get("behaviors"):
+            out.append(child)
+        collect_templates(child, out)
+    return out
+
+
+def make_rule(template, i, rnd):
+    rule = json.loads(json.dumps(template))
+    rule["name"] = f"{template['name']} {i}"
+    rule["children"] = []
+    for criterion in rule.get("criteria", []):
+        values = criterion.get("options", {}).get("values")
+        if isinstance(values, list):
+            criterion["options"]["values"] = [f"/site/{i}/{v}" for v in values[:rnd.randint(1, 4)]] or [f"/site/{i}/*"]
+    return rule
+
+
+def build_balanced(rules, fanout):
+    """Groups a flat list into section rules until at most `fanout` remain."""
+    level = rules
+    depth = 0
+    while len(level) > fanout:
+        depth += 1
+        level = [
+            {
+                "name": f"Section L{depth}-{n}",
+                "children": level[i:i + fanout],
+                "behaviors": [],
+                "criteria": [],
+                "criteriaMustSatisfy": "all",
+                "comments": ""
+            }
+            for n, i in enumerate(range(0, len(level), fanout))
+        ]
+    return level
+
+
+def build_chain(rules, depth):
+    """A chain `depth` rules deep, with the rest spread along it as leaves."""
+    chain = rules[:depth]
+    leaves = rules[depth:]
+    per_level = len(leaves) // max(1, depth)
+
+    for d, rule in enumerate(chain):
+        rule["children"] = leaves[d * per_level:(d + 1) * per_level]
+    for d in range(len(chain) - 1):
+        chain[d]["children"].append(chain[d + 1])
+    chain[-1]["children"].extend(leaves[len(chain) * per_level:])
+    return [chain[0]] if chain else []
+
+
+def generate_rule_tree(rule_count, depth=None, seed=0, base_rules=None):
+    """
+    data/rule.json's default tree plus `rule_count` synthetic match rules,
+    a variable per 10 rules, and a Conditional Origins rule last so the
+    Harper insertion scans every top-level child.
+    """
+    rnd = random.Random(seed)
+    base = json.loads(json.dumps(base_rules or load_default_rules()))
+    templates = collect_templates(base, [])
+
+    synthetic = [make_rule(templates[i % len(templates)], i, rnd) for i in range(rule_count)]
+    sections = build_chain(synthetic, depth) if depth else build_balanced(synthetic, FANOUT)
+
+    base["children"].extend(sections)
+    base["children"].append({
+        "name": "Conditional Origins",
+        "children": [],
+        "behaviors": [{"name": "allowConditionalOrigins", "options": {"enabled": True}}],
+        "criteria": [],
+        "criteriaMustSatisfy": "all",
+        "comments": ""
+    })
+    base["variables"] = [
+        {"name": f"PMUSER_SITE_{i}", "value": "", "description": "", "hidden": False, "sensitive": False}
+        for i in range(rule_count // 10)
+    ]
+
+    return {"propertyVersion": 1, "ruleFormat": "latest", "rules": base}
+
+
+def count_rules(node):
+    return 1 + sum(count_rules(c) for c in node.get("children", []))
+
+
+# ============================================================
+# OPERATIONS
+# ============================================================
+HARPER_RULE = None
+
+
+def operations():
+    """name -> fn(tree, text); each call gets its own fresh tree."""
+    return {
+        "update_origin_behavior": lambda t, s: update_origin_behavior(t["rules"], "origin.example.com", "harper.example.com", False),
+        "remove_offload_origin_children": lambda t, s: remove_offload_origin_children(t["rules"], False),
+        "update_cpcode_in_traffic_reporting": lambda t, s: update_cpcode_in_traffic_reporting(t["rules"], "cpc_123456", "harper", False),
+        "inject_edgeworker_id": lambda t, s: inject_edgeworker_id(t, 123456),
+        "inject_required_variables": lambda t, s: inject_required_variables(t),
+        "insert_harper_rule": lambda t, s: insert_harper_rule(t, json.loads(json.dumps(HARPER_RULE))),
+        "json_encode": lambda t, s: json.dumps(t),
+        "json_decode": lambda t, s: json.loads(s),
+        "codec_encode": lambda t, s: json_codec.dumps(t),
+        "codec_decode": lambda t, s: json_codec.loads(s),
+        "codec_gzip_body": lambda t, s: gzip.compress(json_codec.dumps(t), compresslevel=6)
+    }
+
+
+def time_operation(fn, text, repeat):
+    """Like timeit, the garbage collector is off while measuring."""
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            tree = json.loads(text)
+            start = time.perf_counter()
+            fn(tree, text)
+            samples.append((time.perf_counter() - start) * 1000)
+            del tree
+    finally:
+        gc.enable()
+    return {
+        "minMs": round(min(samples), 4),
+        "medianMs": round(statistics.median(samples), 4)
+    }
+
+
+def run_suite(shapes, repeat, seed=0):
+    global HARPER_RULE
+    HARPER_RULE = load_harper_rule()
+
+    base_rules = load_default_rules()
+    results = {}
+
+    for shape in shapes:
+        count, depth = SHAPES[shape]
+        tree = generate_rule_tree(count, depth, seed, base_rules)
+        text = json.dumps(tree)
+
+        entry = {
+            "rules": count_rules(tree["rules"]),
+            "depth": depth,
+            "jsonBytes": len(text),
+            "operations": {}
+        }
+
+        with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+            for name, fn in operations().items():
+                entry["operations"][name] = time_operation(fn, text, repeat)
+
+        results[shape] = entry
+
+    return results
+
+
+# ============================================================
+# BASELINE
+# ============================================================
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for shape, entry in results.items():
+        for op, timing in entry["operations"].items():
+            base = baseline.get(shape, {}).get("operations", {}).get(op)
+            if not base:
+                continue
+            limit = base["minMs"] * (1 + tolerance)
+            if timing["minMs"] > limit and timing["minMs"] - base["minMs"] > NOISE_FLOOR_MS:
+                regressions.append({
+                    "shape": shape,
+                    "operation": op,
+                    "baselineMs": base["minMs"],
+                    "minMs": timing["minMs"],
+                    "ratio": round(timing["minMs"] / base["minMs"], 2) if base["minMs"] else None
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule-tree operation microbenchmarks on synthetic trees")
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=list(SHAPES))
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per operation (the minimum is compared)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown vs baseline (0.5 = 50%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--output", help="Write the results JSON here")
+    args = parser.parse_args()
+
+    results = run_suite(args.shapes, args.repeat, args.seed)
+
+    ops = list(operations())
+    print(f"\n{'operation':<36}" + "".join(f"{s:>12}" for s in results))
+    print(f"{'(rules)':<36}" + "".join(f"{results[s]['rules']:>12}" for s in results))
+    for op in ops:
+        print(f"{op:<36}" + "".join(f"{results[s]['operations'][op]['medianMs']:>10.3f}ms" for s in results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"\n[SUCCESS] Results written to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"[SUCCESS] Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"[WARNING] No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n[ERROR] {len(regressions)} regression(s) vs {args.baseline}:")
+        for r in regressions:
+            print(f"  {r['shape']:<10} {r['operation']:<36} {r['baselineMs']}ms -> {r['minMs']}ms (x{r['ratio']})")
+        sys.exit(1)
+
+    print(f"\n[SUCCESS] No regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import os
+import json
+import shutil
+
+from tracing import traced
+
+
+# ============================================================
+# RESOURCE TIER BUDGETS
+# ============================================================
+# Defaults per edgeworker.resourceTierId, from Akamai's published EdgeWorkers
+# limits. edgeworker.bundleBudget overrides any of them.
+RESOURCE_TIER_BUDGETS = {
+    100: {  # Basic Compute
+        "maxCompressedBytes": 1024 * 1024,
+        "maxUncompressedBytes": 5 * 1024 * 1024,
+        "maxInitMs": 30
+    },
+    200: {  # Dynamic Compute
+        "maxCompressedBytes": 1024 * 1024,
+        "maxUncompressedBytes": 5 * 1024 * 1024,
+        "maxInitMs": 30
+    }
+}
+
+# Rough V8 parse + compile throughput for module initialization. Only used
+# to estimate cold-start cost; large literal tables (redirects.js) dominate.
+INIT_BYTES_PER_MS = 50000
+
+JS_FILES = ("main.js", "redirects.js")
+
+# logger calls that are dead when bundle.json sets logging level "error"
+DEAD_LOG_METHODS = ("log", "info", "debug", "trace")
+
+
+# ============================================================
+# JS TOKENIZER (just enough for whitespace/comment minification)
+# ============================================================
+ID_CHARS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$")
+REGEX_PRECEDING_PUNCT = set("(,=:[!&|?{};+-*%<>~^")
+REGEX_PRECEDING_WORDS = {"return", "typeof", "case", "do", "else", "in", "of",
+                         "new", "delete", "void", "throw", "instanceof"}
+
+
+def scan_string(src, i):
+    quote = src[i]
+    j = i + 1
+    while j < len(src) and src[j] != quote:
+        if src[j] == "\\":
+            j += 1
+        elif src[j] == "\n":
+            raise Exception(f"Unterminated string literal at offset {i}")
+        j += 1
+    if j >= len(src):
+        raise Exception(f"Unterminated string literal at offset {i}")
+    return j + 1
+
+
+def scan_template(src, i):
+    """Scans a template literal, including nested ${ … } expressions."""
+    j = i + 1
+    while j < len(src):
+        c = src[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "`":
+            return j + 1
+        if c == "$" and src[j + 1:j + 2] == "{":
+            j = scan_braced_expression(src, j + 2)
+            continue
+        j += 1
+    raise Exception(f"Unterminated template literal at offset {i}")
+
+
+def scan_braced_expression(src, j):
+    depth = 1
+    while j < len(src):
+        c = src[j]
+        if c in "'\"":
+            j = scan_string(src, j)
+            continue
+        if c == "`":
+            j = scan_template(src, j)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    raise Exception("Unterminated template expression")
+
+
+def scan_regex(src, i):
+    j = i + 1
+    in_class = False
+    while j < len(src):
+        c = src[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "\n":
+            raise Exception(f"Unterminated regex literal at offset {i}")
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            j += 1
+            while j < len(src) and src[j] in ID_CHARS:
+                j += 1
+            return j
+        j += 1
+    raise Exception(f"Unterminated regex literal at offset {i}")
+
+
+def tokenize_js(src):
+    """
+    Returns [(kind, text, spaced)] with kind in word / punct / str / regex / nl;
+    spaced is True when whitespace or a comment preceded the token.
+    Comments and horizontal whitespace are dropped; a block comment that
+    spans lines counts as a newline (it can end a statement under ASI).
+    """
+    tokens = []
+    i = 0
+    n = len(src)
+    spaced = False
+
+    def last_significant():
+        for kind, text, _ in reversed(tokens):
+            if kind != "nl":
+                return kind, text
+        return None, None
+
+    def emit(kind, text):
+        nonlocal spaced
+        tokens.append((kind, text, spaced))
+        spaced = False
+
+    while i < n:
+        c = src[i]
+
+        if c in " \t\r\f\v":
+            spaced = True
+            i += 1
+        elif c == "\n":
+            emit("nl", "\n")
+            spaced = True
+            i += 1
+        elif src.startswith("//", i):
+            spaced = True
+            while i < n and src[i] != "\n":
+                i += 1
+        elif src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            if end < 0:
+                raise Exception(f"Unterminated block comment at offset {i}")
+            if "\n" in src[i:end]:
+                emit("nl", "\n")
+            spaced = True
+            i = end + 2
+        elif c in "'\"":
+            j = scan_string(src, i)
+            emit("str", src[i:j])
+            i = j
+        elif c == "`":
+            j = scan_template(src, i)
+            emit("str", src[i:j])
+            i = j
+        elif c == "/":
+            kind, text = last_significant()
+            if kind is None or (kind == "punct" and text[-1] in REGEX_PRECEDING_PUNCT) \
+                    or (kind == "word" and text in REGEX_PRECEDING_WORDS):
+                j = scan_regex(src, i)
+                emit("regex", src[i:j])
+                i = j
+            else:
+                emit("punct", c)
+                i += 1
+        elif c in ID_CHARS:
+            j = i
+            while j < n and src[j] in ID_CHARS:
+                j += 1
+            emit("word", src[i:j])
+            i = j
+        else:
+            emit("punct", c)
+            i += 1
+
+    return tokens
+
+
+# ============================================================
+# DEAD LOGGING
+# ============================================================
+def strip_dead_logging(tokens):
+    """
+    Removes whole `logger.log(...);` statements (and info/debug/trace).
+    Only statements that start right after ; { or } are removed, so an
+    unbraced `if (x) logger.log(...)` or a call used as an argument is left
+    alone.
+    """
+    out = []
+    removed = 0
+    i = 0
+
+    while i < len(tokens):
+        prev = next((t for t in reversed(out) if t[0] != "nl"), None)
+        kind_text = [t[:2] for t in tokens[i:i + 4]]
+        at_statement_start = prev is None or prev[1] in (";", "{", "}")
+
+        if (at_statement_start
+                and len(kind_text) == 4
+                and kind_text[0] == ("word", "logger")
+                and kind_text[1] == ("punct", ".")
+                and kind_text[2][0] == "word" and kind_text[2][1] in DEAD_LOG_METHODS
+                and kind_text[3] == ("punct", "(")):
+
+            depth = 0
+            j = i + 3
+            while j < len(tokens):
+                if tokens[j][:2] == ("punct", "("):
+                    depth += 1
+                elif tokens[j][:2] == ("punct", ")"):
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+
+            j += 1
+            if j < len(tokens) and tokens[j][:2] == ("punct", ";"):
+                j += 1
+
+            removed += 1
+            i = j
+            continue
+
+        out.append(tokens[i])
+        i += 1
+
+    return out, removed
+
+
+# ============================================================
+# MINIFY
+# ============================================================
+NEWLINE_DROP_AFTER = set("{([,;:")
+NEWLINE_DROP_BEFORE = set("})],;")
+
+
+def needs_space(prev_text, next_text, spaced):
+    a, b = prev_text[-1], next_text[0]
+    if a in ID_CHARS and b in ID_CHARS:
+        return True
+    # keep `a + +b`, `a - -b` and `a / /re/` apart, but not `i++`
+    return spaced and (a + b) in ("++", "--", "//", "/*")
+
+
+def minify_js(src, strip_logging=False):
+    """
+    Whitespace / comment minifier that keeps statement-ending newlines so
+    automatic semicolon insertion behaves exactly as in the source.
+    Returns (minified_source, removed_log_statements).
+    """
+    tokens = tokenize_js(src)
+    removed = 0
+
+    if strip_logging:
+        tokens, removed = strip_dead_logging(tokens)
+
+    out = []
+    pending_nl = False
+
+    for kind, text, spaced in tokens:
+        if kind == "nl":
+            pending_nl = bool(out)
+            continue
+
+        if out:
+            prev = out[-1]
+            if pending_nl and prev[-1] not in NEWLINE_DROP_AFTER and text[0] not in NEWLINE_DROP_BEFORE:
+                out.append("\n")
+            elif needs_space(prev, text, spaced or pending_nl):
+                out.append(" ")
+
+        out.append(text)
+        pending_nl = False
+
+    return "".join(out) + "\n", removed
+
+
+# ============================================================
+# BUNDLE OPTIMIZATION STAGE
+# ============================================================
+def resolve_budget(ew_cfg):
+    tier = int(ew_cfg.get("resourceTierId", 200))
+    budget = dict(RESOURCE_TIER_BUDGETS.get(tier, RESOURCE_TIER_BUDGETS[200]))
+    budget.update(ew_cfg.get("bundleBudget", {}))
+    budget["resourceTierId"] = tier
+    return budget
+
+
+def logging_is_dead(bundle_json_path):
+    with open(bundle_json_path, "r") as f:
+        level = json.load(f).get("config", {}).get("logging", {}).get("level", "")
+    return level.lower() in ("error", "off")
+
+
+@traced()
+def optimize_bundle_sources(source_folder, build_folder, minify=True, strip_logging=None):
+    """
+    Copies the bundle sources into build_folder, minifying JS and stripping
+    logger calls that bundle.json's logging level makes dead.
+    Returns a per-file size report.
+    """
+    os.makedirs(build_folder, exist_ok=True)
+
+    bundle_json_path = os.path.join(source_folder, "bundle.json")
+    if strip_logging is None:
+        strip_logging = logging_is_dead(bundle_json_path)
+
+    shutil.copyfile(bundle_json_path, os.path.join(build_folder, "bundle.json"))
+
+    files = {}
+    for name in JS_FILES:
+        src_path = os.path.join(source_folder, name)
+        dst_path = os.path.join(build_folder, name)
+
+        if not os.path.exists(src_path):
+            if os.path.exists(dst_path):
+                os.remove(dst_path)
+            continue
+
+        with open(src_path, "r") as f:
+            source = f.read()
+
+        output, removed = minify_js(source, strip_logging) if minify else (source, 0)
+
+        with open(dst_path, "w") as f:
+            f.write(output)
+
+        files[name] = {
+            "sourceBytes": len(source.encode("utf-8")),
+            "bytes": len(output.encode("utf-8")),
+            "removedLogStatements": removed
+        }
+
+    return {"files": files, "minified": minify, "strippedLogging": strip_logging}
+
+
+def measure_bundle(bundle_tgz):
+    """Uncompressed size of every member plus the .tgz size."""
+    import tarfile  # only after a build; config validation imports this module too
+
+    with tarfile.open(bundle_tgz, "r:gz") as tgz:
+        uncompressed = sum(m.size for m in tgz.getmembers() if m.isfile())
+    return uncompressed, os.path.getsize(bundle_tgz)
+
+
+def estimate_init_ms(js_bytes):
+    return round(js_bytes / INIT_BYTES_PER_MS, 2)
+
+
+def check_bundle_budget(report, budget):
+    """Raises when any measured value exceeds its budget."""
+    violations = []
+
+    for measured, limit in (("compressedBytes", "maxCompressedBytes"),
+                            ("uncompressedBytes", "maxUncompressedBytes"),
+                            ("estimatedInitMs", "maxInitMs")):
+        if limit in budget and report[measured] > budget[limit]:
+            violations.append(f"{measured}={report[measured]} > {limit}={budget[limit]}")
+
+    if violations:
+        raise Exception(
+            f"EdgeWorker bundle over budget for resource tier {budget['resourceTierId']}: "
+            + "; ".join(violations)
+        )
+
+
+@traced()
+def build_bundle_report(optimization, bundle_tgz, budget):
+    uncompressed, compressed = measure_bundle(bundle_tgz)
+    js_bytes = sum(f["bytes"] for f in optimization["files"].values())
+
+    report = dict(optimization)
+    report.update({
+        "uncompressedBytes": uncompressed,
+        "compressedBytes": compressed,
+        "estimatedInitMs": estimate_init_ms(js_bytes),
+        "budget": budget
+    })
+    return report
@@ -0,0 +1,116 @@
+import time
+import threading
+
+import prefetch
+
+
+# ============================================================
+# LOOKUP CACHES (kept warm by harper_daemon.py)
+# ============================================================
+# The rule-tree cache is disabled by default, so a one-shot main.py run
+# always edits the current tree; the daemon enables it. The listings
+# (properties, CP codes, EdgeWorker IDs by name) are always on: listed once
+# per run, or once per TTL in the daemon, and kept current by the code that
+# creates objects.
+DEFAULT_LISTING_TTL = 300
+DEFAULT_RULE_TREE_TTL = 600
+
+
+class TtlCache:
+    """Thread-safe dict with per-entry expiry; get() misses while disabled."""
+
+    def __init__(self, name, ttl, enabled=False):
+        self.name = name
+        self.ttl = ttl
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, match):
+        """Drops every key for which match(key) is true."""
+        with self.lock:
+            for key in [k for k in self.entries if match(k)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "ttlS": self.ttl}
+
+
+# Every key starts with the edgerc section: two sections are two API
+# clients, possibly of different accounts, and with no accountSwitchKey
+# (or the same one) they would otherwise share entries.
+
+# (kind, section, accountSwitchKey, scope...) -> {name: [items]}, see index_by_name()
+listings = TtlCache("listings", DEFAULT_LISTING_TTL, enabled=True)
+
+# (section, accountSwitchKey, propertyId, version) -> raw rule tree bytes;
+# decoded on every hit, so callers always get a private copy to modify
+rule_trees = TtlCache("ruleTrees", DEFAULT_RULE_TREE_TTL)
+
+ALL_CACHES = (listings, rule_trees)
+
+
+def enable_caches(listing_ttl=DEFAULT_LISTING_TTL, rule_tree_ttl=DEFAULT_RULE_TREE_TTL):
+    listings.ttl = listing_ttl
+    rule_trees.ttl = rule_tree_ttl
+    for cache in ALL_CACHES:
+        cache.enabled = True
+
+
+def clear_caches():
+    for cache in ALL_CACHES:
+        cache.clear()
+
+
+def cache_stats():
+    return {cache.name: cache.stats() for cache in ALL_CACHES}
+
+
+def session_section(session):
+    """The edgerc section the session was bound to (session_registry.bind_account)."""
+    return getattr(session, "edgercSection", None)
+
+
+def index_by_name(items, field):
+    index = {}
+    for item in items:
+        index.setdefault(item.get(field), []).append(item)
+    return index
+
+
+def cached_listing(key, fetch):
+    """The name index for `key`: from the cache, else the run's prefetch, else fetch()."""
+    index = listings.get(key)
+    if index is not None:
+        return index
+
+    index = prefetch.take(key)
+    if index is prefetch.MISS:
+        index = fetch()
+    listings.put(key, index)
+    return index
@@ -0,0 +1,359 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional, Mapping
+
+from json_codec import load_file
+from helpers import get_subrequest_timeout_ms, get_subrequest_fail_open, freeze
+
+# The section resolvers live with their workflows and are imported by the
+# parse_* function that needs them, so importing this module (main.py does
+# at startup) loads no workflow module.
+
+
+# ============================================================
+# CONFIG MODEL
+# ============================================================
+# requirements.json is loaded, validated and compiled once, before any
+# remote change. Workflows read these frozen objects instead of the raw
+# dict, so a typo in a late section fails the run in milliseconds rather
+# than after GTM and PM have already been changed.
+REQUIREMENTS_FILE = "requirements.json"
+
+# Files every full run needs (relative to the working directory)
+REQUIRED_FILES = (
+    "data/harper_redirect_earlyhints_rule.json",
+    "data/edgeworker/main.js",
+    "data/edgeworker/bundle.json"
+)
+
+CONTRACT_ID_RE = re.compile(r"^(ctr_)?([A-Za-z0-9][A-Za-z0-9-]*)$")
+GROUP_ID_RE = re.compile(r"^(grp_)?(\d+)$")
+ACCOUNT_ID_RE = re.compile(r"^(act_)?[A-Za-z0-9][A-Za-z0-9-]*$")
+PRODUCT_ID_RE = re.compile(r"^prd_[A-Za-z0-9_-]+$")
+HOSTNAME_RE = re.compile(r"^(?=.{1,253}$)([A-Za-z0-9_]([A-Za-z0-9_-]{0,61}[A-Za-z0-9])?\.)*[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?$")
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class ConfigError(Exception):
+    """All problems found in requirements.json, one per line."""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("Invalid requirements.json:\n  - " + "\n  - ".join(self.problems))
+
+
+@dataclass(frozen=True)
+class GtmConfig:
+    domain: str
+    propertyName: str
+    propertyType: str
+    datacenterDetails: str
+    livenessHostHeader: str
+    livenessTestObject: str
+
+
+@dataclass(frozen=True)
+class CustomerFacingConfig:
+    propertyName: str
+    propertyVersion: int
+    propertyHostnames: tuple
+    edgeHostname: Optional[str]     # cnameTo for added hostnames; None = the property's current one
+    canaryRamp: tuple               # (100,) without canary
+    canaryHoldSeconds: int
+
+
+@dataclass(frozen=True)
+class InternalHostnameConfig:
+    internalPmConfigName: str
+    internalHostname: str
+    edgeHostname: str
+    originHostname: str
+    forwardCustomHeader: str
+    originProfileName: Optional[str]
+    originProfile: Optional[Mapping]
+    originProfileWarnings: tuple
+    cachingProfile: Optional[Mapping]   # effective profile, None = disabled
+
+
+@dataclass(frozen=True)
+class PropertyManagerConfig:
+    productId: str
+    ruleFormat: str
+    customerFacing: CustomerFacingConfig
+    internal: InternalHostnameConfig
+
+
+@dataclass(frozen=True)
+class EdgeWorkerConfig:
+    name: str
+    description: str
+    resourceTierId: int
+    harperToken: str
+    subrequestTimeoutMs: int
+    failOpen: bool
+    redirectDataset: Optional[str]
+    minify: bool
+    stripDeadLogging: Optional[bool]
+    budget: Mapping
+
+    def __repr__(self):
+        # keeps the token out of logs and tracebacks
+        return f"EdgeWorkerConfig(name={self.name!r}, resourceTierId={self.resourceTierId})"
+
+
+@dataclass(frozen=True)
+class PromotionConfig:
+    smokeChecks: tuple              # normalized checks, see smoke_checks.resolve_smoke_checks
+    smokeTimeoutMs: int
+    smokeRetries: int
+    pollSeconds: int
+    activationTimeoutS: int
+
+
+@dataclass(frozen=True)
+class Config:
+    activationEmails: tuple
+    accountId: Optional[str]
+    contractId: str                 # always "ctr_..."
+    groupId: str                    # always "grp_..."
+    contractIdClean: str            # without "ctr_"
+    groupIdNumeric: int             # GTM gid / EdgeWorkers groupId
+    gtm: Optional[GtmConfig]        # None when requirements.json has no GTM section
+    propertyManager: PropertyManagerConfig
+    edgeworker: EdgeWorkerConfig
+    promotion: PromotionConfig      # defaults (no smoke checks) without a promotion section
+
+
+# ============================================================
+# LOAD + VALIDATE
+# ============================================================
+class _Reader:
+    """Collects every problem instead of stopping at the first one."""
+
+    def __init__(self):
+        self.problems = []
+
+    def section(self, raw, key, where):
+        value = raw.get(key)
+        if not isinstance(value, dict):
+            self.problems.append(f"{where}{key}: missing or not an object")
+            return {}
+        return value
+
+    def string(self, raw, key, where, pattern=None, required=True, default=None):
+        value = raw.get(key, default)
+        if value is None and not required:
+            return None
+        if not isinstance(value, str) or not value.strip():
+            self.problems.append(f"{where}{key}: required non-empty string, got {value!r}")
+            return None
+        if pattern is not None and not pattern.match(value):
+            self.problems.append(f"{where}{key}: invalid format {value!r}")
+            return None
+        return value
+
+    def integer(self, raw, key, where, minimum=None, default=None):
+        value = raw.get(key, default)
+        if isinstance(value, bool) or not isinstance(value, int) or (minimum is not None and value < minimum):
+            bound = f" >= {minimum}" if minimum is not None else ""
+            self.problems.append(f"{where}{key}: required integer{bound}, got {value!r}")
+            return None
+        return value
+
+    def boolean(self, raw, key, where, default=None):
+        value = raw.get(key, default)
+        if value is not None and not isinstance(value, bool):
+            self.problems.append(f"{where}{key}: must be true or false, got {value!r}")
+            return default
+        return value
+
+    def file(self, path, where):
+        if path and not os.path.isfile(path):
+            self.problems.append(f"{where}: file not found: {path}")
+
+    def check(self, fn, where):
+        """Runs one of the workflow resolvers; its exception becomes a problem."""
+        try:
+            return fn()
+        except Exception as e:
+            # most resolver messages already name the field
+            field = where.rsplit(".", 1)[-1]
+            self.problems.append(str(e) if field in str(e) else f"{where}: {e}")
+            return None
+
+
+def parse_emails(r, value):
+    emails = [value] if isinstance(value, str) else value
+    if not isinstance(emails, list) or not emails:
+        r.problems.append(f"activationEmails: required email or list of emails, got {value!r}")
+        return ()
+    for email in emails:
+        if not isinstance(email, str) or not EMAIL_RE.match(email):
+            r.problems.append(f"activationEmails: invalid email {email!r}")
+    return tuple(emails)
+
+
+def parse_gtm(r, raw):
+    if "gtmDomain" not in raw:
+        return None
+
+    gtm = GtmConfig(
+        domain=r.string(raw, "gtmDomain", "", HOSTNAME_RE),
+        propertyName=r.string(raw, "gtmPropertyName", ""),
+        propertyType=r.string(raw, "propertyType", "", default="performance"),
+        datacenterDetails=r.string(raw, "datacenterDetails", ""),
+        livenessHostHeader=r.string(raw, "livenessHostHeader", "", HOSTNAME_RE),
+        livenessTestObject=r.string(raw, "livenessTestObject", "")
+    )
+    r.file(gtm.datacenterDetails, "datacenterDetails")
+    return gtm
+
+
+def parse_property_manager(r, raw, timeout_ms):
+    from manage_property_manager import resolve_origin_profile, validate_origin_profile, resolve_caching_profile
+    from manage_customer_property import resolve_canary_ramp, DEFAULT_CANARY_HOLD_SECONDS
+
+    pm = r.section(raw, "propertyManager", "")
+    cf = r.section(pm, "customerFacingHostname", "propertyManager.")
+    internal = r.section(pm, "internalHarperHostname", "propertyManager.")
+
+    where_cf = "propertyManager.customerFacingHostname."
+    hostnames = cf.get("propertyHostnames", [])
+    if not isinstance(hostnames, list) or any(not isinstance(h, str) or not HOSTNAME_RE.match(h) for h in hostnames):
+        r.problems.append(f"{where_cf}propertyHostnames: must be a list of hostnames, got {hostnames!r}")
+        hostnames = []
+
+    canary_cfg = cf.get("canary")
+    ramp = r.check(lambda: resolve_canary_ramp(canary_cfg), f"{where_cf}canary") or [100]
+    hold = r.integer(canary_cfg if isinstance(canary_cfg, dict) else {}, "holdSeconds", f"{where_cf}canary.", 0, DEFAULT_CANARY_HOLD_SECONDS)
+
+    customer_facing = CustomerFacingConfig(
+        propertyName=r.string(cf, "propertyName", where_cf),
+        propertyVersion=r.integer(cf, "propertyVersion", where_cf, 1),
+        propertyHostnames=tuple(hostnames),
+        edgeHostname=r.string(cf, "edgeHostname", where_cf, HOSTNAME_RE, required=False),
+        canaryRamp=tuple(ramp),
+        canaryHoldSeconds=hold
+    )
+
+    where_int = "propertyManager.internalHarperHostname."
+    origin = r.check(lambda: resolve_origin_profile(internal.get("originProfile")), f"{where_int}originProfile")
+    origin_name, origin_profile = origin or (None, None)
+    warnings = ()
+    if origin_profile and timeout_ms:
+        warnings = tuple(r.check(lambda: validate_origin_profile(origin_profile, timeout_ms),
+                                 f"{where_int}originProfile") or ())
+    caching = r.check(lambda: resolve_caching_profile(internal.get("cachingProfile")), f"{where_int}cachingProfile")
+
+    internal_cfg = InternalHostnameConfig(
+        internalPmConfigName=r.string(internal, "internalPmConfigName", where_int),
+        internalHostname=r.string(internal, "internalHostname", where_int, HOSTNAME_RE),
+        edgeHostname=r.string(internal, "edgeHostname", where_int, HOSTNAME_RE),
+        originHostname=r.string(internal, "originHostname", where_int, HOSTNAME_RE),
+        forwardCustomHeader=r.string(internal, "forwardCustomHeader", where_int, HOSTNAME_RE),
+        originProfileName=origin_name,
+        originProfile=freeze(origin_profile),
+        originProfileWarnings=warnings,
+        cachingProfile=freeze(caching)
+    )
+
+    return PropertyManagerConfig(
+        productId=r.string(pm, "productId", "propertyManager.", PRODUCT_ID_RE, default="prd_SPM"),
+        ruleFormat=r.string(pm, "ruleFormat", "propertyManager.", default="latest"),
+        customerFacing=customer_facing,
+        internal=internal_cfg
+    )
+
+
+def parse_edgeworker(r, raw):
+    from bundle_optimizer import resolve_budget
+
+    ew = r.section(raw, "edgeworker", "")
+    where = "edgeworker."
+
+    timeout_ms = r.check(lambda: get_subrequest_timeout_ms(raw), f"{where}subrequestTimeoutMs")
+    fail_open = r.check(lambda: get_subrequest_fail_open(raw), f"{where}failOpen")
+    budget = r.check(lambda: resolve_budget(ew), f"{where}bundleBudget")
+
+    dataset = r.string(ew, "redirectDataset", where, required=False)
+    r.file(dataset, f"{where}redirectDataset")
+
+    token = r.string(ew, "harper_token", where)
+    if token and "'" in token:
+        r.problems.append(f"{where}harper_token: must not contain a single quote")
+
+    return EdgeWorkerConfig(
+        name=r.string(ew, "name", where),
+        description=r.string(ew, "description", where, default=""),
+        resourceTierId=r.integer(ew, "resourceTierId", where, 1),
+        harperToken=token,
+        subrequestTimeoutMs=timeout_ms,
+        failOpen=fail_open,
+        redirectDataset=dataset,
+        minify=r.boolean(ew, "minify", where, True),
+        stripDeadLogging=r.boolean(ew, "stripDeadLogging", where),
+        budget=freeze(budget or {})
+    )
+
+
+def parse_promotion(r, raw):
+    from smoke_checks import resolve_smoke_checks, DEFAULT_TIMEOUT_MS, DEFAULT_RETRIES
+    from promotion import DEFAULT_POLL_SECONDS, DEFAULT_ACTIVATION_TIMEOUT_S
+
+    promotion = raw.get("promotion", {})
+    if not isinstance(promotion, dict):
+        r.problems.append(f"promotion: must be an object, got {promotion!r}")
+        promotion = {}
+    where = "promotion."
+
+    checks = r.check(lambda: resolve_smoke_checks(promotion.get("smokeChecks")), f"{where}smokeChecks")
+
+    return PromotionConfig(
+        smokeChecks=freeze(checks or []),
+        smokeTimeoutMs=r.integer(promotion, "smokeTimeoutMs", where, 1, DEFAULT_TIMEOUT_MS),
+        smokeRetries=r.integer(promotion, "smokeRetries", where, 0, DEFAULT_RETRIES),
+        pollSeconds=r.integer(promotion, "pollSeconds", where, 1, DEFAULT_POLL_SECONDS),
+        activationTimeoutS=r.integer(promotion, "activationTimeoutS", where, 1, DEFAULT_ACTIVATION_TIMEOUT_S)
+    )
+
+
+def compile_config(raw):
+    """Validates a raw requirements dict; raises ConfigError listing every problem."""
+    if not isinstance(raw, dict):
+        raise ConfigError([f"top level must be an object, got {type(raw).__name__}"])
+
+    r = _Reader()
+
+    contract = r.string(raw, "contractId", "", CONTRACT_ID_RE)
+    group = r.string(raw, "groupId", "", GROUP_ID_RE)
+    contract_clean = CONTRACT_ID_RE.match(contract).group(2) if contract else None
+    group_numeric = int(GROUP_ID_RE.match(group).group(2)) if group else None
+
+    edgeworker = parse_edgeworker(r, raw)
+
+    config = Config(
+        activationEmails=parse_emails(r, raw.get("activationEmails")),
+        accountId=r.string(raw, "accountId", "", ACCOUNT_ID_RE, required=False),
+        contractId=f"ctr_{contract_clean}" if contract_clean else None,
+        groupId=f"grp_{group_numeric}" if group_numeric is not None else None,
+        contractIdClean=contract_clean,
+        groupIdNumeric=group_numeric,
+        gtm=parse_gtm(r, raw),
+        propertyManager=parse_property_manager(r, raw, edgeworker.subrequestTimeoutMs),
+        edgeworker=edgeworker,
+        promotion=parse_promotion(r, raw)
+    )
+
+    for path in REQUIRED_FILES:
+        r.file(path, "required file")
+
+    if r.problems:
+        raise ConfigError(r.problems)
+    return config
+
+
+def load_config(filename=REQUIREMENTS_FILE):
+    if not os.path.exists(filename):
+        raise Exception(f"{filename} not found. Please create it with required fields.")
+    return compile_config(load_file(filename))
@@ -1,12 +1,19 @@
 import { httpRequest } from 'http-request';
 import { logger } from 'log';
+import { EXACT_REDIRECTS, PREFIX_REDIRECTS } from './redirects.js';
 
 const HARPPER_TOKEN = 'xxxxxxx';
 const SUBREQUEST_BASE_URL = 'https://internal-harper-xxx.test.com';
+const SUBREQUEST_TIMEOUT_MS = 150;
+const FAIL_OPEN = true;
 
 const PMUSER_103_HINTS = 'PMUSER_103_HINTS';
 const PMUSER_103_HINTS_ENABLED = 'PMUSER_103_HINTS_ENABLED';
 
+// Kill switch, set in the property rule tree (no new EdgeWorker version needed)
+const PMUSER_HARPER_ENABLED = 'PMUSER_HARPER_ENABLED';
+const PMUSER_HARPER_TIMEOUT_MS = 'PMUSER_HARPER_TIMEOUT_MS';
+
 
 
 function isSafari(request) {
@@ -14,7 +21,67 @@ function isSafari(request) {
 }
 
 
+// PMUSER_HARPER_ENABLED = 'false' skips the Harper subrequest; a positive
+// PMUSER_HARPER_TIMEOUT_MS can only lower the generated timeout.
+function harperSettings(request) {
+	const enabled = request.getVariable(PMUSER_HARPER_ENABLED);
+	const override = parseInt(request.getVariable(PMUSER_HARPER_TIMEOUT_MS), 10);
+
+	return {
+		enabled: enabled !== 'false',
+		timeout: override > 0 && override < SUBREQUEST_TIMEOUT_MS ? override : SUBREQUEST_TIMEOUT_MS,
+	};
+}
+
+
+// Compiled redirect table (redirects.js): exact match first, then the
+// longest path-segment prefix. Entries are [statusCode, location(, appendPath)].
+function lookupLocalRedirect(request) {
+	const exact = EXACT_REDIRECTS[request.host + request.url] || EXACT_REDIRECTS[request.url] || EXACT_REDIRECTS[request.path];
+	if (exact) {
+		return exact;
+	}
+
+	const segments = request.path.split('/');
+	let node = PREFIX_REDIRECTS;
+	let best = node['$'];
+	let bestDepth = 0;
+
+	for (let i = 1; i < segments.length && segments[i] !== ''; i++) {
+		node = node['/' + segments[i]];
+		if (!node) {
+			break;
+		}
+		if (node['$']) {
+			best = node['$'];
+			bestDepth = i;
+		}
+	}
+
+	if (!best) {
+		return null;
+	}
+
+	if (best[2]) {
+		const rest = segments.slice(bestDepth + 1).join('/');
+		return [best[0], rest ? `${best[1].replace(/\/$/, '')}/${rest}` : best[1]];
+	}
+	return best;
+}
+
+
 export async function onClientRequest(request) {
+	const localRedirect = lookupLocalRedirect(request);
+	if (localRedirect) {
+		request.respondWith(localRedirect[0], { 'location': [localRedirect[1]] }, '');
+		return;
+	}
+
+	const settings = harperSettings(request);
+	if (!settings.enabled) {
+		return;
+	}
+
 	let url = `${SUBREQUEST_BASE_URL}/handler?isSafari=${isSafari(request) ? '1' : '0'}`;
 
 
@@ -35,12 +102,21 @@ export async function onClientRequest(request) {
 	};
 
 	const options = {
-		timeout: 150,
+		timeout: settings.timeout,
 		method: 'GET',
 		headers: requestHeaders,
 	};
 
-	const response = await httpRequest(url, options);
+	let response;
+	try {
+		response = await httpRequest(url, options);
+	} catch (error) {
+		// Timeout or network error: serve the page without redirect/hints
+		if (FAIL_OPEN) {
+			return;
+		}
+		throw error;
+	}
 
 	if (response.status == 200) {
 		const jsonResponse = await response.json();
@@ -0,0 +1,3 @@
+// Generated by redirect_compiler.py — do not edit.
+export const EXACT_REDIRECTS = {};
+export const PREFIX_REDIRECTS = {};
@@ -0,0 +1,142 @@
+from urllib.parse import quote, urlsplit
+
+
+# ============================================================
+# PYTHON MODEL OF data/edgeworker/main.js (onClientRequest)
+# ============================================================
+# Keep in step with main.js: isSafari, `v` extraction, subrequest
+# headers, and the redirect-or-hints decision.
+
+PMUSER_103_HINTS = "PMUSER_103_HINTS"
+PMUSER_103_HINTS_ENABLED = "PMUSER_103_HINTS_ENABLED"
+PMUSER_HARPER_ENABLED = "PMUSER_HARPER_ENABLED"
+PMUSER_HARPER_TIMEOUT_MS = "PMUSER_HARPER_TIMEOUT_MS"
+
+
+def encode_uri_component(value):
+    """Same escaping as JavaScript's encodeURIComponent."""
+    return quote(value, safe="-_.!~*'()")
+
+
+def make_client_request(url, brand_name=""):
+    """
+    Builds the subset of the EdgeWorker request object that main.js reads.
+    request.url is the path plus query string, as in EdgeWorkers.
+    """
+    parts = urlsplit(url)
+    path = parts.path or "/"
+
+    return {
+        "scheme": parts.scheme or "https",
+        "host": parts.netloc,
+        "path": path,
+        "url": f"{path}?{parts.query}" if parts.query else path,
+        "query": parts.query,
+        "brandName": brand_name or ""
+    }
+
+
+def harper_settings(variables, default_timeout_ms):
+    """
+    Kill switch: PMUSER_HARPER_ENABLED == "false" skips the subrequest, and a
+    positive PMUSER_HARPER_TIMEOUT_MS can only lower the generated timeout.
+    """
+    try:
+        override = int(variables.get(PMUSER_HARPER_TIMEOUT_MS, ""))
+    except ValueError:
+        override = 0
+
+    return {
+        "enabled": variables.get(PMUSER_HARPER_ENABLED) != "false",
+        "timeout": override if 0 < override < default_timeout_ms else default_timeout_ms
+    }
+
+
+def lookup_local_redirect(exact, trie, request):
+    """
+    Compiled redirect table lookup (see redirect_compiler.py): exact match on
+    host + url, url, then path; otherwise the longest path-segment prefix.
+    Returns [statusCode, location] or None.
+    """
+    hit = exact.get(request["host"] + request["url"]) or exact.get(request["url"]) or exact.get(request["path"])
+    if hit:
+        return hit
+
+    segments = request["path"].split("/")
+    node = trie
+    best = node.get("$")
+    best_depth = 0
+
+    for i in range(1, len(segments)):
+        if segments[i] == "":
+            break
+        node = node.get("/" + segments[i])
+        if not node:
+            break
+        if node.get("$"):
+            best = node["$"]
+            best_depth = i
+
+    if not best:
+        return None
+
+    if len(best) > 2 and best[2]:
+        rest = "/".join(segments[best_depth + 1:])
+        return [best[0], f"{best[1].rstrip('/')}/{rest}" if rest else best[1]]
+    return best
+
+
+def is_safari(request):
+    return request.get("brandName") == "Safari"
+
+
+def build_subrequest_url(base_url, request):
+    url = f"{base_url}/handler?isSafari={'1' if is_safari(request) else '0'}"
+
+    if request["query"] != "":
+        for p in request["query"].split("&"):
+            # JS destructuring of split("=") keeps only the first two pieces
+            pieces = p.split("=")
+            key = pieces[0]
+            value = pieces[1] if len(pieces) > 1 else ""
+            if key == "v":
+                url += f"&v={encode_uri_component(value)}"
+
+    return url
+
+
+def build_subrequest_headers(token, request):
+    return {
+        "Authorization": f"Basic {token}",
+        "Content-Type": "application/json",
+        "Path": f"{request['scheme']}://{request['host']}{request['url']}"
+    }
+
+
+def decide(status, body):
+    """
+    Mirrors the response handling in onClientRequest. Returns
+        {"action": "redirect", "statusCode": ..., "location": ...}
+        {"action": "hints", "variables": {...}}
+        {"action": "none"}
+    """
+    if status != 200 or not isinstance(body, dict):
+        return {"action": "none"}
+
+    if body.get("redirect"):
+        return {
+            "action": "redirect",
+            "statusCode": body["redirect"].get("statusCode"),
+            "location": body["redirect"].get("redirectURL")
+        }
+
+    if body.get("hints"):
+        return {
+            "action": "hints",
+            "variables": {
+                PMUSER_103_HINTS: body["hints"],
+                PMUSER_103_HINTS_ENABLED: "true"
+            }
+        }
+
+    return {"action": "none"}
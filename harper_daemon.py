@@ -0,0 +1,399 @@
+import os
+import sys
+import time
+import uuid
+import shutil
+import signal
+import argparse
+import datetime
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import main as pipeline
+from caches import enable_caches, cache_stats
+from config_model import load_config, compile_config
+from helpers import init_edgegrid_session, write_result
+from session_registry import SessionRegistry, DEFAULT_SECTION, DEFAULT_MAX_CONCURRENT
+from json_codec import dumps, load_file
+from log import get_logger, configure_logging, log_context, log_to_file
+from manage_edgeworker import EDGEWORKER_FOLDER
+from tracing import start_trace
+
+log = get_logger("daemon")
+
+
+# ============================================================
+# SPOOL LAYOUT
+# ============================================================
+# spool/incoming/<jobId>.json   submitted jobs, claimed by an atomic rename
+# spool/jobs/<jobId>/job.json   the job spec
+#                    status.json  queued | running | succeeded | failed
+#                    result.json  same shape as main.py's result.json
+#                    job.log      this job's log lines
+#                    edgeworker/  private copy of data/edgeworker
+# spool/daemon.json             pid, workers, running jobs, cache stats
+SPOOL_DIR = "spool"
+DEFAULT_WORKERS = 4
+DEFAULT_POLL_INTERVAL = 0.5
+
+NETWORKS = ("staging", "production", "saveonly")
+
+
+def utc_now():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+def new_job_id():
+    return datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+
+def write_json_atomic(path, obj):
+    """Readers (status, other daemons) never see a half-written file."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(dumps(obj, indent=True))
+    os.replace(tmp, path)
+
+
+def job_dir(spool, job_id):
+    return os.path.join(spool, "jobs", job_id)
+
+
+# ============================================================
+# CLIENT SIDE: submit + status
+# ============================================================
+def validate_job(spec):
+    if spec.get("activationNetwork") not in NETWORKS:
+        raise Exception(f"activationNetwork must be one of {', '.join(NETWORKS)}, got {spec.get('activationNetwork')!r}")
+    if spec.get("harperSwitch") not in (None, "on", "off"):
+        raise Exception(f"harperSwitch must be 'on' or 'off', got {spec['harperSwitch']!r}")
+    if not isinstance(spec.get("requirements"), dict) and not spec.get("requirementsFile"):
+        raise Exception("A job needs 'requirements' (object) or 'requirementsFile' (path)")
+    for key in ("accountSwitchKey", "edgercSection"):
+        if spec.get(key) is not None and not isinstance(spec[key], str):
+            raise Exception(f"{key} must be a string, got {spec[key]!r}")
+
+
+def submit_job(spec, spool=SPOOL_DIR):
+    """Drops a job into spool/incoming; returns its id."""
+    validate_job(spec)
+    job_id = spec.get("id") or new_job_id()
+    spec = dict(spec, id=job_id, submittedAt=utc_now())
+
+    incoming = os.path.join(spool, "incoming")
+    os.makedirs(incoming, exist_ok=True)
+    write_json_atomic(os.path.join(incoming, f"{job_id}.json"), spec)
+    return job_id
+
+
+def read_status(spool=SPOOL_DIR, job_id=None):
+    """One job's status, or all of them (oldest first)."""
+    if job_id:
+        return load_file(os.path.join(job_dir(spool, job_id), "status.json"))
+
+    statuses = []
+    jobs_root = os.path.join(spool, "jobs")
+    if os.path.isdir(jobs_root):
+        for name in sorted(os.listdir(jobs_root)):
+            path = os.path.join(jobs_root, name, "status.json")
+            if os.path.exists(path):
+                statuses.append(load_file(path))
+
+    # not yet claimed by a daemon
+    incoming = os.path.join(spool, "incoming")
+    if os.path.isdir(incoming):
+        for name in sorted(os.listdir(incoming)):
+            if name.endswith(".json"):
+                statuses.append({"id": name[:-5], "state": "submitted"})
+    return statuses
+
+
+# ============================================================
+# DAEMON
+# ============================================================
+class HarperDaemon:
+
+    def __init__(self, spool=SPOOL_DIR, workers=DEFAULT_WORKERS, poll_interval=DEFAULT_POLL_INTERVAL,
+                 verbose=False, session_factory=init_edgegrid_session, history_full=False,
+                 account_concurrency=DEFAULT_MAX_CONCURRENT):
+        self.spool = spool
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+        self.history_full = history_full
+        # warm sessions, one per edgerc section + account, shared by its jobs
+        self.sessions = SessionRegistry(session_factory, account_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.stopping = threading.Event()
+        self.started_at = utc_now()
+
+        self.lock = threading.Lock()
+        self.running = set()
+        self.counts = {"succeeded": 0, "failed": 0}
+        # jobs for the same customer property run one at a time (each
+        # creates and activates versions of that property)
+        self.property_locks = defaultdict(threading.Lock)
+
+        for sub in ("incoming", "jobs"):
+            os.makedirs(os.path.join(spool, sub), exist_ok=True)
+
+    # ------------------------------------------------------
+    # STATUS FILES
+    # ------------------------------------------------------
+    def set_status(self, job_id, **fields):
+        path = os.path.join(job_dir(self.spool, job_id), "status.json")
+        status = load_file(path) if os.path.exists(path) else {"id": job_id}
+        status.update(fields)
+        write_json_atomic(path, status)
+        return status
+
+    def write_daemon_status(self):
+        with self.lock:
+            running = sorted(self.running)
+            counts = dict(self.counts)
+        write_json_atomic(os.path.join(self.spool, "daemon.json"), {
+            "pid": os.getpid(),
+            "startedAt": self.started_at,
+            "updatedAt": utc_now(),
+            "workers": self.workers,
+            "running": running,
+            "completed": counts,
+            "caches": cache_stats(),
+            "sessions": self.sessions.stats()
+        })
+
+    # ------------------------------------------------------
+    # QUEUE
+    # ------------------------------------------------------
+    def recover(self):
+        """After a restart: requeue jobs that never started, fail the interrupted ones."""
+        jobs_root = os.path.join(self.spool, "jobs")
+        for job_id in sorted(os.listdir(jobs_root)):
+            path = os.path.join(jobs_root, job_id, "status.json")
+            if not os.path.exists(path):
+                # claimed just before a crash
+                state = "queued" if os.path.exists(os.path.join(jobs_root, job_id, "job.json")) else None
+            else:
+                state = load_file(path).get("state")
+            if state == "queued":
+                log.info("Requeueing job %s", job_id)
+                self.executor.submit(self.run_job, job_id)
+            elif state == "running":
+                log.warning("Job %s was interrupted by a daemon restart", job_id)
+                self.set_status(job_id, state="failed", finishedAt=utc_now(),
+                                error="interrupted: daemon restarted while the job was running")
+
+    def claim_incoming(self):
+        incoming = os.path.join(self.spool, "incoming")
+        for name in sorted(os.listdir(incoming)):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-5]
+            target = job_dir(self.spool, job_id)
+            os.makedirs(target, exist_ok=True)
+            try:
+                os.rename(os.path.join(incoming, name), os.path.join(target, "job.json"))
+            except FileNotFoundError:
+                continue    # claimed by another daemon on the same spool
+
+            self.set_status(job_id, state="queued", queuedAt=utc_now())
+            log.info("Job %s queued", job_id)
+            self.executor.submit(self.run_job, job_id)
+
+    # ------------------------------------------------------
+    # ONE JOB
+    # ------------------------------------------------------
+    def run_job(self, job_id):
+        folder = job_dir(self.spool, job_id)
+
+        with self.lock:
+            self.running.add(job_id)
+
+        with log_context(job_id), log_to_file(job_id, os.path.join(folder, "job.log")):
+            started = time.perf_counter()
+            try:
+                spec = load_file(os.path.join(folder, "job.json"))
+                validate_job(spec)
+                network = spec["activationNetwork"]
+                self.set_status(job_id, state="running", startedAt=utc_now(),
+                                activationNetwork=network, harperSwitch=spec.get("harperSwitch"),
+                                accountSwitchKey=spec.get("accountSwitchKey"))
+
+                if isinstance(spec.get("requirements"), dict):
+                    config = compile_config(spec["requirements"])
+                else:
+                    config = load_config(spec["requirementsFile"])
+
+                property_key = (spec.get("edgercSection") or DEFAULT_SECTION, spec.get("accountSwitchKey"),
+                                config.contractId, config.propertyManager.customerFacing.propertyName)
+                with self.property_locks[property_key]:
+                    results = self.execute(job_id, folder, spec, config)
+
+                errors = {k: v for k, v in results.items() if k.endswith("_error")}
+                state = "failed" if errors else "succeeded"
+                self.set_status(job_id, state=state, finishedAt=utc_now(),
+                                durationS=round(time.perf_counter() - started, 3),
+                                errors=errors, propertyId=results.get("customerFacingPropertyId"))
+                log.info("Job %s %s in %.1fs", job_id, state, time.perf_counter() - started)
+
+            except BaseException as e:
+                # workflows may sys.exit(); that must end the job, not the worker
+                state = "failed"
+                log.error("Job %s failed: %s", job_id, e)
+                self.set_status(job_id, state=state, finishedAt=utc_now(),
+                                durationS=round(time.perf_counter() - started, 3),
+                                error=str(e) or type(e).__name__)
+
+        with self.lock:
+            self.running.discard(job_id)
+            self.counts[state] += 1
+        self.write_daemon_status()
+
+    def execute(self, job_id, folder, spec, config):
+        # private EdgeWorker sources: update_main_js / the bundle build write here
+        workspace = os.path.join(folder, "edgeworker")
+        if not os.path.isdir(workspace):
+            shutil.copytree(EDGEWORKER_FOLDER, workspace,
+                            ignore=shutil.ignore_patterns("build", "*.tgz", ".DS_Store"))
+
+        session, baseurl = self.sessions.get(config, spec.get("edgercSection"), spec.get("accountSwitchKey"))
+
+        results = {}
+        start_trace(job_id)
+        try:
+            results.update(pipeline.run_pipeline(
+                session, baseurl, config,
+                activationMode=spec["activationNetwork"],
+                accountSwitchKey=spec.get("accountSwitchKey"),
+                verbose=self.verbose,
+                harper_switch=spec.get("harperSwitch"),
+                harper_timeout_ms=spec.get("harperTimeoutMs"),
+                edgeworker_folder=workspace
+            ))
+        finally:
+            pipeline.finish_trace(results, None)
+
+        results["jobId"] = job_id
+        write_result(results, os.path.join(folder, "result.json"))
+        pipeline.record_history(results, self.history_full)
+        return results
+
+    # ------------------------------------------------------
+    # LOOP
+    # ------------------------------------------------------
+    def serve(self):
+        enable_caches()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self.stopping.set())
+
+        log.info("=== Harper daemon: %s workers, spool %s ===", self.workers, os.path.abspath(self.spool))
+        self.recover()
+        self.write_daemon_status()
+
+        while not self.stopping.is_set():
+            try:
+                self.claim_incoming()
+            except Exception as e:
+                log.error("Unable to read %s/incoming: %s", self.spool, e)
+            self.stopping.wait(self.poll_interval)
+
+        log.info("Stopping: waiting for %s running job(s)…", len(self.running))
+        self.executor.shutdown(wait=True)
+        self.write_daemon_status()
+        self.sessions.close()
+        log.info("=== Harper daemon stopped ===")
+
+
+# ============================================================
+# CLI
+# ============================================================
+def print_statuses(statuses):
+    print(f"{'job':<24} {'state':<10} {'network':<11} {'duration':>9}  detail")
+    for s in statuses:
+        detail = s.get("error") or ", ".join(s.get("errors", {}) or {}) or s.get("propertyId") or ""
+        duration = f"{s['durationS']}s" if s.get("durationS") is not None else "-"
+        print(f"{s['id']:<24} {s['state']:<10} {s.get('activationNetwork') or '-':<11} {duration:>9}  {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running Harper rollout service (spool-directory job queue)")
+    parser.add_argument("--spool", default=SPOOL_DIR, help="Spool directory (default: spool)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Run the daemon")
+    serve.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jobs processed concurrently")
+    serve.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds between spool scans")
+    serve.add_argument("--verbose", action="store_true")
+    serve.add_argument("--log-format", choices=["text", "json"], default="text")
+    serve.add_argument("--history-full", action="store_true")
+    serve.add_argument("--account-concurrency", type=int, default=DEFAULT_MAX_CONCURRENT,
+                       help="Most API calls in flight per account, across all of its jobs")
+
+    submit = sub.add_parser("submit", help="Queue a rollout job (or one per account with --batch)")
+    submit.add_argument("--activation-network", required=True, choices=list(NETWORKS))
+    submit.add_argument("--requirements", default="requirements.json",
+                        help="requirements.json to snapshot into the job")
+    submit.add_argument("--account-switch-key")
+    submit.add_argument("--edgerc-section", help="~/.edgerc section (default: default)")
+    submit.add_argument("--batch", metavar="FILE",
+                        help="JSON list of per-job overrides (accountSwitchKey, edgercSection, "
+                             "requirements, activationNetwork, …); one job each")
+    submit.add_argument("--harper-switch", choices=["on", "off"])
+    submit.add_argument("--harper-timeout-ms", type=int)
+
+    status = sub.add_parser("status", help="Show job status")
+    status.add_argument("job_id", nargs="?")
+    status.add_argument("--json", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        configure_logging(verbose=args.verbose, fmt=args.log_format)
+        HarperDaemon(args.spool, args.workers, args.poll_interval, args.verbose,
+                     history_full=args.history_full, account_concurrency=args.account_concurrency).serve()
+
+    elif args.command == "submit":
+        defaults = {
+            "requirements": args.requirements,
+            "activationNetwork": args.activation_network,
+            "accountSwitchKey": args.account_switch_key,
+            "edgercSection": args.edgerc_section,
+            "harperSwitch": args.harper_switch,
+            "harperTimeoutMs": args.harper_timeout_ms
+        }
+        try:
+            overrides = load_file(args.batch) if args.batch else [{}]
+            if not isinstance(overrides, list) or not all(isinstance(o, dict) for o in overrides):
+                raise Exception(f"{args.batch}: expected a JSON list of objects")
+
+            specs = []
+            for override in overrides:
+                spec = dict(defaults, **override)
+                # validate now so a broken file is rejected at submit time
+                spec["requirements"] = load_file(spec["requirements"])
+                compile_config(spec["requirements"])
+                validate_job(spec)
+                specs.append(spec)
+        except Exception as e:
+            log.error("%s", e)
+            sys.exit(1)
+
+        # all validated: queue every job or none
+        for spec in specs:
+            print(submit_job(spec, args.spool))
+
+    elif args.command == "status":
+        try:
+            data = read_status(args.spool, args.job_id)
+        except FileNotFoundError:
+            log.error("No job %s in %s", args.job_id, args.spool)
+            sys.exit(1)
+        if args.json:
+            print(dumps(data, indent=True).decode("utf-8"))
+        else:
+            print_statuses([data] if args.job_id else data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import json
+import math
+import random
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+
+# ============================================================
+# LATENCY DISTRIBUTIONS
+# ============================================================
+def parse_latency_spec(spec):
+    """
+    Turns a latency spec into a callable returning milliseconds.
+
+        fixed:20             always 20ms
+        uniform:5:40         uniform between 5 and 40ms
+        lognormal:20:0.5     median 20ms, sigma 0.5 (long right tail)
+        exponential:15       mean 15ms
+    """
+    parts = str(spec).split(":")
+    kind, args = parts[0], [float(x) for x in parts[1:]]
+
+    if kind == "fixed" and len(args) == 1:
+        return lambda: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(args[0])
+        return lambda: random.lognormvariate(mu, args[1])
+    if kind == "exponential" and len(args) == 1:
+        return lambda: random.expovariate(1.0 / args[0])
+
+    raise Exception(
+        f"Invalid latency spec '{spec}' "
+        f"(expected fixed:MS, uniform:MIN:MAX, lognormal:MEDIAN:SIGMA or exponential:MEAN)"
+    )
+
+
+# ============================================================
+# REDIRECT / HINTS DATASET
+# ============================================================
+def load_dataset(path):
+    """
+    Loads a stand-in dataset:
+
+        {
+          "redirects": {"/old-page": {"statusCode": 301, "redirectURL": "https://www.example.com/new"}},
+          "hints":     {"/": "</app.css>; rel=preload; as=style"}
+        }
+
+    Keys may be full URLs (as sent in the Path header), paths with query, or bare paths.
+    """
+    if not path:
+        return {"redirects": {}, "hints": {}}
+
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    data.setdefault("redirects", {})
+    data.setdefault("hints", {})
+    return data
+
+
+def path_candidates(path_header):
+    """Full URL first, then path + query, then bare path."""
+    parts = urlsplit(path_header)
+    path = parts.path or "/"
+    candidates = [path_header]
+
+    if parts.query:
+        candidates.append(f"{path}?{parts.query}")
+    candidates.append(path)
+
+    return candidates
+
+
+def lookup_decision(dataset, path_header):
+    """Returns the JSON body Harper would answer /handler with."""
+    candidates = path_candidates(path_header or "")
+
+    for key in candidates:
+        if key in dataset["redirects"]:
+            return {"redirect": dataset["redirects"][key]}
+
+    for key in candidates:
+        if key in dataset["hints"]:
+            return {"hints": dataset["hints"][key]}
+
+    return {}
+
+
+# ============================================================
+# ASYNCIO HTTP STAND-IN
+# ============================================================
+class HarperStandIn:
+    """
+    Minimal HTTP/1.1 keep-alive server answering Harper's /handler and
+    /status endpoints from a local dataset, with injected latency and errors.
+    """
+
+    def __init__(self, dataset, latency="fixed:0", host="127.0.0.1", port=0,
+                 error_rate=0.0, token=None):
+        self.dataset = dataset
+        self.latency = parse_latency_spec(latency)
+        self.host = host
+        self.port = port
+        self.error_rate = error_rate
+        self.token = token
+        self.server = None
+        self.clients = set()
+        self.stats = {"handler": 0, "status": 0, "errors": 0, "notFound": 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+        # Handlers still sleeping on behalf of clients that timed out
+        pending = list(self.clients)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self.clients.add(task)
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line or request_line in (b"\r\n", b"\n"):
+                    break
+
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0) or 0)
+                if length:
+                    await reader.readexactly(length)
+
+                status, body = await self.route(method, target, headers)
+                payload = json.dumps(body).encode()
+
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'ERROR'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(task)
+            writer.close()
+
+    async def route(self, method, target, headers):
+        path = urlsplit(target).path
+
+        if path == "/status":
+            self.stats["status"] += 1
+            return 200, {"status": "OK"}
+
+        if path != "/handler":
+            self.stats["notFound"] += 1
+            return 404, {"error": "not found"}
+
+        self.stats["handler"] += 1
+
+        if self.token and headers.get("authorization") != f"Basic {self.token}":
+            return 401, {"error": "unauthorized"}
+
+        await asyncio.sleep(max(0.0, self.latency()) / 1000.0)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return 503, {"error": "injected"}
+
+        return 200, lookup_decision(self.dataset, headers.get("path"))
+
+
+# ============================================================
+# STANDALONE ENTRY
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Local Harper /handler + /status stand-in")
+    parser.add_argument("--dataset", help="Redirect / hints dataset JSON")
+    parser.add_argument("--latency", default="fixed:0", help="Latency spec, e.g. lognormal:20:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of /handler calls answered 503")
+    parser.add_argument("--token", help="Require Authorization: Basic <token>")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    async def serve():
+        standin = await HarperStandIn(
+            load_dataset(args.dataset), args.latency, args.host, args.port,
+            args.error_rate, args.token
+        ).start()
+        print(f"[INFO] Harper stand-in listening on http://{standin.host}:{standin.port}")
+        async with standin.server:
+            await standin.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,14 @@
-import json
 import os
 import datetime
-from akamai.edgegrid import EdgeRc, EdgeGridAuth
-import requests
+from types import MappingProxyType
 
+import caches
+import prefetch
+from tracing import traced
+from log import get_logger
+from json_codec import load_file, write_file, response_json
 
-# ============================================================
-# VERBOSE DEBUG LOGGER
-# ============================================================
-def dbg(session, msg):
-    """Print debug messages only if verbose mode is enabled."""
-    if isinstance(session, dict) and session.get("verbose"):
-        print(f"[DEBUG] {msg}")
+log = get_logger("helpers")
 
 
 # ============================================================
@@ -29,49 +26,118 @@ def load_requirements():
             f"{filename} not found. Please create it with required fields."
         )
 
-    with open(filename, "r") as f:
-        return json.load(f)
+    return load_file(filename)
 
 
 # ============================================================
 # write_result.json (used by main)
 # ============================================================
-def write_result(data: dict):
+def write_result(data: dict, path="result.json"):
     """
     Writes result.json (overwrites each run).
     main.py constructs the overall results dictionary.
     """
     data["timestamp"] = datetime.datetime.utcnow().isoformat() + "Z"
 
-    with open("result.json", "w") as f:
-        json.dump(data, f, indent=4)
+    write_file(path, data)
 
 
 # ============================================================
 # EdgeGrid session initialization
 # ============================================================
-def init_edgegrid_session(config):
+def init_edgegrid_session(config, record_to=None, replay_from=None, replay_speed="recorded",
+                          section="default"):
     """
-    Creates an EdgeGrid-authenticated session from ~/.edgerc.
+    Creates an EdgeGrid-authenticated session from the ~/.edgerc `section`.
+    With record_to, every call is also written to that cassette (secrets
+    redacted); with replay_from, calls are answered from a cassette and
+    ~/.edgerc is not read (see http_recorder.py).
     Returns:
         session (requests.Session)
         baseurl (e.g., https://akab-xxx.luna.akamaiapis.net)
     """
+    # imported here: requests + edgegrid are most of the startup time, and
+    # --help or a config error should not pay for them
+    import requests
+    from akamai.edgegrid import EdgeRc, EdgeGridAuth
+    from http_recorder import (
+        RecordingSession,
+        ReplaySession,
+        REPLAY_BASEURL,
+        edgerc_secrets,
+        config_secrets
+    )
+
+    if replay_from:
+        session = ReplaySession(replay_from, replay_speed)
+        session.headers.update({"Content-Type": "application/json"})
+        return session, REPLAY_BASEURL
+
     # Load ~/.edgerc credentials
     edgerc = EdgeRc(os.path.expanduser("~/.edgerc"))
-    section = "default"
+    if not edgerc.has_section(section):
+        raise Exception(f"No section [{section}] in ~/.edgerc")
 
     host = edgerc.get(section, "host")     # e.g., akab-xxxx.luna.akamaiapis.net
     baseurl = f"https://{host}"
 
     # Prepare EdgeGrid session
-    session = requests.Session()
+    if record_to:
+        session = RecordingSession(record_to, edgerc_secrets(edgerc, section) + config_secrets(config))
+    else:
+        session = requests.Session()
     session.auth = EdgeGridAuth.from_edgerc(edgerc, section)
     session.headers.update({"Content-Type": "application/json"})
 
     return session, baseurl
 
 
+# ============================================================
+# EdgeWorker subrequest parameters (shared by PM + EW workflows)
+# ============================================================
+# The EdgeWorker gives the whole Harper subrequest this many milliseconds
+DEFAULT_SUBREQUEST_TIMEOUT_MS = 150
+
+def get_subrequest_timeout_ms(config):
+    """edgeworker.subrequestTimeoutMs, validated as a positive integer."""
+    value = config.get("edgeworker", {}).get("subrequestTimeoutMs", DEFAULT_SUBREQUEST_TIMEOUT_MS)
+
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise Exception(f"edgeworker.subrequestTimeoutMs must be a positive integer, got {value!r}")
+
+    return value
+
+
+def get_subrequest_fail_open(config):
+    """edgeworker.failOpen: continue without Harper when the subrequest fails (default True)."""
+    value = config.get("edgeworker", {}).get("failOpen", True)
+
+    if not isinstance(value, bool):
+        raise Exception(f"edgeworker.failOpen must be true or false, got {value!r}")
+
+    return value
+
+
+# ============================================================
+# Frozen config values (config_model)
+# ============================================================
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Plain dicts / lists again, for rule trees and result.json."""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
 # ============================================================
 # Timestamp helper
 # ============================================================
@@ -80,49 +146,75 @@ def now_utc():
 
 
 # ============================================================
-# Find propertyId from propertyName using PAPI list-properties
+# Property listing (one PAPI call per contract/group and run)
 # ============================================================
-def find_property_id_by_name(session, baseurl, propertyName, contractId, groupId, accountSwitchKey):
-    """
-    Performs PAPI GET /papi/v1/properties to resolve propertyId
-    from a human-readable propertyName.
-
-    session: requests.Session (EdgeGrid auth)
-    baseurl: e.g., https://akab-xxx.luna.akamaiapis.net
-    accountSwitchKey: optional, only appended if provided
-    """
+def properties_listing_key(section, contractId, groupId, accountSwitchKey):
+    return ("properties", section, accountSwitchKey, contractId.replace("ctr_", ""), groupId.replace("grp_", ""))
 
-    print(f"[STEP] Looking up propertyId for propertyName = {propertyName}")
 
+@traced()
+def list_properties(session, baseurl, contractId, groupId, accountSwitchKey):
+    """
+    PAPI GET /papi/v1/properties for the contract/group, as a
+    propertyName -> [item] index. Listed once and cached (caches.listings);
+    create_property() adds what it creates.
+    """
     # Clean contract and group IDs to ensure correct formatting
     contractId_clean = contractId.replace("ctr_", "")
     groupId_clean = groupId.replace("grp_", "")
 
-    suffix = f"&accountSwitchKey={accountSwitchKey}" if accountSwitchKey else ""
+    def fetch():
+        url = baseurl + "/papi/v1/properties"
+
+        params = {
+            "contractId": f"ctr_{contractId_clean}",
+            "groupId": f"grp_{groupId_clean}"
+        }
+        if accountSwitchKey:
+            params["accountSwitchKey"] = accountSwitchKey
+
+        log.debug("GET %s params=%s", url, params)
+
+        result = session.get(url, params=params, headers={"Accept": "application/json"})
+        log.debug("Response Status = %s", result.status_code)
+
+        if result.status_code != 200:
+            raise Exception(f"Failed to fetch PAPI properties: {result.text}")
 
-    path = (
-        f"/papi/v1/properties"
-        f"?contractId=ctr_{contractId_clean}"
-        f"&groupId=grp_{groupId_clean}"
-        f"{suffix}"
+        items = response_json(result).get("properties", {}).get("items", [])
+        return caches.index_by_name(items, "propertyName")
+
+    return caches.cached_listing(
+        properties_listing_key(caches.session_section(session), contractId, groupId, accountSwitchKey), fetch
     )
 
-    url = baseurl + path
-    dbg({"verbose": True}, f"GET {url}")
 
-    result = session.get(url, headers={"Accept": "application/json"})
-    dbg({"verbose": True}, f"Response Status = {result.status_code}")
+# ============================================================
+# Find propertyId from propertyName using PAPI list-properties
+# ============================================================
+@traced()
+def find_property_id_by_name(session, baseurl, propertyName, contractId, groupId, accountSwitchKey):
+    """
+    Resolves propertyId from a human-readable propertyName through the
+    cached property listing.
+
+    session: requests.Session (EdgeGrid auth)
+    baseurl: e.g., https://akab-xxx.luna.akamaiapis.net
+    accountSwitchKey: optional, only appended if provided
+    """
+
+    log.step("Looking up propertyId for propertyName = %s", propertyName)
 
-    if result.status_code != 200:
-        raise Exception(f"Failed to fetch PAPI properties: {result.text}")
+    prop_id = prefetch.take(prefetch.property_id_key(accountSwitchKey, contractId, groupId, propertyName))
+    if prop_id is not prefetch.MISS:
+        log.info("Found propertyId = %s for %s (prefetched)", prop_id, propertyName)
+        return prop_id
 
-    data = result.json()
-    items = data.get("properties", {}).get("items", [])
+    matches = list_properties(session, baseurl, contractId, groupId, accountSwitchKey).get(propertyName)
 
-    for item in items:
-        if item.get("propertyName") == propertyName:
-            prop_id = item.get("propertyId")
-            print(f"[INFO] Found propertyId = {prop_id} for {propertyName}")
-            return prop_id
+    if matches:
+        prop_id = matches[0].get("propertyId")
+        log.info("Found propertyId = %s for %s", prop_id, propertyName)
+        return prop_id
 
     raise Exception(f"[ERROR] Property '{propertyName}' not found under contract/group.")
@@ -0,0 +1,231 @@
+import gzip
+import json
+import time
+import hashlib
+import datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+# ============================================================
+# CASSETTE FORMAT
+# ============================================================
+# One JSON object per line. The first line is a header:
+#   {"type": "header", "format": 1, "recordedAt": "...Z"}
+# followed by one line per HTTP call:
+#   {"type": "call", "seq": 1, "method": "PUT", "path": "/papi/v1/...",
+#    "query": "...", "startOffsetMs": 12.3, "elapsedMs": 240.1,
+#    "request": {"headers": {...}, "body": ...},
+#    "response": {"status": 200, "headers": {...}, "body": ...}}
+#
+# Bodies are stored as parsed JSON when possible, as text otherwise, and
+# binary uploads (EdgeWorker .tgz) only as size + sha256. Hostnames are not
+# recorded: paths are relative to the session's baseurl.
+CASSETTE_FORMAT = 1
+REDACTED = "<redacted>"
+REDACTED_HEADERS = ("authorization", "cookie", "set-cookie")
+KEPT_RESPONSE_HEADERS = ("content-type", "location", "retry-after", "x-ids-session-id")
+REPLAY_BASEURL = "https://replay.invalid"
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+def edgerc_secrets(edgerc, section):
+    """Credential values that must never reach a cassette."""
+    secrets = []
+    for key in ("client_secret", "access_token", "client_token"):
+        try:
+            secrets.append(edgerc.get(section, key))
+        except Exception:
+            pass
+    return secrets
+
+
+def config_secrets(config):
+    return [config.edgeworker.harperToken]
+
+
+def redact_text(text, secrets):
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, REDACTED)
+    return text
+
+
+def encode_body(body, content_type, secrets):
+    if body is None or body == b"" or body == "":
+        return None
+
+    if isinstance(body, bytes):
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return {"binary": True, "bytes": len(body), "sha256": hashlib.sha256(body).hexdigest()}
+    else:
+        text = body
+
+    text = redact_text(text, secrets)
+
+    if "json" in (content_type or "").lower() or text[:1] in ("{", "["):
+        try:
+            return {"json": json.loads(text)}
+        except ValueError:
+            pass
+    return {"text": text}
+
+
+def decode_body(entry):
+    if not entry:
+        return b""
+    if "json" in entry:
+        return json.dumps(entry["json"]).encode("utf-8")
+    if "text" in entry:
+        return entry["text"].encode("utf-8")
+    return b""
+
+
+def request_body(request):
+    """Gzipped JSON uploads (--compress-requests) are stored decompressed."""
+    body = request.body
+    if isinstance(body, bytes) and request.headers.get("Content-Encoding", "").lower() == "gzip":
+        return gzip.decompress(body)
+    return body
+
+
+def redact_headers(headers):
+    return {k: (REDACTED if k.lower() in REDACTED_HEADERS else v) for k, v in headers.items()}
+
+
+# ============================================================
+# RECORD
+# ============================================================
+class RecordingSession(requests.Session):
+    """
+    requests.Session that appends every call to a cassette file. Redaction
+    covers auth headers and any of `secrets` found in bodies.
+    """
+
+    # replay needs the same call order, so prefetch.py runs its reads serially
+    ordered = True
+
+    def __init__(self, cassette_path, secrets=()):
+        super().__init__()
+        self.cassette_path = cassette_path
+        self.secrets = [s for s in secrets if s]
+        self.seq = 0
+        self.started = time.perf_counter()
+
+        with open(self.cassette_path, "w") as f:
+            f.write(json.dumps({
+                "type": "header",
+                "format": CASSETTE_FORMAT,
+                "recordedAt": datetime.datetime.utcnow().isoformat() + "Z"
+            }) + "\n")
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        resp = super().send(request, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        self.seq += 1
+        parts = urlsplit(request.url)
+
+        entry = {
+            "type": "call",
+            "seq": self.seq,
+            "method": request.method,
+            "path": parts.path,
+            "query": redact_text(parts.query, self.secrets),
+            "startOffsetMs": round((start - self.started) * 1000, 2),
+            "elapsedMs": round(elapsed * 1000, 2),
+            "request": {
+                "headers": redact_headers(request.headers),
+                "body": encode_body(request_body(request), request.headers.get("Content-Type"), self.secrets)
+            },
+            "response": {
+                "status": resp.status_code,
+                "headers": {k: v for k, v in resp.headers.items() if k.lower() in KEPT_RESPONSE_HEADERS},
+                "body": encode_body(resp.content, resp.headers.get("Content-Type"), self.secrets)
+            }
+        }
+
+        with open(self.cassette_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        return resp
+
+
+# ============================================================
+# REPLAY
+# ============================================================
+def load_cassette(path):
+    calls = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry.get("type") == "header" and entry.get("format") != CASSETTE_FORMAT:
+                raise Exception(f"Unsupported cassette format {entry.get('format')} in {path}")
+            if entry.get("type") == "call":
+                calls.append(entry)
+    return calls
+
+
+class ReplaySession(requests.Session):
+    """
+    Answers calls from a cassette, in order, without touching the network.
+    Each call must match the recorded method and path. speed="recorded"
+    waits the recorded server time per call; speed="fast" does not wait.
+    """
+
+    ordered = True
+
+    def __init__(self, cassette_path, speed="recorded"):
+        super().__init__()
+        if speed not in ("recorded", "fast"):
+            raise Exception(f"Unknown replay speed '{speed}'")
+
+        self.cassette_path = cassette_path
+        self.calls = load_cassette(cassette_path)
+        self.speed = speed
+        self.position = 0
+
+    def remaining(self):
+        return len(self.calls) - self.position
+
+    def send(self, request, **kwargs):
+        if self.position >= len(self.calls):
+            raise ReplayMismatch(
+                f"Cassette exhausted after {len(self.calls)} calls; unexpected {request.method} {request.url}"
+            )
+
+        entry = self.calls[self.position]
+        path = urlsplit(request.url).path
+
+        if entry["method"] != request.method or entry["path"] != path:
+            raise ReplayMismatch(
+                f"Call #{entry['seq']}: recorded {entry['method']} {entry['path']}, "
+                f"got {request.method} {path}"
+            )
+        self.position += 1
+
+        if self.speed == "recorded":
+            time.sleep(entry["elapsedMs"] / 1000.0)
+
+        recorded = entry["response"]
+        resp = requests.Response()
+        resp.status_code = recorded["status"]
+        resp.headers = CaseInsensitiveDict(recorded.get("headers", {}))
+        resp._content = decode_body(recorded.get("body"))
+        resp.encoding = "utf-8"
+        resp.url = request.url
+        resp.request = request
+        resp.reason = ""
+        resp.elapsed = datetime.timedelta(milliseconds=entry["elapsedMs"])
+        return resp
@@ -0,0 +1,142 @@
+import gzip
+import json
+import hashlib
+import logging
+
+from log import get_logger
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+log = get_logger("codec")
+
+
+# ============================================================
+# BACKEND
+# ============================================================
+# Every module encodes and decodes JSON through here. orjson is used when it
+# is installed (several times faster on large rule trees); otherwise the
+# stdlib encoder produces the same compact, UTF-8 output.
+BACKEND = "orjson" if orjson else "json"
+
+# Request bodies at least this large are gzipped when compression is on.
+DEFAULT_COMPRESS_MIN_BYTES = 16 * 1024
+
+_settings = {
+    "compressRequests": False,
+    "compressMinBytes": DEFAULT_COMPRESS_MIN_BYTES
+}
+
+
+def configure_codec(compress_requests=False, compress_min_bytes=DEFAULT_COMPRESS_MIN_BYTES):
+    """Called once by the entry point (--compress-requests)."""
+    _settings["compressRequests"] = compress_requests
+    _settings["compressMinBytes"] = compress_min_bytes
+
+
+def dumps(obj, indent=False, sort_keys=False):
+    """Encodes to UTF-8 bytes. indent=True is for files people read."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=str, option=option)
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib handles those
+            pass
+
+    return json.dumps(
+        obj,
+        indent=4 if indent else None,
+        separators=None if indent else (",", ":"),
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+        default=str
+    ).encode("utf-8")
+
+
+def loads(data):
+    """Decodes bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def canonical(obj):
+    """Sorted, compact bytes: the same object always hashes the same."""
+    return dumps(obj, sort_keys=True)
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def load_file(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def write_file(path, obj, indent=True):
+    with open(path, "wb") as f:
+        f.write(dumps(obj, indent=indent))
+
+
+# ============================================================
+# HTTP BODIES
+# ============================================================
+class EncodedJson:
+    """A payload serialized once; size and hash reuse the same bytes."""
+
+    __slots__ = ("raw", "_digest")
+
+    def __init__(self, obj):
+        self.raw = obj.raw if isinstance(obj, EncodedJson) else dumps(obj)
+        self._digest = None
+
+    @property
+    def size(self):
+        return len(self.raw)
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = digest(self.raw)
+        return self._digest
+
+
+def send_json(session, method, url, payload, headers=None, compress=False, label=None, **kwargs):
+    """
+    Sends `payload` as a JSON body. The bytes are encoded once and reused for
+    the debug dump and size log. With compress=True (only passed for
+    endpoints that accept gzip request bodies) and --compress-requests,
+    bodies of at least the configured size go out gzipped.
+    """
+    from requests.structures import CaseInsensitiveDict  # requests is loaded by then
+
+    encoded = EncodedJson(payload)
+
+    merged = CaseInsensitiveDict({"Content-Type": "application/json"})
+    merged.update(headers or {})
+
+    body = encoded.raw
+    if compress and _settings["compressRequests"] and encoded.size >= _settings["compressMinBytes"]:
+        body = gzip.compress(encoded.raw, compresslevel=6)
+        merged["Content-Encoding"] = "gzip"
+
+    if label:
+        log.payload(label, encoded.raw)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("%s body %s bytes%s (sha256 %s)", method, encoded.size,
+                  f", {len(body)} gzipped" if body is not encoded.raw else "", encoded.digest)
+
+    return session.request(method, url, data=body, headers=merged, **kwargs)
+
+
+def response_json(resp):
+    """resp.json() through the configured backend."""
+    return loads(resp.content)
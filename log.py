@@ -0,0 +1,210 @@
+import sys
+import json
+import time
+import random
+import logging
+import contextvars
+from contextlib import contextmanager
+
+
+# ============================================================
+# LEVELS
+# ============================================================
+# Console lines keep the "[TAG] message" shape the scripts always printed.
+# STEP and SUCCESS sit between INFO and WARNING so they show by default.
+STEP = 21
+SUCCESS = 25
+
+logging.addLevelName(STEP, "STEP")
+logging.addLevelName(SUCCESS, "SUCCESS")
+
+ROOT_LOGGER = "harper"
+
+# Payload dumps (log.payload) are only serialized when DEBUG is enabled,
+# are cut off after this many characters, and can be sampled.
+DEFAULT_PAYLOAD_MAX_CHARS = 4000
+
+_target = contextvars.ContextVar("log_target", default=None)
+_settings = {
+    "payloadMaxChars": DEFAULT_PAYLOAD_MAX_CHARS,
+    "payloadSampleRate": 1.0
+}
+
+
+# ============================================================
+# LOGGER
+# ============================================================
+class HarperLogger(logging.Logger):
+
+    def step(self, msg, *args, **kwargs):
+        if self.isEnabledFor(STEP):
+            self._log(STEP, msg, args, **kwargs)
+
+    def success(self, msg, *args, **kwargs):
+        if self.isEnabledFor(SUCCESS):
+            self._log(SUCCESS, msg, args, **kwargs)
+
+    def payload(self, label, obj, level=logging.DEBUG):
+        """
+        Dumps an API payload (dict / list, str / bytes, or a requests.Response).
+        Costs one level check when disabled; when enabled, serialization
+        stops at the size cap instead of encoding a whole rule tree only to
+        truncate it.
+        """
+        if not self.isEnabledFor(level):
+            return
+        rate = _settings["payloadSampleRate"]
+        if rate < 1.0 and random.random() >= rate:
+            return
+
+        limit = _settings["payloadMaxChars"]
+        if hasattr(obj, "status_code") and hasattr(obj, "text"):
+            obj = obj.text
+        elif isinstance(obj, (bytes, bytearray)):
+            obj = bytes(obj).decode("utf-8", errors="replace")
+        text = capped_text(obj, limit) if isinstance(obj, str) else capped_json(obj, limit)
+        self._log(level, "%s = %s", (label, text))
+
+
+def get_logger(name):
+    """Loggers live under "harper." so configure_logging() covers all of them."""
+    manager = logging.Logger.manager
+    previous = manager.loggerClass
+    manager.setLoggerClass(HarperLogger)
+    try:
+        return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+    finally:
+        manager.loggerClass = previous
+
+
+def capped_text(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"… (truncated at {limit} of {len(text)} chars)"
+
+
+def capped_json(obj, limit):
+    out = []
+    size = 0
+    for chunk in json.JSONEncoder(default=str).iterencode(obj):
+        out.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return "".join(out)[:limit] + f"… (truncated at {limit} chars)"
+    return "".join(out)
+
+
+# ============================================================
+# PER-TARGET CONTEXT
+# ============================================================
+@contextmanager
+def log_context(target):
+    """Tags every line logged in this block (and this thread) with [target]."""
+    token = _target.set(target)
+    try:
+        yield
+    finally:
+        _target.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.target = _target.get()
+        return True
+
+
+class TargetFilter(logging.Filter):
+    """Passes only records logged inside log_context(target)."""
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+
+    def filter(self, record):
+        record.target = _target.get()
+        return record.target == self.target
+
+
+@contextmanager
+def log_to_file(target, path):
+    """Copies this target's lines into a file (one log per daemon job)."""
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(ConsoleFormatter())
+    handler.addFilter(TargetFilter(target))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.addHandler(handler)
+    try:
+        yield
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+
+# ============================================================
+# OUTPUT
+# ============================================================
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        prefix = f"[{record.levelname}]"
+        if getattr(record, "target", None):
+            prefix += f" [{record.target}]"
+        text = f"{prefix} {record.getMessage()}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        if getattr(record, "target", None):
+            entry["target"] = record.target
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time (redirect_stdout works)."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def configure_logging(verbose=False, fmt="text", payload_max_chars=DEFAULT_PAYLOAD_MAX_CHARS,
+                      payload_sample_rate=1.0, quiet=False):
+    """
+    Called once by the entry point; before that, INFO and up still print.
+    quiet=True keeps only warnings and errors (commands that print JSON).
+    """
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(logging.DEBUG if verbose else logging.WARNING if quiet else logging.INFO)
+    root.propagate = False
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    handler = StdoutHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else ConsoleFormatter())
+    handler.addFilter(ContextFilter())
+    root.addHandler(handler)
+
+    _settings["payloadMaxChars"] = payload_max_chars
+    _settings["payloadSampleRate"] = payload_sample_rate
+
+
+configure_logging()
@@ -1,146 +1,272 @@
+import os
 import sys
 import argparse
 
 from helpers import (
-    load_requirements,
     write_result,
     init_edgegrid_session,
     find_property_id_by_name,
-    dbg
+    list_properties
 )
 
-from manage_gtm import run_gtm_workflow
-from manage_property_manager import run_pm_workflow
-from manage_edgeworker import run_edgeworker_workflow
-from manage_customer_property import run_harper_redirect_earlyhints_workflow
+from config_model import load_config
+from prefetch import prefetched, listing_reads, customer_property_reads, gtm_reads
+from session_registry import bind_account, DEFAULT_SECTION, DEFAULT_MAX_CONCURRENT
+from log import get_logger, configure_logging
+from json_codec import configure_codec, dumps, load_file, BACKEND
+
+from tracing import (
+    start_trace,
+    stop_trace,
+    instrument_session,
+    summarize_trace,
+    export_trace
+)
 
+# Workflow modules, profiling and the run history are imported inside the
+# commands that use them, and requests / edgegrid only when the session is
+# opened (helpers.init_edgegrid_session): importing this module or --help
+# loads no workflow module, config validation loads only the modules whose
+# resolvers it runs (config_model), `status` never loads the GTM workflow or
+# tarfile, and --help or a config error never loads HTTP.
 
+log = get_logger("main")
 
-# ============================================================
-# MAIN
-# ============================================================
-def main():
 
-    # ---------------------------------------------
-    # CLI ARGUMENTS
-    # ---------------------------------------------
-    parser = argparse.ArgumentParser(description="Harper Early Automation")
 
-    parser.add_argument(
-        "--activation-network",
-        required=True,
-        choices=["staging", "production", "saveonly"],
-        help="Activation network for all workflows"
+# ============================================================
+# TRACE → result.json (+ optional trace file)
+# ============================================================
+def finish_trace(results, trace_out):
+    tracer = stop_trace()
+    if not tracer:
+        return
+
+    results["trace"] = summarize_trace(tracer)
+    path = results["trace"]["criticalPath"]
+    log.info(
+        "%sms total: %sms API, %sms waiting, %sms local processing",
+        path["totalMs"], path["httpMs"], path["waitMs"], path["processingMs"]
     )
 
-    parser.add_argument(
-        "--account-switch-key",
-        required=False,
-        help="Optional Akamai accountSwitchKey"
-    )
+    if trace_out:
+        try:
+            export_trace(tracer, trace_out)
+            log.info("Trace written to %s", trace_out)
+        except Exception as e:
+            log.error("Unable to write trace file: %s", e)
 
-    parser.add_argument(
-        "--verbose",
-        action="store_true",
-        help="Enable verbose debug logging"
-    )
 
-    args = parser.parse_args()
+# ============================================================
+# PROFILE → profile.json (--profile)
+# ============================================================
+def finish_profile(profiler, results):
+    try:
+        path = profiler.write()
+    except Exception as e:
+        log.error("Unable to write profile: %s", e)
+        return
+
+    if path:
+        results["profile"] = path
+        for name, report in profiler.reports.items():
+            log.info(
+                "Profile %s: %sms, peak traced %sKB, peak RSS %sMB",
+                name, report["wallMs"], report["peakTracedBytes"] // 1024, report["peakRssBytes"] // (1024 * 1024)
+            )
+        log.info("Profile written to %s", path)
 
-    activationMode = args.activation_network.lower()
-    accountSwitchKey = args.account_switch_key
-    verbose = args.verbose
 
-    print("\n=== Harper Early Automation ===\n")
+# ============================================================
+# RUN HISTORY (history/runs.jsonl)
+# ============================================================
+def record_history(results, full):
+    from run_history import append_run_history
 
-    # ---------------------------------------------
-    # Load requirements
-    # ---------------------------------------------
     try:
-        config = load_requirements()
-        print("[INFO] requirements.json loaded.\n")
+        record = append_run_history(results, full=full)
+        log.info("Run %s appended to run history.", record["runId"])
     except Exception as e:
-        print(f"[ERROR] Could not load requirements.json: {e}")
-        sys.exit(1)
+        log.error("Unable to append run history: %s", e)
 
-    # ---------------------------------------------
-    # Initialize EdgeGrid session
-    # ---------------------------------------------
+
+# ============================================================
+# CUSTOMER-FACING PROPERTY
+# ============================================================
+def resolve_customer_property(session, baseurl, config, accountSwitchKey, property_id=None):
+    """A known --property-id skips the PAPI property listing."""
+    if property_id:
+        log.info("Using propertyId = %s", property_id)
+        return property_id
+
+    log.step("Resolving propertyId for customer-facing hostname…")
+
+    prop_id = find_property_id_by_name(
+        session,
+        baseurl,
+        config.propertyManager.customerFacing.propertyName,
+        config.contractId,
+        config.groupId,
+        accountSwitchKey
+    )
+
+    log.info("Found propertyId = %s", prop_id)
+    return prop_id
+
+
+def run_workflow(results, key, error_key, title, profiler, workflow):
+    """Runs one workflow; a failure is recorded as results[error_key]."""
     try:
-        session, baseurl = init_edgegrid_session(config)
-        dbg({"verbose": verbose}, f"Baseurl = {baseurl}")
-        print("[INFO] EdgeGrid session initialized.\n")
+        log.step("Running %s workflow…", title)
+        with profiler.workflow(key):
+            results[key] = workflow()
+        log.success("%s workflow completed.", title)
     except Exception as e:
-        print(f"[ERROR] Could not initialize session: {e}")
-        sys.exit(1)
+        log.error("%s workflow failed: %s", title, e)
+        results[error_key] = str(e)
+    return results
 
-    # ---------------------------------------------
-    # Resolve Customer-Facing Hostname Property ID
-    # ---------------------------------------------
-    cf = config["propertyManager"]["customerFacingHostname"]
-    propertyName = cf["propertyName"]
-    propertyVersion = cf["propertyVersion"]
 
-    contractId = config["contractId"]
-    groupId = config["groupId"]
+def snapshot_before_activation(results, session, baseurl, config, network, accountSwitchKey, command,
+                               property_id=None):
+    """
+    Records the versions active on both networks (for `rollback`) before a
+    command activates anything on `network`; saveonly runs skip it.
+    """
+    if network == "saveonly":
+        return results
 
-    print("[STEP] Resolving propertyId for customer-facing hostname…")
+    from rollback import take_snapshot
 
     try:
-        prop_id = find_property_id_by_name(
-            session,
-            baseurl,
-            propertyName,
-            contractId,
-            groupId,
-            accountSwitchKey
-        )
+        results["snapshot"] = take_snapshot(session, baseurl, config, accountSwitchKey, f"{command} {network}",
+                                            property_id)
     except Exception as e:
-        print(f"[ERROR] Unable to resolve propertyId: {e}")
-        sys.exit(1)
+        log.warning("Could not snapshot the active versions — rollback will not cover this run: %s", e)
+    return results
+
+
+# ============================================================
+# PIPELINE (shared by main() and harper_daemon.py)
+# ============================================================
+def run_pipeline(session, baseurl, config, activationMode, accountSwitchKey, verbose,
+                 harper_switch=None, harper_timeout_ms=None, profiler=None,
+                 edgeworker_folder=None, property_id=None, prefetch_reads=True):
+    """
+    run_workflows() with the name listings and the customer property's reads
+    (propertyId, base rule tree) prefetched in the background while PM and
+    EdgeWorker run.
+    """
+    reads = []
+    if prefetch_reads:
+        mode = activationMode.lower()
+        kill_switch = {"kill_switch_network": None if mode == "saveonly" else mode.upper()} if harper_switch else {}
+        reads = listing_reads(session, baseurl, config, accountSwitchKey)
+        reads += customer_property_reads(session, baseurl, config, accountSwitchKey, property_id, **kill_switch)
+
+    with prefetched(session, reads):
+        snapshot = snapshot_before_activation({}, session, baseurl, config, activationMode.lower(), accountSwitchKey,
+                                              "switch" if harper_switch else "run", property_id)
+        results = run_workflows(
+            session, baseurl, config, activationMode, accountSwitchKey, verbose,
+            harper_switch, harper_timeout_ms, profiler, edgeworker_folder, property_id
+        )
+    results.update(snapshot)
+    return results
+
+
+def run_workflows(session, baseurl, config, activationMode, accountSwitchKey, verbose,
+                  harper_switch=None, harper_timeout_ms=None, profiler=None,
+                  edgeworker_folder=None, property_id=None):
+    """
+    Resolves the customer-facing property and runs the workflows (or only
+    the kill switch). Workflow failures are recorded as "<step>_error" in
+    the returned results; only a failed propertyId lookup raises.
+    """
+    from profiling import WorkflowProfiler
+    from manage_customer_property import (
+        run_harper_redirect_earlyhints_workflow,
+        run_harper_kill_switch_workflow
+    )
+
+    profiler = profiler or WorkflowProfiler(False)
 
-    print(f"[INFO] Found propertyId = {prop_id}\n")
+    # ---------------------------------------------
+    # Resolve Customer-Facing Hostname Property ID
+    # ---------------------------------------------
+    propertyVersion = config.propertyManager.customerFacing.propertyVersion
+
+    prop_id = resolve_customer_property(session, baseurl, config, accountSwitchKey, property_id)
 
     results = {
         "customerFacingPropertyId": prop_id,
         "customerFacingPropertyVersion": propertyVersion
     }
 
+    # ============================================================
+    # FAST PATH: Harper kill switch only
+    # ============================================================
+    if harper_switch:
+        try:
+            with profiler.workflow("killSwitch"):
+                results["killSwitch"] = run_harper_kill_switch_workflow(
+                    session=session,
+                    baseurl=baseurl,
+                    config=config,
+                    propertyId=prop_id,
+                    enabled=harper_switch == "on",
+                    timeout_ms=harper_timeout_ms,
+                    activationMode=activationMode,
+                    accountSwitchKey=accountSwitchKey,
+                    verbose=verbose
+                )
+        except Exception as e:
+            log.error("Kill switch failed: %s", e)
+            results["killSwitch_error"] = str(e)
+
+        return results
+
+    from manage_property_manager import run_pm_workflow
+    from manage_edgeworker import run_edgeworker_workflow, EDGEWORKER_FOLDER
+
     # ============================================================
     # 1. GTM WORKFLOW
     # ============================================================
     try:
-        print("[STEP] Running GTM workflow…")
+        log.step("Running GTM workflow…")
         #gtm_output = run_gtm_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose)
         #results["gtm"] = gtm_output
-        print("[SUCCESS] GTM workflow completed.\n")
+        log.success("GTM workflow completed.")
     except Exception as e:
-        print(f"[ERROR] GTM workflow failed: {e}")
+        log.error("GTM workflow failed: %s", e)
         results["gtm_error"] = str(e)
 
     # ============================================================
     # 2. PROPERTY MANAGER WORKFLOW (Internal PMconfig to handle Harper traffic)
     # ============================================================
     try:
-        print("[STEP] Running Property Manager workflow…")
-        pm_output = run_pm_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose)
+        log.step("Running Property Manager workflow…")
+        with profiler.workflow("propertyManager"):
+            pm_output = run_pm_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose)
         results["propertyManager"] = pm_output
-        print("[SUCCESS] PM workflow completed.\n")
+        log.success("PM workflow completed.")
     except Exception as e:
-        print(f"[ERROR] Property Manager workflow failed: {e}")
+        log.error("Property Manager workflow failed: %s", e)
         results["pm_error"] = str(e)
 
     # ============================================================
     # 3. EDGEWORKER WORKFLOW
     # ============================================================
     try:
-        print("[STEP] Running EdgeWorker workflow…")
-        ew_output = run_edgeworker_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose)
+        log.step("Running EdgeWorker workflow…")
+        with profiler.workflow("edgeworker"):
+            ew_output = run_edgeworker_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose,
+                                                edgeworker_folder or EDGEWORKER_FOLDER)
         results["edgeworker"] = ew_output
         ew_id = ew_output.get("edgeWorkerId")
-        print(f"[SUCCESS] EdgeWorker workflow completed. EW ID = {ew_id}\n")
+        log.success("EdgeWorker workflow completed. EW ID = %s", ew_id)
     except Exception as e:
-        print(f"[ERROR] EdgeWorker workflow failed: {e}")
+        log.error("EdgeWorker workflow failed: %s", e)
         results["edgeworker_error"] = str(e)
         ew_id = None
 
@@ -149,40 +275,665 @@ def main():
     # ============================================================
     if ew_id:
         try:
-            print("[STEP] Running Harper Redirect + Early Hints workflow…")
-
-            harper_output = run_harper_redirect_earlyhints_workflow(
-                session=session,
-                baseurl=baseurl,
-                config=config,
-                ew_id=ew_id,
-                propertyId=prop_id,            # FIXED NAME
-                propertyVersion=propertyVersion,
-                activationMode=activationMode,
-                accountSwitchKey=accountSwitchKey,
-                verbose=verbose                   # NEW REQUIRED ARG
-            )
+            log.step("Running Harper Redirect + Early Hints workflow…")
+
+            with profiler.workflow("harperRule"):
+                harper_output = run_harper_redirect_earlyhints_workflow(
+                    session=session,
+                    baseurl=baseurl,
+                    config=config,
+                    ew_id=ew_id,
+                    propertyId=prop_id,            # FIXED NAME
+                    propertyVersion=propertyVersion,
+                    activationMode=activationMode,
+                    accountSwitchKey=accountSwitchKey,
+                    verbose=verbose                   # NEW REQUIRED ARG
+                )
 
             results["harperRule"] = harper_output
-            print("[SUCCESS] Harper rule update workflow completed.\n")
+            log.success("Harper rule update workflow completed.")
 
         except Exception as e:
-            print(f"[ERROR] Harper workflow failed: {e}")
+            log.error("Harper workflow failed: %s", e)
             results["harperRule_error"] = str(e)
 
     else:
-        print("[ERROR] Cannot run Customer Property workflow — EdgeWorker did not return ew_id.")
+        log.error("Cannot run Customer Property workflow — EdgeWorker did not return ew_id.")
+
+    return results
+
+
+# ============================================================
+# SINGLE-WORKFLOW COMMANDS
+# ============================================================
+# Each returns the results dict for result.json / run history. Only the
+# module of the workflow that runs is imported.
+def command_run(session, baseurl, config, args, profiler):
+    return run_pipeline(
+        session, baseurl, config,
+        activationMode=args.activation_network,
+        accountSwitchKey=args.account_switch_key,
+        verbose=args.verbose,
+        harper_switch=args.harper_switch,
+        harper_timeout_ms=args.harper_timeout_ms,
+        profiler=profiler,
+        prefetch_reads=not args.no_prefetch
+    )
+
+
+def command_gtm(session, baseurl, config, args, profiler):
+    from manage_gtm import run_gtm_workflow
+
+    reads = gtm_reads(session, baseurl, config, args.account_switch_key) if config.gtm and not args.no_prefetch else []
+
+    with prefetched(session, reads):
+        return run_workflow({}, "gtm", "gtm_error", "GTM", profiler, lambda: run_gtm_workflow(
+            session, baseurl, config, args.activation_network, args.account_switch_key, args.verbose
+        ))
+
+
+def command_pm(session, baseurl, config, args, profiler):
+    from manage_property_manager import run_pm_workflow
+
+    reads = [] if args.no_prefetch else listing_reads(
+        session, baseurl, config, args.account_switch_key, edgeworkers=False
+    )
+
+    with prefetched(session, reads):
+        results = snapshot_before_activation({}, session, baseurl, config, args.activation_network,
+                                             args.account_switch_key, "pm")
+        return run_workflow(results, "propertyManager", "pm_error", "Property Manager", profiler, lambda: run_pm_workflow(
+            session, baseurl, config, args.activation_network, args.account_switch_key, args.verbose
+        ))
+
+
+def command_edgeworker(session, baseurl, config, args, profiler):
+    from manage_edgeworker import run_edgeworker_workflow
+
+    reads = [] if args.no_prefetch else listing_reads(
+        session, baseurl, config, args.account_switch_key, properties=False, cpcodes=False
+    )
+
+    with prefetched(session, reads):
+        results = snapshot_before_activation({}, session, baseurl, config, args.activation_network,
+                                             args.account_switch_key, "edgeworker")
+        return run_workflow(results, "edgeworker", "edgeworker_error", "EdgeWorker", profiler, lambda: run_edgeworker_workflow(
+            session, baseurl, config, args.activation_network, args.account_switch_key, args.verbose
+        ))
+
+
+def command_harper_rule(session, baseurl, config, args, profiler):
+    from manage_customer_property import run_harper_redirect_earlyhints_workflow
+
+    reads = [] if args.no_prefetch else customer_property_reads(
+        session, baseurl, config, args.account_switch_key, args.property_id
+    )
+
+    with prefetched(session, reads):
+        prop_id = resolve_customer_property(session, baseurl, config, args.account_switch_key, args.property_id)
+        propertyVersion = config.propertyManager.customerFacing.propertyVersion
+
+        results = {
+            "customerFacingPropertyId": prop_id,
+            "customerFacingPropertyVersion": propertyVersion
+        }
+        snapshot_before_activation(results, session, baseurl, config, args.activation_network,
+                                   args.account_switch_key, "harper-rule", prop_id)
+        return run_workflow(results, "harperRule", "harperRule_error", "Harper Redirect + Early Hints", profiler,
+                            lambda: run_harper_redirect_earlyhints_workflow(
+                                session=session,
+                                baseurl=baseurl,
+                                config=config,
+                                ew_id=args.edgeworker_id,
+                                propertyId=prop_id,
+                                propertyVersion=propertyVersion,
+                                activationMode=args.activation_network,
+                                accountSwitchKey=args.account_switch_key,
+                                verbose=args.verbose
+                            ))
+
+
+def command_switch(session, baseurl, config, args, profiler):
+    return run_pipeline(
+        session, baseurl, config,
+        activationMode=args.activation_network,
+        accountSwitchKey=args.account_switch_key,
+        verbose=args.verbose,
+        harper_switch=args.state,
+        harper_timeout_ms=args.timeout_ms,
+        profiler=profiler,
+        property_id=args.property_id,
+        prefetch_reads=not args.no_prefetch
+    )
+
+
+def command_activate(session, baseurl, config, args, profiler):
+    """Activates versions that already exist; nothing is built or uploaded."""
+    results = snapshot_before_activation({}, session, baseurl, config, args.activation_network,
+                                         args.account_switch_key, "activate", args.property_id)
+
+    if args.property_version is not None:
+        from manage_customer_property import activate_property
+
+        prop_id = resolve_customer_property(session, baseurl, config, args.account_switch_key, args.property_id)
+        results["customerFacingPropertyId"] = prop_id
+        run_workflow(results, "propertyActivation", "propertyActivation_error", "Property activation", profiler,
+                     lambda: activate_property(
+                         session, baseurl, prop_id, args.property_version,
+                         list(config.activationEmails), args.activation_network, args.account_switch_key,
+                         args.verbose, note=f"Re-activation of version {args.property_version}"
+                     ))
+
+    if args.edgeworker_id is not None:
+        from manage_edgeworker import activate_edgeworker
+
+        run_workflow(results, "edgeworkerActivation", "edgeworkerActivation_error", "EdgeWorker activation", profiler,
+                     lambda: activate_edgeworker(
+                         session, baseurl, args.edgeworker_id, args.edgeworker_version,
+                         args.activation_network, args.account_switch_key, args.verbose
+                     ))
+
+    return results
+
+
+def command_promote(session, baseurl, config, args, profiler):
+    """
+    Builds once (saveonly) — or takes the versions of an earlier run's
+    result.json — then promotes those exact versions: staging, smoke
+    checks, production.
+    """
+    from promotion import run_promotion, promotion_targets, canary_steps, PromotionError
+
+    if args.from_result:
+        built = load_file(args.from_result)
+        results = {"promotedFrom": args.from_result}
+    else:
+        built = results = run_pipeline(
+            session, baseurl, config,
+            activationMode="saveonly",
+            accountSwitchKey=args.account_switch_key,
+            verbose=args.verbose,
+            profiler=profiler,
+            prefetch_reads=not args.no_prefetch
+        )
+
+    try:
+        targets = promotion_targets(built)
+        canary = canary_steps(built)
+    except Exception as e:
+        log.error("Nothing to promote: %s", e)
+        results["promotion_error"] = str(e)
+        return results
+
+    snapshot_before_activation(results, session, baseurl, config, "staging+production", args.account_switch_key,
+                               "promote", targets["customerProperty"]["propertyId"])
+
+    try:
+        log.step("Running Promotion workflow…")
+        with profiler.workflow("promotion"):
+            results["promotion"] = run_promotion(
+                session, baseurl, config, targets, args.account_switch_key, args.verbose,
+                production=not args.staging_only, canary=canary
+            )
+        log.success("Promotion workflow completed.")
+    except Exception as e:
+        log.error("Promotion workflow failed: %s", e)
+        results["promotion_error"] = str(e)
+        if isinstance(e, PromotionError):
+            results["promotion"] = e.report
+
+    return results
+
+
+def command_rollback(session, baseurl, config, args, profiler):
+    """
+    Re-activates the versions a snapshot recorded (by default the one taken
+    before the latest rollout). Nothing is built, uploaded or edited.
+    """
+    from caches import session_section
+    from rollback import find_snapshot, run_rollback, RollbackError
+
+    results = {}
+    try:
+        snapshot = find_snapshot(config, session_section(session), args.account_switch_key, args.snapshot)
+    except Exception as e:
+        log.error("Nothing to roll back to: %s", e)
+        results["rollback_error"] = str(e)
+        return results
+
+    try:
+        log.step("Running Rollback workflow…")
+        with profiler.workflow("rollback"):
+            results["rollback"] = run_rollback(
+                session, baseurl, config, snapshot, args.activation_network, args.account_switch_key, args.verbose
+            )
+        log.success("Rollback workflow completed.")
+    except Exception as e:
+        log.error("Rollback workflow failed: %s", e)
+        results["rollback_error"] = str(e)
+        if isinstance(e, RollbackError):
+            results["rollback"] = e.report
+
+    return results
+
+
+WORKFLOW_COMMANDS = {
+    "run": command_run,
+    "gtm": command_gtm,
+    "pm": command_pm,
+    "edgeworker": command_edgeworker,
+    "harper-rule": command_harper_rule,
+    "switch": command_switch,
+    "activate": command_activate,
+    "promote": command_promote,
+    "rollback": command_rollback
+}
+
+# read-only commands print their report instead of writing result.json
+READ_COMMANDS = ("status", "hostnames")
+
+COMMANDS = tuple(WORKFLOW_COMMANDS) + READ_COMMANDS
+
+
+# ============================================================
+# STATUS (read-only, no result.json / history)
+# ============================================================
+def command_status(session, baseurl, config, args):
+    from manage_customer_property import get_property_status
+
+    prop_id = resolve_customer_property(session, baseurl, config, args.account_switch_key, args.property_id)
+    status = {
+        "customerFacing": get_property_status(
+            session, baseurl, prop_id, config.contractId, config.groupId,
+            args.account_switch_key, args.verbose
+        )
+    }
+
+    if args.edgeworker_id is not None:
+        from manage_edgeworker import get_edgeworker_activations
+
+        activations = get_edgeworker_activations(
+            session, baseurl, args.edgeworker_id, args.account_switch_key, args.verbose
+        )
+        # newest first: the first entry per network is the current one
+        latest = {}
+        for act in activations:
+            latest.setdefault(str(act.get("network", "")).upper(), act)
+        status["edgeworker"] = {"edgeWorkerId": args.edgeworker_id, "activations": latest}
+
+    return status
+
+
+def print_status(status):
+    cf = status["customerFacing"]
+    print(f"{cf['propertyName']} ({cf['propertyId']})")
+    print(f"  latest      v{cf['latestVersion']}")
+    print(f"  staging     {'v' + str(cf['stagingVersion']) if cf['stagingVersion'] else '-'}")
+    print(f"  production  {'v' + str(cf['productionVersion']) if cf['productionVersion'] else '-'}")
+
+    ew = status.get("edgeworker")
+    if ew:
+        print(f"EdgeWorker {ew['edgeWorkerId']}")
+        for network in ("STAGING", "PRODUCTION"):
+            act = ew["activations"].get(network)
+            print(f"  {network.lower():<11} {act['version'] + ' ' + act.get('status', '') if act else '-'}")
+
+
+# ============================================================
+# HOSTNAMES (read-only: pending sync + certificate status)
+# ============================================================
+def command_hostnames(session, baseurl, config, args):
+    """Both properties' hostnames are read concurrently."""
+    from property_hostnames import hostname_plans, internal_desired_hostnames, customer_desired_hostnames
+    from manage_property_manager import get_latest_version_details
+
+    ask = args.account_switch_key
+    contractId, groupId = config.contractId, config.groupId
+    targets = []
+
+    internal_name = config.propertyManager.internal.internalPmConfigName
+    matches = list_properties(session, baseurl, contractId, groupId, ask).get(internal_name)
+    if matches:
+        internal_id = matches[0]["propertyId"]
+        latest = get_latest_version_details(session, baseurl, internal_id, contractId, groupId, ask)
+        targets.append({
+            "label": "internal", "propertyId": internal_id, "version": latest["propertyVersion"],
+            "contractId": contractId, "groupId": groupId,
+            "desired": lambda current: internal_desired_hostnames(config), "prune": True
+        })
+
+    prop_id = resolve_customer_property(session, baseurl, config, ask, args.property_id)
+    targets.append({
+        "label": "customerFacing", "propertyId": prop_id,
+        "version": config.propertyManager.customerFacing.propertyVersion,
+        "contractId": contractId, "groupId": groupId,
+        "desired": lambda current: customer_desired_hostnames(config, current), "prune": False
+    })
+
+    plans = hostname_plans(session, baseurl, targets, ask)
+    if not matches:
+        plans = {"internal": {"error": f"{internal_name} not created yet"}, **plans}
+    return plans
+
+
+def print_hostnames(plans):
+    for label, plan in plans.items():
+        if "error" in plan:
+            print(f"{label}: {plan['error']}")
+            continue
+
+        certs = plan["certStatus"]
+        print(f"{label} {plan['propertyId']} v{plan['version']}: {certs['hostnames']} hostnames")
+        print(f"  to add      {', '.join(plan['added']) or '-'}")
+        print(f"  to remove   {', '.join(plan['removed']) or '-'}")
+        for network in ("staging", "production"):
+            counts = ", ".join(f"{n} {status}" for status, n in sorted(certs[network].items()))
+            print(f"  {network:<11} {counts or '-'}")
+        for item in certs["notDeployed"]:
+            print(f"    {item['hostname']}: staging {item['staging']}, production {item['production']}")
+
+
+# ============================================================
+# CLI
+# ============================================================
+def build_parser():
+    # shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--account-switch-key",
+        required=False,
+        help="Optional Akamai accountSwitchKey (added to every API call)"
+    )
+    common.add_argument(
+        "--edgerc-section",
+        default=DEFAULT_SECTION,
+        help="~/.edgerc section with the API client credentials (default: default)"
+    )
+    common.add_argument(
+        "--account-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT,
+        help=f"Most API calls in flight for the account (default: {DEFAULT_MAX_CONCURRENT})"
+    )
+    common.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Enable verbose debug logging"
+    )
+    common.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="Record every API call (secrets redacted) to this JSONL cassette"
+    )
+    common.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="Answer API calls from a recorded cassette instead of Akamai"
+    )
+    common.add_argument(
+        "--replay-speed",
+        choices=["recorded", "fast"],
+        default="recorded",
+        help="With --replay: wait the recorded API time per call, or not at all"
+    )
+    common.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default="text",
+        help="Console log format (json = one structured object per line)"
+    )
+    common.add_argument(
+        "--log-payload-max",
+        type=int,
+        default=4000,
+        help="With --verbose: cut API payload dumps after this many characters"
+    )
+    common.add_argument(
+        "--log-payload-sample",
+        type=float,
+        default=1.0,
+        help="With --verbose: fraction of API payload dumps to keep (0-1)"
+    )
+
+    # commands that change something: result.json, trace, profile, history
+    workflow = argparse.ArgumentParser(add_help=False)
+    workflow.add_argument(
+        "--trace-out",
+        metavar="TRACE_JSON",
+        help="Also export step / HTTP spans as a Chrome trace file (chrome://tracing, Perfetto)"
+    )
+    workflow.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile CPU (cProfile) and memory (tracemalloc) per workflow into profile.json"
+    )
+    workflow.add_argument(
+        "--history-full",
+        action="store_true",
+        help="Also keep this run's full result payload in the run history"
+    )
+    workflow.add_argument(
+        "--no-prefetch",
+        action="store_true",
+        help="Read remote state when each workflow needs it instead of up front (e.g. older cassettes)"
+    )
+    workflow.add_argument(
+        "--compress-requests",
+        action="store_true",
+        help="Gzip large rule-tree uploads (Content-Encoding: gzip)"
+    )
+
+    network = argparse.ArgumentParser(add_help=False)
+    network.add_argument(
+        "--activation-network",
+        required=True,
+        choices=["staging", "production", "saveonly"],
+        help="Activation network"
+    )
+
+    property_id = argparse.ArgumentParser(add_help=False)
+    property_id.add_argument(
+        "--property-id",
+        help="Customer-facing propertyId (prp_…); skips the lookup by propertyName"
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Harper Early Automation",
+        epilog="Without a command, the arguments are passed to `run`."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", parents=[common, workflow, network],
+                         help="Full pipeline: PM, EdgeWorker and Harper rule (default)")
+    run.add_argument(
+        "--harper-switch",
+        choices=["on", "off"],
+        help="Only flip the Harper kill switch (PMUSER_HARPER_ENABLED) on the customer property"
+    )
+    run.add_argument(
+        "--harper-timeout-ms",
+        type=int,
+        help="With --harper-switch: reduced subrequest timeout (0 clears the override)"
+    )
+
+    sub.add_parser("gtm", parents=[common, workflow, network], help="GTM workflow only")
+    sub.add_parser("pm", parents=[common, workflow, network], help="Internal Property Manager workflow only")
+    sub.add_parser("edgeworker", parents=[common, workflow, network], help="EdgeWorker workflow only")
+
+    harper_rule = sub.add_parser("harper-rule", parents=[common, workflow, network, property_id],
+                                 help="Insert the Harper rule for an existing EdgeWorker into the customer property")
+    harper_rule.add_argument("--edgeworker-id", type=int, required=True, help="EdgeWorker ID to reference")
+
+    switch = sub.add_parser("switch", parents=[common, workflow, network, property_id],
+                            help="Flip the Harper kill switch on the customer property")
+    switch.add_argument("state", choices=["on", "off"])
+    switch.add_argument("--timeout-ms", type=int,
+                        help="Reduced subrequest timeout (0 clears the override)")
+
+    activate = sub.add_parser("activate", parents=[common, workflow, property_id],
+                              help="Activate existing property / EdgeWorker versions")
+    activate.add_argument("--activation-network", required=True, choices=["staging", "production"],
+                          help="Activation network")
+    activate.add_argument("--property-version", type=int, help="Customer property version to activate")
+    activate.add_argument("--edgeworker-id", type=int, help="EdgeWorker ID to activate")
+    activate.add_argument("--edgeworker-version", help="With --edgeworker-id: EdgeWorker version to activate")
+
+    promote = sub.add_parser("promote", parents=[common, workflow],
+                             help="Build once, activate on staging, smoke-check, then promote the same versions")
+    promote.add_argument("--from-result", metavar="RESULT_JSON",
+                         help="Promote the versions an earlier (saveonly) run wrote to this result.json")
+    promote.add_argument("--staging-only", action="store_true",
+                         help="Stop after the staging activations and smoke checks")
+
+    rollback = sub.add_parser("rollback", parents=[common, workflow],
+                              help="Re-activate the versions active before the latest rollout")
+    rollback.add_argument("--activation-network", required=True, choices=["staging", "production"],
+                          help="Activation network")
+    rollback.add_argument("--snapshot", metavar="SNAPSHOT_ID",
+                          help="Snapshot to restore (history/snapshots.jsonl; default: the latest for the property)")
+
+    status = sub.add_parser("status", parents=[common, property_id],
+                            help="Active versions of the customer property (and an EdgeWorker)")
+    status.add_argument("--edgeworker-id", type=int, help="Also show this EdgeWorker's activations")
+    status.add_argument("--json", action="store_true", help="Print the status as JSON")
+
+    hostnames = sub.add_parser("hostnames", parents=[common, property_id],
+                               help="Hostname changes a run would make, and certificate status")
+    hostnames.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    return parser
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    argv = list(sys.argv[1:] if argv is None else argv)
+
+    # `main.py --activation-network staging …` (no command) is the full run
+    if argv and argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv.insert(0, "run")
+
+    args = parser.parse_args(argv)
+
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.account_concurrency < 1:
+        parser.error("--account-concurrency must be at least 1")
+    if args.command == "activate":
+        if args.property_version is None and args.edgeworker_id is None:
+            parser.error("activate needs --property-version and/or --edgeworker-id")
+        if (args.edgeworker_id is None) != (args.edgeworker_version is None):
+            parser.error("--edgeworker-id and --edgeworker-version go together")
+    if args.command == "promote" and args.from_result and not os.path.isfile(args.from_result):
+        parser.error(f"--from-result: file not found: {args.from_result}")
+
+    return args
+
+
+# ============================================================
+# MAIN
+# ============================================================
+def main(argv=None):
+    args = parse_args(argv)
+
+    configure_logging(
+        verbose=args.verbose,
+        fmt=args.log_format,
+        payload_max_chars=args.log_payload_max,
+        payload_sample_rate=args.log_payload_sample,
+        quiet=args.command in READ_COMMANDS and args.json
+    )
+    configure_codec(compress_requests=getattr(args, "compress_requests", False))
+
+    if hasattr(args, "activation_network"):
+        args.activation_network = args.activation_network.lower()
+
+    log.info("=== Harper Early Automation (%s) ===", args.command)
+    log.debug("JSON backend: %s", BACKEND)
+
+    is_workflow = args.command in WORKFLOW_COMMANDS
+    if is_workflow:
+        from profiling import WorkflowProfiler
+        profiler = WorkflowProfiler(args.profile)
+        start_trace("main")
+
+    # ---------------------------------------------
+    # Load + validate requirements (before any remote change)
+    # ---------------------------------------------
+    try:
+        config = load_config()
+        log.info("requirements.json loaded and validated.")
+    except Exception as e:
+        log.error("Could not load requirements.json: %s", e)
+        sys.exit(1)
+
+    # ---------------------------------------------
+    # Initialize EdgeGrid session
+    # ---------------------------------------------
+    try:
+        session, baseurl = init_edgegrid_session(
+            config,
+            record_to=args.record,
+            replay_from=args.replay,
+            replay_speed=args.replay_speed,
+            section=args.edgerc_section
+        )
+        bind_account(session, args.account_switch_key, args.account_concurrency, args.edgerc_section)
+        if is_workflow:
+            instrument_session(session)
+        log.debug("Baseurl = %s", baseurl)
+        log.info("EdgeGrid session initialized.")
+    except Exception as e:
+        log.error("Could not initialize session: %s", e)
+        sys.exit(1)
+
+    # ---------------------------------------------
+    # status / hostnames: read-only, printed
+    # ---------------------------------------------
+    if not is_workflow:
+        command, show = {
+            "status": (command_status, print_status),
+            "hostnames": (command_hostnames, print_hostnames)
+        }[args.command]
+
+        try:
+            report = command(session, baseurl, config, args)
+        except Exception as e:
+            log.error("%s failed: %s", args.command.capitalize(), e)
+            sys.exit(1)
+
+        if args.json:
+            print(dumps(report, indent=True).decode("utf-8"))
+        else:
+            show(report)
+        return
+
+    # ---------------------------------------------
+    # Run workflows
+    # ---------------------------------------------
+    try:
+        results = WORKFLOW_COMMANDS[args.command](session, baseurl, config, args, profiler)
+    except Exception as e:
+        # workflow errors land in results; anything raised here (the
+        # propertyId lookup, an unreadable --from-result…) is fatal
+        log.error("%s failed: %s", args.command.capitalize(), e)
+        stop_trace()
+        sys.exit(1)
 
     # ============================================================
     # Write result.json
     # ============================================================
+    finish_trace(results, args.trace_out)
+    finish_profile(profiler, results)
+
     try:
         write_result(results)
-        print("[SUCCESS] Results written to result.json\n")
+        log.success("Results written to result.json")
     except Exception as e:
-        print(f"[ERROR] Unable to write result.json: {e}")
+        log.error("Unable to write result.json: %s", e)
+
+    record_history(results, args.history_full)
 
-    print("=== Automation Complete ===\n")
+    log.info("=== Automation Complete ===")
 
 
 
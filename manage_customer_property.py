@@ -1,22 +1,30 @@
-import json
+import copy
+import time
 from urllib.parse import urljoin
-from helpers import dbg
+import caches
+import prefetch
+from tracing import traced, span
+from log import get_logger
+from json_codec import send_json, response_json, load_file, loads
+from property_hostnames import get_property_hostnames, sync_property_hostnames, customer_desired_hostnames
+
+log = get_logger("customer_property")
 
 
 # ------------------------------------------------------
 # Load the Harper rule JSON template
 # ------------------------------------------------------
 def load_harper_rule(path="data/harper_redirect_earlyhints_rule.json", verbose=False):
-    dbg(verbose, f"Loading Harper Redirect + Early Hints rule from {path}")
-    with open(path, "r") as f:
-        return json.load(f)
+    log.debug("Loading Harper Redirect + Early Hints rule from %s", path)
+    return load_file(path)
 
 
 # ------------------------------------------------------
 # Inject EdgeWorker ID into the rule JSON
 # ------------------------------------------------------
+@traced()
 def inject_edgeworker_id(rule, ew_id, verbose=False):
-    dbg(verbose, f"Injecting EdgeWorker ID {ew_id} into Harper rule")
+    log.debug("Injecting EdgeWorker ID %s into Harper rule", ew_id)
 
     def recurse(node):
         if isinstance(node, dict):
@@ -33,16 +41,41 @@ def inject_edgeworker_id(rule, ew_id, verbose=False):
     return rule
 
 
+# ------------------------------------------------------
+# Match edgeWorker continueOnError to edgeworker.failOpen
+# ------------------------------------------------------
+def set_continue_on_error(rule, fail_open, verbose=False):
+    log.debug("Setting edgeWorker continueOnError = %s", fail_open)
+
+    def recurse(node):
+        for b in node.get("behaviors", []):
+            if b.get("name") == "edgeWorker":
+                b.setdefault("options", {})["continueOnError"] = bool(fail_open)
+        for child in node.get("children", []):
+            recurse(child)
+
+    recurse(rule)
+    return rule
+
+
 # ------------------------------------------------------
 # Inject ONLY required PMUSER variables
 # ------------------------------------------------------
 REQUIRED_VARIABLES = [
     "PMUSER_103_HINTS",
-    "PMUSER_103_HINTS_ENABLED"
+    "PMUSER_103_HINTS_ENABLED",
+    "PMUSER_HARPER_ENABLED",
+    "PMUSER_HARPER_TIMEOUT_MS"
 ]
 
-def inject_required_variables(rule_tree, verbose=False):
-    dbg(verbose, "Ensuring required PMUSER variables exist...")
+# Initial values; anything not listed starts empty
+VARIABLE_DEFAULTS = {
+    "PMUSER_HARPER_ENABLED": "true"
+}
+
+@traced()
+def inject_required_variables(rule_tree, verbose=False, extra_variables=()):
+    log.debug("Ensuring required PMUSER variables exist...")
 
     rules = rule_tree["rules"]
 
@@ -51,25 +84,155 @@ def inject_required_variables(rule_tree, verbose=False):
 
     existing_vars = {v["name"] for v in rules["variables"]}
 
-    for var in REQUIRED_VARIABLES:
+    for var in list(REQUIRED_VARIABLES) + list(extra_variables):
         if var not in existing_vars:
-            dbg(verbose, f"Creating missing PMUSER variable: {var}")
+            log.debug("Creating missing PMUSER variable: %s", var)
             rules["variables"].append({
                 "name": var,
-                "value": "",
+                "value": VARIABLE_DEFAULTS.get(var, ""),
                 "description": ""
             })
 
     return rule_tree
 
 
+# ------------------------------------------------------
+# Insert Harper rule before Conditional Origins / Advanced Override
+# ------------------------------------------------------
+@traced()
+def insert_harper_rule(rule_tree, harper_rule, verbose=False):
+    log.debug("Inserting Harper rule into rule tree…")
+
+    rules_node = rule_tree.get("rules")
+    children = rules_node.setdefault("children", [])
+
+    cond_orig_idx = adv_idx = None
+
+    for i, child in enumerate(children):
+        behaviors = child.get("behaviors", [])
+
+        if any(b.get("name") == "allowConditionalOrigins" for b in behaviors):
+            cond_orig_idx = i
+        if any(b.get("name") in ("advanced", "advancedOverride") for b in behaviors):
+            adv_idx = i
+
+    indices = [x for x in (adv_idx, cond_orig_idx) if x is not None]
+    insert_index = min(indices) if indices else len(children)
+
+    children.insert(insert_index, harper_rule)
+    return insert_index
+
+
+# ------------------------------------------------------
+# CANARY RAMP (percentage sampling of the Harper rule)
+# ------------------------------------------------------
+CANARY_VARIABLE = "PMUSER_HARPER_CANARY"
+DEFAULT_CANARY_RAMP = [1, 10, 50, 100]
+DEFAULT_CANARY_HOLD_SECONDS = 1800
+
+
+def resolve_canary_ramp(canary_cfg):
+    """
+    customerFacingHostname.canary → list of percentages. Without an enabled
+    canary block the rule goes straight to 100%.
+    """
+    if not canary_cfg or not canary_cfg.get("enabled", True):
+        return [100]
+
+    ramp = canary_cfg.get("ramp", DEFAULT_CANARY_RAMP)
+
+    if not ramp or any(not isinstance(p, int) or isinstance(p, bool) or not 0 < p <= 100 for p in ramp):
+        raise Exception(f"canary.ramp must be percentages between 1 and 100, got {ramp}")
+    if any(a >= b for a, b in zip(ramp, ramp[1:])):
+        raise Exception(f"canary.ramp must be strictly increasing, got {ramp}")
+
+    return list(ramp)
+
+
+def build_canary_rule(harper_rule, percent):
+    """
+    Wraps the Harper rule so it only applies to `percent`% of requests:
+    a per-request random bucket 1..100 in PMUSER_HARPER_CANARY, and a child
+    rule matching buckets 1..percent. At 100% the rule is returned unwrapped.
+    """
+    if percent >= 100:
+        return copy.deepcopy(harper_rule)
+
+    inner = copy.deepcopy(harper_rule)
+
+    return {
+        "name": harper_rule["name"],
+        "children": [
+            {
+                "name": f"Harper canary {percent}%",
+                "children": inner.get("children", []),
+                "behaviors": inner.get("behaviors", []),
+                "criteria": [
+                    {
+                        "name": "matchVariable",
+                        "options": {
+                            "variableName": CANARY_VARIABLE,
+                            "matchOperator": "IS_BETWEEN",
+                            "lowerBound": "1",
+                            "upperBound": str(percent)
+                        }
+                    }
+                ],
+                "criteriaMustSatisfy": "all",
+                "comments": f"Harper canary: {percent}% of requests"
+            }
+        ],
+        "behaviors": [
+            {
+                "name": "setVariable",
+                "options": {
+                    "variableName": CANARY_VARIABLE,
+                    "valueSource": "GENERATE",
+                    "generator": "RAND",
+                    "minRandomNumber": "1",
+                    "maxRandomNumber": "100"
+                }
+            }
+        ],
+        "criteria": inner.get("criteria", []),
+        "criteriaMustSatisfy": inner.get("criteriaMustSatisfy", "all"),
+        "comments": inner.get("comments", "")
+    }
+
+
+@traced()
+def build_canary_rule_trees(base_tree, harper_rule, ramp, verbose=False):
+    """One complete rule tree per ramp step, all derived from base_tree."""
+    trees = []
+
+    for percent in ramp:
+        tree = copy.deepcopy(base_tree)
+        extra = [CANARY_VARIABLE] if percent < 100 else []
+        inject_required_variables(tree, verbose, extra)
+        insert_harper_rule(tree, build_canary_rule(harper_rule, percent), verbose)
+        trees.append((percent, tree))
+
+    return trees
+
+
 # ------------------------------------------------------
 # GET PROPERTY RULE TREE
 # ------------------------------------------------------
+@traced()
 def get_property_rules(session, baseurl, propertyId, propertyVersion,
                        accountSwitchKey, verbose=False):
 
-    dbg(verbose, f"Fetching rule tree for {propertyId} version {propertyVersion}")
+    log.debug("Fetching rule tree for %s version %s", propertyId, propertyVersion)
+
+    cache_key = (caches.session_section(session), accountSwitchKey, propertyId, int(propertyVersion))
+    cached = caches.rule_trees.get(cache_key)
+    if cached is not None:
+        log.debug("Rule tree for %s version %s served from cache", propertyId, propertyVersion)
+        return loads(cached)
+
+    prefetched = prefetch.take(prefetch.rule_tree_key(accountSwitchKey, propertyId, propertyVersion))
+    if prefetched is not prefetch.MISS:
+        return prefetched
 
     path = f"/papi/v1/properties/{propertyId}/versions/{propertyVersion}/rules"
     params = {}
@@ -77,23 +240,25 @@ def get_property_rules(session, baseurl, propertyId, propertyVersion,
         params["accountSwitchKey"] = accountSwitchKey
 
     url = urljoin(baseurl, path)
-    dbg(verbose, f"GET {url}")
+    log.debug("GET %s", url)
 
     resp = session.get(url, params=params, headers={"Accept": "application/json"})
 
     if resp.status_code != 200:
         raise Exception(f"Failed to fetch rule tree: {resp.text}")
 
-    return resp.json()
+    caches.rule_trees.put(cache_key, resp.content)
+    return response_json(resp)
 
 
 # ------------------------------------------------------
 # CREATE NEW VERSION
 # ------------------------------------------------------
+@traced()
 def create_new_property_version(session, baseurl, propertyId, oldVersion,
                                 accountSwitchKey, verbose=False):
 
-    dbg(verbose, f"Creating new property version from {oldVersion}")
+    log.debug("Creating new property version from %s", oldVersion)
 
     path = f"/papi/v1/properties/{propertyId}/versions"
     params = {}
@@ -105,62 +270,65 @@ def create_new_property_version(session, baseurl, propertyId, oldVersion,
 
     payload = {"createFromVersion": oldVersion}
 
-    resp = session.post(url, params=params,
-                        headers={"Content-Type": "application/json"},
-                        data=json.dumps(payload))
+    resp = send_json(session, "POST", url, payload, params=params)
 
     if resp.status_code not in (200, 201):
         raise Exception(f"Failed to create new version: {resp.text}")
 
-    version_link = resp.json().get("versionLink", "")
+    version_link = response_json(resp).get("versionLink", "")
     new_version = int(version_link.split("/")[-1].split("?")[0])
 
-    dbg(verbose, f"Created new version = {new_version}")
+    log.debug("Created new version = %s", new_version)
     return new_version
 
 
 # ------------------------------------------------------
 # UPDATE PROPERTY RULE TREE
 # ------------------------------------------------------
+@traced()
 def update_property_rules(session, baseurl, propertyId, newVersion, rule_tree,
-                          accountSwitchKey, verbose=False):
+                          accountSwitchKey, verbose=False, validate=True):
 
-    dbg(verbose, f"Uploading updated rule tree to version {newVersion}")
+    log.debug("Uploading updated rule tree to version %s", newVersion)
 
     path = f"/papi/v1/properties/{propertyId}/versions/{newVersion}/rules"
     params = {}
+    if not validate:
+        params["validateRules"] = "false"
     if accountSwitchKey:
         params["accountSwitchKey"] = accountSwitchKey
 
     url = urljoin(baseurl, path)
 
-    resp = session.put(url,
-                       params=params,
-                       headers={"Content-Type": "application/json"},
-                       data=json.dumps(rule_tree))
+    # any cached copy of this version is stale from here on
+    caches.rule_trees.invalidate(lambda key: key[2:] == (propertyId, int(newVersion)))
+
+    resp = send_json(session, "PUT", url, rule_tree, params=params, compress=True)
 
     if resp.status_code != 200:
         raise Exception(f"Failed to update rule tree: {resp.text}")
 
-    dbg(verbose, "Rule tree updated.")
-    return resp.json()
+    log.debug("Rule tree updated.")
+    return response_json(resp)
 
 
 # ------------------------------------------------------
 # ACTIVATE NEW VERSION (respects activationMode)
 # ------------------------------------------------------
+@traced()
 def activate_property(session, baseurl, propertyId, version,
-                      email, activationMode, accountSwitchKey, verbose=False):
+                      email, activationMode, accountSwitchKey, verbose=False,
+                      note="Automated Harper Redirect + Early Hints injection"):
 
     mode = activationMode.lower()
 
     if mode == "saveonly":
-        print("[INFO] Activation skipped (saveonly mode).")
+        log.info("Activation skipped (saveonly mode).")
         return {"activation": "skipped"}
 
     network = "STAGING" if mode == "staging" else "PRODUCTION"
 
-    dbg(verbose, f"Activating version {version} on {network}")
+    log.debug("Activating version %s on %s", version, network)
 
     path = f"/papi/v1/properties/{propertyId}/activations"
     params = {}
@@ -173,28 +341,130 @@ def activate_property(session, baseurl, propertyId, version,
     payload = {
         "propertyVersion": int(version),
         "network": network,
-        "notifyEmails": [email],
+        "notifyEmails": email if isinstance(email, list) else [email],
         "activationType": "ACTIVATE",
-        "note": "Automated Harper Redirect + Early Hints injection",
+        "note": note,
         "acknowledgeAllWarnings": True
     }
 
-    dbg(verbose, f"Activation payload: {payload}")
-
-    resp = session.post(url, params=params,
-                        headers={"Content-Type": "application/json"},
-                        json=payload)
+    resp = send_json(session, "POST", url, payload, params=params, label="Activation payload")
 
     if resp.status_code not in (200, 201):
         raise Exception(f"Activation failed: {resp.text}")
 
-    print(f"[SUCCESS] Activation submitted → {network}")
-    return resp.json()
+    log.success("Activation submitted → %s", network)
+    return response_json(resp)
+
+
+# ------------------------------------------------------
+# LATEST VERSION (optionally: latest active on a network)
+# ------------------------------------------------------
+@traced()
+def get_latest_property_version(session, baseurl, propertyId, network,
+                                accountSwitchKey, verbose=False):
+
+    prefetched = prefetch.take(prefetch.latest_version_key(accountSwitchKey, propertyId, network))
+    if prefetched is not prefetch.MISS:
+        return prefetched
+
+    path = f"/papi/v1/properties/{propertyId}/versions/latest"
+    params = {}
+    if network:
+        params["activatedOn"] = network
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+
+    url = urljoin(baseurl, path)
+    log.debug("GET %s activatedOn=%s", url, network)
+
+    resp = session.get(url, params=params, headers={"Accept": "application/json"})
+
+    if resp.status_code != 200:
+        raise Exception(f"Failed to fetch latest version: {resp.text}")
+
+    items = response_json(resp).get("versions", {}).get("items", [])
+    if not items:
+        raise Exception(f"No {network or 'latest'} version found for {propertyId}")
+
+    return int(items[0]["propertyVersion"])
+
+
+# ------------------------------------------------------
+# PROPERTY STATUS (latest / staging / production versions)
+# ------------------------------------------------------
+@traced()
+def get_property_status(session, baseurl, propertyId, contractId, groupId,
+                        accountSwitchKey, verbose=False):
+
+    path = f"/papi/v1/properties/{propertyId}"
+    params = {"contractId": contractId, "groupId": groupId}
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+
+    url = urljoin(baseurl, path)
+    log.debug("GET %s", url)
+
+    resp = session.get(url, params=params, headers={"Accept": "application/json"})
+
+    if resp.status_code != 200:
+        raise Exception(f"Failed to fetch property {propertyId}: {resp.text}")
+
+    items = response_json(resp).get("properties", {}).get("items", [])
+    if not items:
+        raise Exception(f"Property {propertyId} not found")
+
+    prop = items[0]
+    return {
+        "propertyId": prop.get("propertyId", propertyId),
+        "propertyName": prop.get("propertyName"),
+        "latestVersion": prop.get("latestVersion"),
+        "stagingVersion": prop.get("stagingVersion"),
+        "productionVersion": prop.get("productionVersion")
+    }
+
+
+# ------------------------------------------------------
+# WAIT FOR ACTIVATION
+# ------------------------------------------------------
+@traced(kind="wait")
+def wait_for_property_activation(session, baseurl, activation_resp, accountSwitchKey,
+                                 verbose=False, poll_seconds=30, max_attempts=60):
+
+    link = activation_resp.get("activationLink") if isinstance(activation_resp, dict) else None
+    if not link:
+        raise Exception("Activation response has no activationLink to poll")
+
+    params = {}
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+
+    url = urljoin(baseurl, link)
+
+    for attempt in range(max_attempts):
+        resp = session.get(url, params=params, headers={"Accept": "application/json"})
+
+        if resp.status_code != 200:
+            raise Exception(f"Failed to fetch activation status: {resp.text}")
+
+        items = response_json(resp).get("activations", {}).get("items", [])
+        status = items[0].get("status") if items else None
+
+        log.info("Activation: %s", status)
+
+        if status == "ACTIVE":
+            return True
+        if status in ("FAILED", "ABORTED", "DEACTIVATED"):
+            raise Exception(f"Activation ended with status {status}")
+
+        time.sleep(poll_seconds)
+
+    raise Exception("Activation did not become ACTIVE in time")
 
 
 # ------------------------------------------------------
 # MAIN WORKFLOW
 # ------------------------------------------------------
+@traced()
 def run_harper_redirect_earlyhints_workflow(
     session,
     baseurl,
@@ -206,9 +476,9 @@ def run_harper_redirect_earlyhints_workflow(
     accountSwitchKey,
     verbose=False
 ):
-    print("\n=== HARPER REDIRECT + EARLY HINTS WORKFLOW START ===")
+    log.info("=== HARPER REDIRECT + EARLY HINTS WORKFLOW START ===")
 
-    email = config["activationEmails"]
+    email = list(config.activationEmails)
     results = {}
 
     # 1) Fetch rule tree
@@ -222,58 +492,159 @@ def run_harper_redirect_earlyhints_workflow(
 
     # 3) Inject EW ID
     harper_rule = inject_edgeworker_id(harper_rule, ew_id, verbose)
+    harper_rule = set_continue_on_error(harper_rule, config.edgeworker.failOpen, verbose)
+
+    # 4) Build one rule tree per canary step (just [100] without canary)
+    ramp = list(config.propertyManager.customerFacing.canaryRamp)
+    hold_seconds = config.propertyManager.customerFacing.canaryHoldSeconds
+
+    # 5) Insert Harper rule (+ required PMUSER vars)
+    step_trees = build_canary_rule_trees(rule_tree, harper_rule, ramp, verbose)
+
+    if len(ramp) > 1:
+        log.info("Canary ramp: %s (hold %ss per step)", ' → '.join((f'{p}%' for p in ramp)), hold_seconds)
+        results["canary"] = []
+
+    # 5b) propertyHostnames missing from the base version; every step's
+    #     version starts from that base, so the same change applies to each
+    current_hostnames, desired_hostnames = [], []
+    if config.propertyManager.customerFacing.propertyHostnames:
+        current_hostnames = get_property_hostnames(
+            session, baseurl, propertyId, propertyVersion,
+            config.contractId, config.groupId, accountSwitchKey
+        )
+        desired_hostnames = customer_desired_hostnames(config, current_hostnames)
+
+    for step, (percent, step_tree) in enumerate(step_trees):
+        last_step = step == len(step_trees) - 1
+
+        # 6) Create new version
+        new_version = create_new_property_version(
+            session, baseurl,
+            propertyId, propertyVersion,
+            accountSwitchKey, verbose
+        )
+        results["newVersion"] = new_version
+
+        # 7) Upload rule updates
+        update_resp = update_property_rules(
+            session, baseurl,
+            propertyId, new_version,
+            step_tree,
+            accountSwitchKey, verbose
+        )
+        results["updateResponse"] = update_resp
+
+        # 7b) Hostnames (one PATCH, only when something is missing)
+        if desired_hostnames:
+            results["hostnames"] = sync_property_hostnames(
+                session, baseurl,
+                propertyId, new_version,
+                desired_hostnames,
+                config.contractId, config.groupId, accountSwitchKey,
+                current=current_hostnames
+            )
+
+        # 8) Activate
+        activation_resp = activate_property(
+            session, baseurl,
+            propertyId, new_version,
+            email,
+            activationMode,
+            accountSwitchKey,
+            verbose
+        )
+        results["activation"] = activation_resp
+
+        if len(ramp) > 1:
+            results["canary"].append({
+                "percent": percent,
+                "version": new_version,
+                "activation": activation_resp
+            })
 
-    # 4) Ensure PMUSER vars exist
-    rule_tree = inject_required_variables(rule_tree, verbose)
+        # 9) Wait + hold before widening the canary
+        if not last_step and activationMode.lower() != "saveonly":
+            wait_for_property_activation(session, baseurl, activation_resp, accountSwitchKey, verbose)
+            log.info("Canary at %s%% — holding %ss before the next step…", percent, hold_seconds)
+            with span("canary_hold", kind="wait", percent=percent):
+                time.sleep(hold_seconds)
 
-    # 5) Insert Harper rule
-    dbg(verbose, "Inserting Harper rule into rule tree…")
+    log.info("=== HARPER REDIRECT + EARLY HINTS WORKFLOW COMPLETE ===")
+    return results
 
-    rules_node = rule_tree.get("rules")
-    children = rules_node.setdefault("children", [])
 
-    cond_orig_idx = adv_idx = None
+# ------------------------------------------------------
+# KILL SWITCH (flip PMUSER_HARPER_* on the customer property)
+# ------------------------------------------------------
+KILL_SWITCH_VARIABLE = "PMUSER_HARPER_ENABLED"
+KILL_SWITCH_TIMEOUT_VARIABLE = "PMUSER_HARPER_TIMEOUT_MS"
 
-    for i, child in enumerate(children):
-        behaviors = child.get("behaviors", [])
 
-        if any(b.get("name") == "allowConditionalOrigins" for b in behaviors):
-            cond_orig_idx = i
-        if any(b.get("name") in ("advanced", "advancedOverride") for b in behaviors):
-            adv_idx = i
+def set_rule_variable(rule_tree, name, value, verbose=False):
+    log.debug("Setting %s = %r", name, value)
 
-    indices = [x for x in (adv_idx, cond_orig_idx) if x is not None]
-    insert_index = min(indices) if indices else len(children)
+    variables = rule_tree["rules"].setdefault("variables", [])
 
-    children.insert(insert_index, harper_rule)
+    for var in variables:
+        if var["name"] == name:
+            var["value"] = value
+            return rule_tree
+
+    variables.append({"name": name, "value": value, "description": ""})
+    return rule_tree
+
+
+@traced()
+def run_harper_kill_switch_workflow(session, baseurl, config, propertyId, enabled,
+                                    timeout_ms, activationMode, accountSwitchKey, verbose=False):
+    """
+    Sheds (or restores) the Harper dependency without a new EdgeWorker
+    version: copies the version currently active on the target network,
+    flips PMUSER_HARPER_ENABLED (and optionally PMUSER_HARPER_TIMEOUT_MS),
+    uploads without validation and activates.
+    """
+    log.info("=== HARPER KILL SWITCH START ===")
+
+    mode = activationMode.lower()
+    network = None if mode == "saveonly" else mode.upper()
+
+    base_version = get_latest_property_version(
+        session, baseurl, propertyId, network, accountSwitchKey, verbose
+    )
+    log.info("Base version: %s (%s)", base_version, network or 'latest')
+
+    rule_tree = get_property_rules(
+        session, baseurl, propertyId, base_version, accountSwitchKey, verbose
+    )
+
+    set_rule_variable(rule_tree, KILL_SWITCH_VARIABLE, "true" if enabled else "false", verbose)
+    if timeout_ms is not None:
+        set_rule_variable(rule_tree, KILL_SWITCH_TIMEOUT_VARIABLE, str(int(timeout_ms)) if timeout_ms else "", verbose)
 
-    # 6) Create new version
     new_version = create_new_property_version(
-        session, baseurl,
-        propertyId, propertyVersion,
-        accountSwitchKey, verbose
+        session, baseurl, propertyId, base_version, accountSwitchKey, verbose
     )
-    results["newVersion"] = new_version
 
-    # 7) Upload rule updates
-    update_resp = update_property_rules(
-        session, baseurl,
-        propertyId, new_version,
-        rule_tree,
-        accountSwitchKey, verbose
+    update_property_rules(
+        session, baseurl, propertyId, new_version, rule_tree,
+        accountSwitchKey, verbose, validate=False
     )
-    results["updateResponse"] = update_resp
 
-    # 8) Activate
+    state = "enabled" if enabled else "disabled"
     activation_resp = activate_property(
-        session, baseurl,
-        propertyId, new_version,
-        email,
-        activationMode,
-        accountSwitchKey,
-        verbose
+        session, baseurl, propertyId, new_version,
+        list(config.activationEmails), activationMode, accountSwitchKey, verbose,
+        note=f"Harper kill switch: subrequest {state}"
     )
-    results["activation"] = activation_resp
 
-    print("\n=== HARPER REDIRECT + EARLY HINTS WORKFLOW COMPLETE ===")
-    return results
+    log.success("Harper subrequest %s in version %s", state, new_version)
+    log.info("=== HARPER KILL SWITCH COMPLETE ===")
+
+    return {
+        "baseVersion": base_version,
+        "newVersion": new_version,
+        "harperEnabled": enabled,
+        "timeoutOverrideMs": timeout_ms,
+        "activation": activation_resp
+    }
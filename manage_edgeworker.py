@@ -1,35 +1,47 @@
 import os
 import re
-import json
+import time
 import tarfile
-import logging
 from urllib.parse import urljoin
 
-from helpers import dbg
+import caches
+from helpers import thaw
+from tracing import traced
+from log import get_logger
+from json_codec import send_json, response_json, load_file, write_file, digest
+from redirect_compiler import build_redirect_module, MAX_BUNDLE_COMPRESSED_BYTES
+from bundle_optimizer import (
+    optimize_bundle_sources,
+    build_bundle_report,
+    check_bundle_budget
+)
 
-logger = logging.getLogger("edgeworker")
-logger.setLevel(logging.INFO)
+log = get_logger("edgeworker")
+
+EDGEWORKER_FOLDER = "data/edgeworker"
 
 
 # =========================================================
-# UPDATE main.js USING requirements.json
+# UPDATE main.js FROM THE CONFIG
 # =========================================================
-def update_main_js(requirements_json, main_js_file, verbose):
-    dbg(verbose, f"Updating main.js → {main_js_file}")
-    logger.info(f"[STEP] Updating main.js using {requirements_json}")
-
-    # Load config
-    with open(requirements_json, "r") as f:
-        req = json.load(f)
+@traced()
+def update_main_js(config, main_js_file, verbose):
+    log.debug("Updating main.js → %s", main_js_file)
+    log.step("Updating main.js from requirements.json")
 
-    # Extract internal hostname + token
-    internal_hostname = req["propertyManager"]["internalHarperHostname"]["internalHostname"]
-    harper_token = req["edgeworker"]["harper_token"]
+    # Internal hostname + token
+    internal_hostname = config.propertyManager.internal.internalHostname
+    harper_token = config.edgeworker.harperToken
 
     new_subrequest_base = f"https://{internal_hostname}"
 
-    dbg(verbose, f"New HARPPER_TOKEN = {harper_token}")
-    dbg(verbose, f"New SUBREQUEST_BASE_URL = {new_subrequest_base}")
+    # Subrequest timeout + fail-open behavior
+    timeout_ms = config.edgeworker.subrequestTimeoutMs
+    fail_open = config.edgeworker.failOpen
+
+    log.debug("New HARPER_TOKEN set (%s chars)", len(harper_token))
+    log.debug("New SUBREQUEST_BASE_URL = %s", new_subrequest_base)
+    log.debug("New SUBREQUEST_TIMEOUT_MS = %s, FAIL_OPEN = %s", timeout_ms, fail_open)
 
     # Read main.js
     with open(main_js_file, "r") as f:
@@ -49,27 +61,43 @@ def update_main_js(requirements_json, main_js_file, verbose):
         content
     )
 
+    # Replace timeout
+    content = re.sub(
+        r"const SUBREQUEST_TIMEOUT_MS\s*=\s*\d+;",
+        f"const SUBREQUEST_TIMEOUT_MS = {timeout_ms};",
+        content
+    )
+
+    # Replace fail-open flag
+    content = re.sub(
+        r"const FAIL_OPEN\s*=\s*(true|false);",
+        f"const FAIL_OPEN = {'true' if fail_open else 'false'};",
+        content
+    )
+
     # Save updated file
     with open(main_js_file, "w") as f:
         f.write(content)
 
-    logger.info("[SUCCESS] Updated HARPPER_TOKEN + SUBREQUEST_BASE_URL in main.js")
-    dbg(verbose, "main.js update completed.")
+    log.success("Updated HARPPER_TOKEN, SUBREQUEST_BASE_URL, SUBREQUEST_TIMEOUT_MS + FAIL_OPEN in main.js")
+    log.debug("main.js update completed.")
 
 
 # =========================================================
 # CREATE TGZ BUNDLE
 # =========================================================
+@traced()
 def create_bundle(source_folder, output_tgz, verbose):
-    dbg(verbose, f"Creating bundle → {output_tgz}")
-    logger.info(f"[STEP] Creating EdgeWorker bundle → {output_tgz}")
+    log.debug("Creating bundle → %s", output_tgz)
+    log.step("Creating EdgeWorker bundle → %s", output_tgz)
 
     if os.path.exists(output_tgz):
-        dbg(verbose, f"Removing old bundle: {output_tgz}")
+        log.debug("Removing old bundle: %s", output_tgz)
         os.remove(output_tgz)
 
     main_js_path = os.path.join(source_folder, "main.js")
     bundle_json_path = os.path.join(source_folder, "bundle.json")
+    redirects_js_path = os.path.join(source_folder, "redirects.js")
 
     if not os.path.exists(main_js_path):
         raise FileNotFoundError(f"main.js not found at {main_js_path}")
@@ -80,17 +108,131 @@ def create_bundle(source_folder, output_tgz, verbose):
         # root of tar should look like: main.js, bundle.json
         tgz.add(main_js_path, arcname="main.js")
         tgz.add(bundle_json_path, arcname="bundle.json")
+        if os.path.exists(redirects_js_path):
+            tgz.add(redirects_js_path, arcname="redirects.js")
+
+    bundle_size = os.path.getsize(output_tgz)
+    log.debug("Bundle size = %s bytes", bundle_size)
+
+    if bundle_size > MAX_BUNDLE_COMPRESSED_BYTES:
+        raise Exception(
+            f"Bundle {output_tgz} is {bundle_size} bytes — over the "
+            f"{MAX_BUNDLE_COMPRESSED_BYTES} byte EdgeWorker limit"
+        )
 
-    logger.info(f"[SUCCESS] Bundle created: {output_tgz}")
-    dbg(verbose, "Bundle creation completed.")
+    log.success("Bundle created: %s", output_tgz)
+    log.debug("Bundle creation completed.")
+    return bundle_size
+
+
+# =========================================================
+# EDGEWORKER IDS BY NAME (once per run, see caches.listings)
+# =========================================================
+def edgeworker_ids_listing_key(section, groupId, accountSwitchKey):
+    return ("edgeworkerIds", section, accountSwitchKey, str(groupId))
+
+
+@traced()
+def list_edgeworker_ids(session, baseurl, groupId, accountSwitchKey):
+    """name -> [item] for the (numeric) group."""
+
+    def fetch():
+        url = urljoin(baseurl, "/edgeworkers/v1/ids")
+
+        params = {"groupId": groupId}
+        if accountSwitchKey:
+            params["accountSwitchKey"] = accountSwitchKey
+
+        log.debug("GET %s params=%s", url, params)
+        result = session.get(url, params=params, headers={"Accept": "application/json"})
+
+        if result.status_code != 200:
+            raise Exception(f"EdgeWorker ID listing failed: {result.text}")
+
+        return caches.index_by_name(response_json(result).get("edgeWorkerIds", []), "name")
+
+    return caches.cached_listing(
+        edgeworker_ids_listing_key(caches.session_section(session), groupId, accountSwitchKey), fetch
+    )
+
+
+@traced()
+def get_or_create_edgeworker_id(session, baseurl, name, groupId, resourceTierId, description,
+                                accountSwitchKey, verbose):
+    """Reuses an EdgeWorker ID of the same name in the group and resource tier."""
+    index = list_edgeworker_ids(session, baseurl, groupId, accountSwitchKey)
+
+    for item in index.get(name, []):
+        if str(item.get("groupId")) == str(groupId) and item.get("resourceTierId") == resourceTierId:
+            log.success("Reusing EdgeWorker ID %s (%s)", item["edgeWorkerId"], name)
+            return item["edgeWorkerId"], True
+
+    if name in index:
+        log.warning("EdgeWorker '%s' exists on another resource tier — creating a new ID.", name)
+
+    ew_id = create_edgeworker_id(
+        session, baseurl, name, groupId, resourceTierId, description, accountSwitchKey, verbose
+    )
+    index.setdefault(name, []).append({
+        "edgeWorkerId": ew_id, "name": name, "groupId": groupId, "resourceTierId": resourceTierId
+    })
+    return ew_id, False
+
+
+@traced()
+def list_edgeworker_versions(session, baseurl, ew_id, accountSwitchKey):
+    url = urljoin(baseurl, f"/edgeworkers/v1/ids/{ew_id}/versions")
+
+    params = {}
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+
+    result = session.get(url, params=params, headers={"Accept": "application/json"})
+
+    if result.status_code != 200:
+        raise Exception(f"Failed to list versions of EdgeWorker {ew_id}: {result.text}")
+
+    return [v.get("version") for v in response_json(result).get("versions", [])]
+
+
+def stamp_bundle_version(build_folder, existing_versions):
+    """
+    An EdgeWorker version can be uploaded once. When bundle.json's version
+    already exists on a reused ID, it becomes "<version>-<content digest>",
+    so changed sources get a new version and unchanged ones map to the one
+    already uploaded. Returns (version, whether bundle.json was rewritten).
+    """
+    bundle_json_path = os.path.join(build_folder, "bundle.json")
+    bundle = load_file(bundle_json_path)
+    version = str(bundle.get("edgeworker-version"))
+
+    if version not in existing_versions:
+        return version, False
+
+    contents = b""
+    for name in ("main.js", "redirects.js", "bundle.json"):
+        path = os.path.join(build_folder, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                contents += name.encode() + b"\0" + f.read()
+
+    stamped = f"{version}-{digest(contents)[:8]}"
+    if stamped in existing_versions:
+        return stamped, False
+
+    bundle["edgeworker-version"] = stamped
+    write_file(bundle_json_path, bundle)
+    log.info("EdgeWorker version %s already exists — uploading as %s", version, stamped)
+    return stamped, True
 
 
 # =========================================================
 # CREATE EDGEWORKER ID
 # =========================================================
+@traced()
 def create_edgeworker_id(session, baseurl, name, groupId, resourceTierId, description,
                          accountSwitchKey, verbose):
-    logger.info(f"[STEP] Creating EdgeWorker ID → {name}")
+    log.step("Creating EdgeWorker ID → %s", name)
 
     path = "/edgeworkers/v1/ids"
     url = urljoin(baseurl, path)
@@ -106,33 +248,33 @@ def create_edgeworker_id(session, baseurl, name, groupId, resourceTierId, descri
         "description": description
     }
 
-    dbg(verbose, f"EdgeWorker ID Creation Payload = {payload}")
-    dbg(verbose, f"POST {url} params={params}")
+    log.debug("POST %s params=%s", url, params)
 
-    result = session.post(
-        url,
+    result = send_json(
+        session, "POST", url, payload,
         params=params,
-        headers={"Content-Type": "application/json", "Accept": "application/json"},
-        json=payload
+        headers={"Accept": "application/json"},
+        label="EdgeWorker ID Creation Payload"
     )
 
-    dbg(verbose, f"Response Status: {result.status_code}")
-    dbg(verbose, f"Response Body: {result.text}")
+    log.debug("Response Status: %s", result.status_code)
+    log.payload("Response Body", result)
 
     if result.status_code not in (200, 201):
         raise Exception(result.text)
 
-    ew_id = result.json().get("edgeWorkerId")
-    logger.info(f"[SUCCESS] EdgeWorker ID created → {ew_id}")
+    ew_id = response_json(result).get("edgeWorkerId")
+    log.success("EdgeWorker ID created → %s", ew_id)
     return ew_id
 
 
 # =========================================================
 # UPLOAD EDGEWORKER VERSION
 # =========================================================
+@traced()
 def upload_edgeworker_version(session, baseurl, ew_id, tgz_file, accountSwitchKey, verbose):
-    dbg(verbose, f"Uploading .tgz for EW ID = {ew_id}")
-    logger.info(f"[STEP] Uploading version for EdgeWorker ID {ew_id}")
+    log.debug("Uploading .tgz for EW ID = %s", ew_id)
+    log.step("Uploading version for EdgeWorker ID %s", ew_id)
 
     if not os.path.exists(tgz_file):
         raise FileNotFoundError(f"Bundle not found: {tgz_file}")
@@ -147,7 +289,7 @@ def upload_edgeworker_version(session, baseurl, ew_id, tgz_file, accountSwitchKe
     with open(tgz_file, "rb") as f:
         payload = f.read()
 
-    dbg(verbose, f"Uploading bundle size = {len(payload)} bytes")
+    log.debug("Uploading bundle size = %s bytes", len(payload))
 
     result = session.post(
         url,
@@ -156,17 +298,17 @@ def upload_edgeworker_version(session, baseurl, ew_id, tgz_file, accountSwitchKe
         data=payload
     )
 
-    dbg(verbose, f"Response Status: {result.status_code}")
-    dbg(verbose, f"Response Body: {result.text}")
+    log.debug("Response Status: %s", result.status_code)
+    log.payload("Response Body", result)
 
     if result.status_code not in (200, 201):
-        logger.error(f"[ERROR] Failed to upload EdgeWorker version → {result.text}")
+        log.error("Failed to upload EdgeWorker version → %s", result.text)
         raise Exception(result.text)
 
-    version = result.json().get("version")
+    version = response_json(result).get("version")
 
-    logger.info(f"[SUCCESS] Version uploaded: {version}")
-    dbg(verbose, f"Uploaded version = {version}")
+    log.success("Version uploaded: %s", version)
+    log.debug("Uploaded version = %s", version)
 
     return version
 
@@ -174,9 +316,10 @@ def upload_edgeworker_version(session, baseurl, ew_id, tgz_file, accountSwitchKe
 # =========================================================
 # ACTIVATE EDGEWORKER
 # =========================================================
+@traced()
 def activate_edgeworker(session, baseurl, ew_id, version, network, accountSwitchKey, verbose):
-    dbg(verbose, f"Activating EW ID={ew_id} version={version} on {network}")
-    logger.info(f"[STEP] Activating EW {ew_id} version {version} on {network}")
+    log.debug("Activating EW ID=%s version=%s on %s", ew_id, version, network)
+    log.step("Activating EW %s version %s on %s", ew_id, version, network)
 
     path = f"/edgeworkers/v1/ids/{ew_id}/activations"
     url = urljoin(baseurl, path)
@@ -190,87 +333,184 @@ def activate_edgeworker(session, baseurl, ew_id, version, network, accountSwitch
         "version": version
     }
 
-    dbg(verbose, f"Activation Payload = {payload}")
-    dbg(verbose, f"POST {url} params={params}")
+    log.debug("POST %s params=%s", url, params)
 
-    result = session.post(
-        url,
+    result = send_json(
+        session, "POST", url, payload,
         params=params,
-        headers={"Content-Type": "application/json", "Accept": "application/json"},
-        json=payload
+        headers={"Accept": "application/json"},
+        label="Activation Payload"
     )
 
-    dbg(verbose, f"Activation Response Status: {result.status_code}")
-    dbg(verbose, f"Activation Response Body: {result.text}")
+    log.debug("Activation Response Status: %s", result.status_code)
+    log.payload("Activation Response Body", result)
 
     if result.status_code not in (200, 201):
-        logger.error(f"[ERROR] EdgeWorker activation failed → {result.text}")
+        log.error("EdgeWorker activation failed → %s", result.text)
         raise Exception(result.text)
 
-    logger.info("[SUCCESS] Activation submitted successfully.")
-    return result.json()
+    log.success("Activation submitted successfully.")
+    return response_json(result)
+
+
+# =========================================================
+# WAIT FOR ACTIVATION
+# =========================================================
+@traced(kind="wait")
+def wait_for_edgeworker_activation(session, baseurl, ew_id, activation_id, accountSwitchKey,
+                                   verbose=False, poll_seconds=30, max_attempts=60):
+    path = f"/edgeworkers/v1/ids/{ew_id}/activations/{activation_id}"
+    url = urljoin(baseurl, path)
+
+    params = {}
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+
+    for attempt in range(max_attempts):
+        result = session.get(url, params=params, headers={"Accept": "application/json"})
+
+        if result.status_code != 200:
+            raise Exception(f"Failed to fetch EdgeWorker activation status: {result.text}")
+
+        status = response_json(result).get("status")
+        log.info("EdgeWorker activation: %s", status)
+
+        if status == "COMPLETE":
+            return True
+        if status in ("ERROR", "ABORTED"):
+            raise Exception(f"EdgeWorker activation ended with status {status}")
+
+        time.sleep(poll_seconds)
+
+    raise Exception("EdgeWorker activation did not complete in time")
+
+
+# =========================================================
+# EDGEWORKER ACTIVATIONS (status)
+# =========================================================
+@traced()
+def get_edgeworker_activations(session, baseurl, ew_id, accountSwitchKey, verbose=False):
+    path = f"/edgeworkers/v1/ids/{ew_id}/activations"
+    url = urljoin(baseurl, path)
+
+    params = {}
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+
+    log.debug("GET %s", url)
+
+    result = session.get(url, params=params, headers={"Accept": "application/json"})
+
+    if result.status_code != 200:
+        raise Exception(f"Failed to fetch activations for EdgeWorker {ew_id}: {result.text}")
+
+    # newest first
+    return response_json(result).get("activations", [])
 
 
 # =========================================================
 # RUN WORKFLOW
 # =========================================================
-def run_edgeworker_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose):
-    print("\n=== EDGEWORKER WORKFLOW START ===")
+@traced()
+def run_edgeworker_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose,
+                            edgeworker_folder=EDGEWORKER_FOLDER):
+    """
+    edgeworker_folder holds main.js / bundle.json and receives the build;
+    concurrent jobs (harper_daemon.py) each pass their own copy.
+    """
+    log.info("=== EDGEWORKER WORKFLOW START ===")
 
-    ew_info = config["edgeworker"]
+    ew_info = config.edgeworker
 
     # Paths
-    requirements_json = "requirements.json"
-    edgeworker_folder = "data/edgeworker"
     main_js = os.path.join(edgeworker_folder, "main.js")
     bundle_path = os.path.join(edgeworker_folder, "edgeworker_bundle.tgz")
 
-    # groupId = "grp_xxx" → EdgeWorkers require numeric
-    groupId_raw = config["groupId"]
-    groupId = int(groupId_raw.replace("grp_", ""))
-    dbg(verbose, f"groupId from config = {groupId_raw}")
-    dbg(verbose, f"Numeric groupId for EdgeWorker = {groupId}")
+    # EdgeWorkers require the numeric groupId
+    groupId = config.groupIdNumeric
+    log.debug("Numeric groupId for EdgeWorker = %s", groupId)
 
     results = {}
 
     # STEP 1 – update JS
-    update_main_js(requirements_json, main_js, verbose)
+    update_main_js(config, main_js, verbose)
+
+    # STEP 1b – compile static redirects into the bundle
+    redirect_report = build_redirect_module(
+        ew_info.redirectDataset,
+        os.path.join(edgeworker_folder, "redirects.js")
+    )
+    if redirect_report["enabled"]:
+        log.info(
+            "Compiled %s exact + %s prefix redirects (%s → %s bytes gzipped, ratio %s)",
+            redirect_report["exactRedirects"], redirect_report["prefixRedirects"], redirect_report["sourceBytes"], redirect_report["gzipBytes"], redirect_report["compressionRatio"]
+        )
+
+    # STEP 2a – minify + strip dead logging into the build folder
+    build_folder = os.path.join(edgeworker_folder, "build")
+    optimization = optimize_bundle_sources(
+        edgeworker_folder, build_folder,
+        minify=ew_info.minify,
+        strip_logging=ew_info.stripDeadLogging
+    )
 
     # STEP 2 – create bundle
-    create_bundle(edgeworker_folder, bundle_path, verbose)
+    redirect_report["bundleBytes"] = create_bundle(build_folder, bundle_path, verbose)
+    results["redirectTable"] = redirect_report
+
+    # STEP 2b – size / cold-start budget for the resource tier
+    bundle_report = build_bundle_report(optimization, bundle_path, thaw(ew_info.budget))
+    results["bundle"] = bundle_report
+    log.info(
+        "Bundle: %s bytes uncompressed, %s bytes compressed, ~%sms estimated init",
+        bundle_report["uncompressedBytes"], bundle_report["compressedBytes"], bundle_report["estimatedInitMs"]
+    )
+    check_bundle_budget(bundle_report, bundle_report["budget"])
 
-    # STEP 3 – create EW ID
-    ew_id = create_edgeworker_id(
+    # STEP 3 – EW ID (reused by name)
+    ew_id, reused = get_or_create_edgeworker_id(
         session=session,
         baseurl=baseurl,
-        name=ew_info["name"],
+        name=ew_info.name,
         groupId=groupId,
-        resourceTierId=ew_info["resourceTierId"],
-        description=ew_info["description"],
+        resourceTierId=ew_info.resourceTierId,
+        description=ew_info.description,
         accountSwitchKey=accountSwitchKey,
         verbose=verbose
     )
     results["edgeWorkerId"] = ew_id
-
-    # STEP 4 – upload version
-    version = upload_edgeworker_version(
-        session=session,
-        baseurl=baseurl,
-        ew_id=ew_id,
-        tgz_file=bundle_path,
-        accountSwitchKey=accountSwitchKey,
-        verbose=verbose
-    )
+    results["reused"] = reused
+
+    # STEP 4 – upload version (a reused ID may already have this one)
+    already_uploaded = False
+    if reused:
+        existing = list_edgeworker_versions(session, baseurl, ew_id, accountSwitchKey)
+        version, stamped = stamp_bundle_version(build_folder, existing)
+        already_uploaded = version in existing
+        if stamped:
+            redirect_report["bundleBytes"] = create_bundle(build_folder, bundle_path, verbose)
+
+    if already_uploaded:
+        log.success("Bundle unchanged — reusing uploaded version %s", version)
+    else:
+        version = upload_edgeworker_version(
+            session=session,
+            baseurl=baseurl,
+            ew_id=ew_id,
+            tgz_file=bundle_path,
+            accountSwitchKey=accountSwitchKey,
+            verbose=verbose
+        )
     results["version"] = version
 
     # STEP 5 – activation (based on CLI activationMode)
     mode = activationMode.lower()
 
     if mode == "saveonly":
-        print("[INFO] EdgeWorker activation skipped (saveonly mode).")
+        log.info("EdgeWorker activation skipped (saveonly mode).")
         results["activation"] = "skipped (saveonly)"
     elif mode in ("staging", "production"):
-        print(f"[INFO] Activating EdgeWorker to {mode.upper()}")
+        log.info("Activating EdgeWorker to %s", mode.upper())
         activation_result = activate_edgeworker(
             session=session,
             baseurl=baseurl,
@@ -282,8 +522,8 @@ def run_edgeworker_workflow(session, baseurl, config, activationMode, accountSwi
         )
         results["activation"] = activation_result
     else:
-        print(f"[WARNING] Unknown activationMode '{activationMode}' — skipping activation.")
+        log.warning("Unknown activationMode '%s' — skipping activation.", activationMode)
         results["activation"] = f"skipped (unknown activationMode '{activationMode}')"
 
-    print("\n=== EDGEWORKER WORKFLOW COMPLETED ===\n")
+    log.info("=== EDGEWORKER WORKFLOW COMPLETED ===")
     return results
@@ -1,32 +1,27 @@
 import time
-import json
 import csv
 import sys
 from datetime import datetime
 from urllib.parse import urljoin
-from helpers import dbg
+import prefetch
+from tracing import traced
+from log import get_logger
+from json_codec import send_json, response_json
 
-
-# ============================================================
-# Pretty Print for Verbose Mode
-# ============================================================
-def pp(session_verbose, label, obj):
-    if session_verbose.get("verbose"):
-        print(f"\n=== {label} ===")
-        print(json.dumps(obj, indent=2))
+log = get_logger("gtm")
 
 
 # ============================================================
 # LOAD DATACENTERS FROM CSV
 # ============================================================
 def load_datacenters_from_csv(csv_path, session_verbose):
-    print("\n>>> ENTER: load_datacenters_from_csv()")
+    log.debug(">>> ENTER: load_datacenters_from_csv()")
 
     datacenters = []
     now = datetime.now()
 
     prefix = f"{now.year % 100:02d}{now.month:02d}"  # YYMM prefix
-    print(f"[INFO] Temporary ID prefix: {prefix}")
+    log.info("Temporary ID prefix: %s", prefix)
 
     seq = 1
 
@@ -49,17 +44,22 @@ def load_datacenters_from_csv(csv_path, session_verbose):
                 "servers": servers
             }
 
-            print(f"[INFO] CSV DC Loaded tmpId={tmp_id}, nickname={dc['nickname']}")
+            log.info("CSV DC Loaded tmpId=%s, nickname=%s", tmp_id, dc["nickname"])
             datacenters.append(dc)
 
-    print("<<< EXIT: load_datacenters_from_csv()")
+    log.debug("<<< EXIT: load_datacenters_from_csv()")
     return datacenters
 
 
 # ============================================================
 # CHECK IF GTM DOMAIN EXISTS
 # ============================================================
+@traced()
 def get_gtm_domain(session, baseurl, domain, accountSwitchKey):
+    prefetched = prefetch.take(prefetch.gtm_domain_key(accountSwitchKey, domain))
+    if prefetched is not prefetch.MISS:
+        return prefetched
+
     params = {}
     if accountSwitchKey:
         params["accountSwitchKey"] = accountSwitchKey
@@ -69,29 +69,27 @@ def get_gtm_domain(session, baseurl, domain, accountSwitchKey):
     resp = session.get(url, params=params)
 
     if resp.status_code == 200:
-        print(f"[INFO] GTM domain already exists: {domain}")
-        return resp.json()
+        log.info("GTM domain already exists: %s", domain)
+        return response_json(resp)
 
-    print(f"[INFO] GTM domain does NOT exist yet: {domain}")
+    log.info("GTM domain does NOT exist yet: %s", domain)
     return None
 
 
 # ============================================================
 # CREATE GTM DOMAIN (Minimal payload)
 # ============================================================
+@traced()
 def create_gtm_domain(session, baseurl, config, accountSwitchKey, verbose):
-    print("\n>>> ENTER: create_gtm_domain()")
+    log.debug(">>> ENTER: create_gtm_domain()")
 
-    domain = config["gtmDomain"]
-    contractId = config["contractId"]
-    groupId = config["groupId"]
-    groupId_clean = groupId.replace("grp_", "")  # GTM requires numeric gid
+    domain = config.gtm.domain
 
     url = f"{baseurl}/config-gtm/v1/domains"
 
     params = {
-        "contractId": contractId,
-        "gid": groupId_clean
+        "contractId": config.contractId,
+        "gid": config.groupIdNumeric        # GTM requires numeric gid
     }
 
     if accountSwitchKey:
@@ -107,63 +105,66 @@ def create_gtm_domain(session, baseurl, config, accountSwitchKey, verbose):
         "name": domain                        # MUST BE INSIDE PAYLOAD
     }
 
-    session_verbose = {"verbose": verbose}
-    pp(session_verbose, "GTM DOMAIN PAYLOAD", payload)
-
     headers = {
         "accept": "application/vnd.config-gtm.v1.6+json",
         "content-type": "application/vnd.config-gtm.v1.6+json"
     }
 
-    print(f"[INFO] Creating GTM Domain: {domain}")
+    log.info("Creating GTM Domain: %s", domain)
 
-    resp = session.post(url, params=params, json=payload, headers=headers)
+    resp = send_json(session, "POST", url, payload, params=params, headers=headers, label="GTM DOMAIN PAYLOAD")
 
-    print("[INFO] Status:", resp.status_code)
-    dbg(session_verbose, f"[DEBUG] Response: {resp.text}")
+    log.info("Status: %s", resp.status_code)
+    log.payload("Response", resp)
 
     if resp.status_code not in (200, 201):
         raise Exception(f"Failed to create GTM domain: {resp.text}")
 
-    print("[SUCCESS] GTM domain created.")
-    print("<<< EXIT: create_gtm_domain()")
+    log.success("GTM domain created.")
+    log.debug("<<< EXIT: create_gtm_domain()")
 
-    return resp.json()
+    return response_json(resp)
 
 
 # ============================================================
 # MANUALLY HANDLE 403 DOMAIN CREATION PERMISSIONS
 # ============================================================
 def handle_domain_forbidden(domain):
-    print("\n⛔  ERROR: Akamai has rejected GTM Domain creation for:")
-    print(f"    ➤ {domain}\n")
-    print("This means your contract/group/accountSwitchKey does NOT have")
-    print("permission to CREATE new GTM domains via API.\n")
-    print("===============================================================")
-    print("   ACTION REQUIRED (Manual Step)")
-    print("===============================================================")
-    print("1. Log into Akamai Control Center:")
-    print("   https://control.akamai.com\n")
-    print("2. Go to:  Traffic Management  →  Domains")
-    print("3. CREATE a new GTM Domain with the name:")
-    print(f"   ➤ {domain}\n")
-    print("4. After saving the domain, rerun this script.\n")
-    print("Automation cannot continue without the GTM domain.")
-    print("Exiting now.\n")
+    log.error(
+        "Akamai has rejected GTM Domain creation for: %s\n"
+        "\n"
+        "This means your contract/group/accountSwitchKey does NOT have\n"
+        "permission to CREATE new GTM domains via API.\n"
+        "\n"
+        "===============================================================\n"
+        "   ACTION REQUIRED (Manual Step)\n"
+        "===============================================================\n"
+        "1. Log into Akamai Control Center:\n"
+        "   https://control.akamai.com\n"
+        "2. Go to:  Traffic Management  →  Domains\n"
+        "3. CREATE a new GTM Domain with the name:\n"
+        "   ➤ %s\n"
+        "4. After saving the domain, rerun this script.\n"
+        "\n"
+        "Automation cannot continue without the GTM domain. Exiting now.",
+        domain, domain
+    )
     sys.exit(1)
 
 
 # ============================================================
-# CREATE GTM DATACENTER
+# LIST GTM DATACENTERS
 # ============================================================
-def create_gtm_datacenter(session, baseurl, domain, dc, contractId, groupId, accountSwitchKey, session_verbose):
-    print("\n>>> ENTER: create_gtm_datacenter()")
-
-    nickname = dc["nickname"]
+@traced()
+def list_gtm_datacenters(session, baseurl, domain, accountSwitchKey):
+    """
+    Datacenters in the domain. The prefetched list is the state before this
+    run, taken once; later calls list again.
+    """
+    prefetched = prefetch.take(prefetch.gtm_datacenters_key(accountSwitchKey, domain))
+    if prefetched is not prefetch.MISS:
+        return prefetched
 
-    # ============================================================
-    # STEP 1 — LIST EXISTING DATACENTERS
-    # ============================================================
     list_url = f"{baseurl}/config-gtm/v1/domains/{domain}/datacenters"
 
     list_params = {}
@@ -178,22 +179,42 @@ def create_gtm_datacenter(session, baseurl, domain, dc, contractId, groupId, acc
     resp = session.get(list_url, params=list_params, headers=list_headers)
     resp.raise_for_status()
 
-    items = resp.json().get("items", [])
+    return response_json(resp).get("items", [])
+
+
+# ============================================================
+# CREATE GTM DATACENTER
+# ============================================================
+@traced()
+def create_gtm_datacenter(session, baseurl, domain, dc, contractId, gid, accountSwitchKey, session_verbose,
+                          existing=None):
+    """
+    existing: the domain's datacenters, listed once by the caller (created
+    ones are appended); None lists them here.
+    """
+    log.debug(">>> ENTER: create_gtm_datacenter()")
+
+    nickname = dc["nickname"]
+
+    # ============================================================
+    # STEP 1 — LIST EXISTING DATACENTERS
+    # ============================================================
+    items = existing if existing is not None else list_gtm_datacenters(session, baseurl, domain, accountSwitchKey)
 
     # Search for existing DC with same nickname
     existing = next((x for x in items if x.get("nickname") == nickname), None)
 
     if existing:
         dc_id = existing["datacenterId"]
-        print(f"\n[INFO] Datacenter '{nickname}' already exists with ID={dc_id}.")
+        log.info("Datacenter '%s' already exists with ID=%s.", nickname, dc_id)
         ans = input(f"Reuse existing datacenter '{nickname}' (ID={dc_id})? (yes/no): ").strip().lower()
 
         if ans not in ("yes", "y"):
-            print("\n[ABORT] User chose not to reuse existing datacenter.")
+            log.error("User chose not to reuse existing datacenter.")
             sys.exit(1)
 
-        print(f"[INFO] Reusing existing datacenter ID={dc_id}")
-        print("<<< EXIT: create_gtm_datacenter()")
+        log.info("Reusing existing datacenter ID=%s", dc_id)
+        log.debug("<<< EXIT: create_gtm_datacenter()")
 
         return {
             "datacenterId": dc_id,
@@ -203,13 +224,13 @@ def create_gtm_datacenter(session, baseurl, domain, dc, contractId, groupId, acc
     # ============================================================
     # STEP 2 — CREATE NEW DATACENTER
     # ============================================================
-    print(f"[INFO] Creating new datacenter '{nickname}'")
+    log.info("Creating new datacenter '%s'", nickname)
 
     create_url = f"{baseurl}/config-gtm/v1/domains/{domain}/datacenters"
 
     create_params = {
         "contractId": contractId,
-        "gid": groupId.replace("grp_", "")
+        "gid": gid
     }
     if accountSwitchKey:
         create_params["accountSwitchKey"] = accountSwitchKey
@@ -223,24 +244,23 @@ def create_gtm_datacenter(session, baseurl, domain, dc, contractId, groupId, acc
         "nickname": nickname
     }
 
-    pp(session_verbose, "POST Datacenter Payload", payload)
-
     create_headers = {
         "Content-Type": "application/json",
         "accept": "application/vnd.config-gtm.v1.7+json"
     }
 
-    create_resp = session.post(create_url, params=create_params, json=payload, headers=create_headers)
+    create_resp = send_json(session, "POST", create_url, payload, params=create_params, headers=create_headers,
+                            label="POST Datacenter Payload")
 
-    print("[INFO] Status:", create_resp.status_code)
-    dbg(session_verbose, f"[DEBUG] Response: {create_resp.text}")
+    log.info("Status: %s", create_resp.status_code)
+    log.payload("Response", create_resp)
 
     create_resp.raise_for_status()
 
-    new_id = create_resp.json()["resource"]["datacenterId"]
+    new_id = response_json(create_resp)["resource"]["datacenterId"]
 
-    print(f"[SUCCESS] New datacenter created: ID={new_id}")
-    print("<<< EXIT: create_gtm_datacenter()")
+    log.success("New datacenter created: ID=%s", new_id)
+    log.debug("<<< EXIT: create_gtm_datacenter()")
 
     return {
         "datacenterId": new_id,
@@ -251,8 +271,9 @@ def create_gtm_datacenter(session, baseurl, domain, dc, contractId, groupId, acc
 # ============================================================
 # WAIT FOR PROPAGATION
 # ============================================================
+@traced(kind="wait")
 def wait_for_gtm_propagation(session, baseurl, domain, accountSwitchKey):
-    print("\n>>> ENTER: wait_for_gtm_propagation()")
+    log.debug(">>> ENTER: wait_for_gtm_propagation()")
 
     params = {}
     if accountSwitchKey:
@@ -262,29 +283,29 @@ def wait_for_gtm_propagation(session, baseurl, domain, accountSwitchKey):
 
     for attempt in range(20):
         resp = session.get(url, params=params)
-        status = resp.json().get("propagationStatus")
+        status = response_json(resp).get("propagationStatus")
 
-        print(f"[STATUS] Propagation: {status}")
+        log.info("Propagation: %s", status)
 
         if status == "COMPLETE":
-            print("[SUCCESS] GTM propagation complete.")
+            log.success("GTM propagation complete.")
             return True
 
         time.sleep(5)
 
-    print("[TIMEOUT] Propagation did not complete; continuing anyway.")
+    log.warning("Propagation did not complete; continuing anyway.")
     return False
 
 
 # ============================================================
 # CREATE GTM PROPERTY
 # ============================================================
-def create_gtm_property(session, baseurl, domain, config, datacenters, contractId, groupId, accountSwitchKey, session_verbose):
-    print("\n>>> ENTER: create_gtm_property()")
+@traced()
+def create_gtm_property(session, baseurl, domain, config, datacenters, accountSwitchKey, session_verbose):
+    log.debug(">>> ENTER: create_gtm_property()")
 
-    groupId_clean = groupId.replace("grp_", "")
-
-    liveness_host = config["livenessHostHeader"]
+    gtm = config.gtm
+    liveness_host = gtm.livenessHostHeader
     weight_each = int(100 / len(datacenters))
 
     payload = {
@@ -297,7 +318,7 @@ def create_gtm_property(session, baseurl, domain, config, datacenters, contractI
             {
                 "hostHeader": liveness_host,
                 "name": "Liveness",
-                "testObject": config["livenessTestObject"],
+                "testObject": gtm.livenessTestObject,
                 "testObjectPort": 443,
                 "testObjectProtocol": "HTTPS",
                 "testInterval": 60,
@@ -317,53 +338,53 @@ def create_gtm_property(session, baseurl, domain, config, datacenters, contractI
             for dc in datacenters
         ],
 
-        "type": config.get("propertyType", "performance"),
-        "name": config["gtmPropertyName"],
+        "type": gtm.propertyType,
+        "name": gtm.propertyName,
         "handoutLimit": 1
     }
 
-    pp(session_verbose, "PROPERTY PAYLOAD", payload)
-
     params = {
-        "contractId": contractId,
-        "gid": groupId_clean
+        "contractId": config.contractId,
+        "gid": config.groupIdNumeric
     }
 
     if accountSwitchKey:
         params["accountSwitchKey"] = accountSwitchKey
 
-    url = f"{baseurl}/config-gtm/v1/domains/{domain}/properties/{config['gtmPropertyName']}"
+    url = f"{baseurl}/config-gtm/v1/domains/{domain}/properties/{gtm.propertyName}"
 
     headers = {
         "accept": "application/vnd.config-gtm.v1.7+json",
         "content-type": "application/vnd.config-gtm.v1.6+json"
     }
 
-    print("[INFO] Sending GTM Property PUT...")
+    log.info("Sending GTM Property PUT...")
 
-    resp = session.put(url, params=params, json=payload, headers=headers)
+    resp = send_json(session, "PUT", url, payload, params=params, headers=headers, label="PROPERTY PAYLOAD")
 
-    print("[INFO] Status:", resp.status_code)
-    dbg(session_verbose, f"[DEBUG] Response: {resp.text}")
+    log.info("Status: %s", resp.status_code)
+    log.payload("Response", resp)
 
     resp.raise_for_status()
 
-    print("<<< EXIT: create_gtm_property()")
+    log.debug("<<< EXIT: create_gtm_property()")
 
-    return resp.json()
+    return response_json(resp)
 
 
 # ============================================================
 # MAIN WORKFLOW
 # ============================================================
+@traced()
 def run_gtm_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose):
-    print("\n>>> ENTER: run_gtm_workflow()")
+    log.debug(">>> ENTER: run_gtm_workflow()")
 
     session_verbose = {"verbose": verbose}
 
-    domain = config["gtmDomain"]
-    contractId = config["contractId"]
-    groupId = config["groupId"]
+    if config.gtm is None:
+        raise Exception("requirements.json has no GTM settings (gtmDomain, gtmPropertyName, …)")
+
+    domain = config.gtm.domain
 
     # ============================================================
     # Step 0 — Check/Create GTM Domain
@@ -371,7 +392,7 @@ def run_gtm_workflow(session, baseurl, config, activationMode, accountSwitchKey,
     domain_details = get_gtm_domain(session, baseurl, domain, accountSwitchKey)
 
     if not domain_details:
-        print(f"[INFO] Domain '{domain}' does not exist — attempting create...")
+        log.info("Domain '%s' does not exist — attempting create...", domain)
 
         try:
             domain_details = create_gtm_domain(
@@ -382,25 +403,28 @@ def run_gtm_workflow(session, baseurl, config, activationMode, accountSwitchKey,
             if "contractAccessProblem" in str(e):
                 handle_domain_forbidden(domain)
             else:
-                print(f"[ERROR] Unexpected GTM domain creation error: {e}")
+                log.error("Unexpected GTM domain creation error: %s", e)
                 sys.exit(1)
 
     # ============================================================
     # Step 1 — Load CSV Datacenters
     # ============================================================
-    csv_dcs = load_datacenters_from_csv(config["datacenterDetails"], session_verbose)
+    csv_dcs = load_datacenters_from_csv(config.gtm.datacenterDetails, session_verbose)
 
     # ============================================================
     # Step 2 — Create DCs
     # ============================================================
+    existing_dcs = list_gtm_datacenters(session, baseurl, domain, accountSwitchKey)
+
     created_dcs = []
     for dc in csv_dcs:
         created = create_gtm_datacenter(
             session, baseurl, domain, dc,
-            contractId, groupId, accountSwitchKey,
-            session_verbose
+            config.contractId, config.groupIdNumeric, accountSwitchKey,
+            session_verbose, existing_dcs
         )
         created_dcs.append(created)
+        existing_dcs.append({"nickname": dc["nickname"], "datacenterId": created["datacenterId"]})
 
     # ============================================================
     # Step 3 — Wait for propagation
@@ -412,11 +436,11 @@ def run_gtm_workflow(session, baseurl, config, activationMode, accountSwitchKey,
     # ============================================================
     gtm_result = create_gtm_property(
         session, baseurl, domain, config,
-        created_dcs, contractId, groupId, accountSwitchKey,
+        created_dcs, accountSwitchKey,
         session_verbose
     )
 
-    print("<<< EXIT: run_gtm_workflow()")
+    log.debug("<<< EXIT: run_gtm_workflow()")
 
     return {
         "domain": domain_details,
@@ -1,14 +1,84 @@
-import json
-import requests
+import re
 import sys
-from helpers import dbg
+import caches
+from helpers import thaw, list_properties, DEFAULT_SUBREQUEST_TIMEOUT_MS
+from property_hostnames import sync_property_hostnames, internal_desired_hostnames
+from tracing import traced
+from log import get_logger
+from json_codec import send_json, response_json
+
+log = get_logger("pm")
+
+
+# ===================================================================
+#  CP CODE LISTING (once per run, see caches.listings)
+# ===================================================================
+def cpcodes_listing_key(section, contractId, groupId, accountSwitchKey):
+    return ("cpcodes", section, accountSwitchKey, contractId, groupId)
+
+
+@traced()
+def list_cpcodes(session, baseurl, contractId, groupId, accountSwitchKey):
+    """cpcodeName -> [item] for the contract/group."""
+
+    def fetch():
+        url = f"{baseurl}/papi/v1/cpcodes"
+
+        params = {
+            "contractId": contractId,
+            "groupId": groupId,
+            "PAPI-Use-Prefixes": "true"
+        }
+        if accountSwitchKey:
+            params["accountSwitchKey"] = accountSwitchKey
+
+        log.debug("GET %s", url)
+        resp = session.get(url, params=params, headers={"Accept": "application/json"})
+
+        if resp.status_code != 200:
+            raise Exception(f"CP Code listing failed: {resp.text}")
+
+        items = response_json(resp).get("cpcodes", {}).get("items", [])
+        return caches.index_by_name(items, "cpcodeName")
+
+    return caches.cached_listing(
+        cpcodes_listing_key(caches.session_section(session), contractId, groupId, accountSwitchKey), fetch
+    )
+
+
+# ===================================================================
+#  CP CODE: REUSE BY NAME, ELSE CREATE
+# ===================================================================
+@traced()
+def get_or_create_cpcode(session, baseurl, cpcode_name, contractId, groupId, productId,
+                         accountSwitchKey, verbose):
+    """Reuses a CP code of the same name that is enabled for productId."""
+    index = list_cpcodes(session, baseurl, contractId, groupId, accountSwitchKey)
+
+    for item in index.get(cpcode_name, []):
+        if productId in item.get("productIds", []):
+            log.success("Reusing CP Code %s (%s)", item["cpcodeId"], cpcode_name)
+            return item["cpcodeId"], cpcode_name, True
+
+    if cpcode_name in index:
+        log.warning("CP Code '%s' exists but not for %s — creating a new one.", cpcode_name, productId)
+
+    cpcodeId, cpcode_name = create_cpcode(
+        session, baseurl, cpcode_name, contractId, groupId, accountSwitchKey, verbose, productId
+    )
+    index.setdefault(cpcode_name, []).append({
+        "cpcodeId": cpcodeId, "cpcodeName": cpcode_name, "productIds": [productId]
+    })
+    return cpcodeId, cpcode_name, False
 
 
 # ===================================================================
 #  CP CODE CREATION
 # ===================================================================
-def create_cpcode(session, baseurl, cpcode_name, contractId, groupId, accountSwitchKey, verbose):
-    dbg(verbose, f"ENTER create_cpcode(cpcode={cpcode_name})")
+@traced()
+def create_cpcode(session, baseurl, cpcode_name, contractId, groupId, accountSwitchKey, verbose,
+                  productId="prd_SPM"):
+    log.debug("ENTER create_cpcode(cpcode=%s)", cpcode_name)
 
     url = f"{baseurl}/papi/v1/cpcodes"
 
@@ -22,32 +92,30 @@ def create_cpcode(session, baseurl, cpcode_name, contractId, groupId, accountSwi
 
     payload = {
         "cpcodeName": cpcode_name,
-        "productId": "prd_SPM"
+        "productId": productId
     }
 
-    dbg(verbose, f"POST {url}")
-    dbg(verbose, f"Payload: {payload}")
-
-    resp = session.post(url, params=params, json=payload)
+    log.debug("POST %s", url)
+    resp = send_json(session, "POST", url, payload, params=params, label="Payload")
 
     if resp.status_code != 201:
         raise Exception(f"CP Code creation failed: {resp.text}")
 
-    link = resp.json().get("cpcodeLink")
+    link = response_json(resp).get("cpcodeLink")
     cpcodeId = link.split("/cpcodes/")[1].split("?")[0]
 
-    print(f"[SUCCESS] Created CP Code {cpcodeId}")
+    log.success("Created CP Code %s", cpcodeId)
     return cpcodeId, cpcode_name
 
 
 
 # ===================================================================
-#  CREATE PROPERTY
+#  PROPERTY: REUSE BY NAME, ELSE CREATE
 # ===================================================================
-def create_property(session, baseurl, propertyName, contractId, groupId, accountSwitchKey, verbose):
-    dbg(verbose, f"ENTER create_property({propertyName})")
-
-    url = f"{baseurl}/papi/v1/properties"
+@traced()
+def get_latest_version_details(session, baseurl, propertyId, contractId, groupId, accountSwitchKey):
+    """Latest version item: propertyVersion, productId, stagingStatus, productionStatus."""
+    url = f"{baseurl}/papi/v1/properties/{propertyId}/versions/latest"
 
     params = {
         "contractId": contractId,
@@ -57,67 +125,130 @@ def create_property(session, baseurl, propertyName, contractId, groupId, account
     if accountSwitchKey:
         params["accountSwitchKey"] = accountSwitchKey
 
-    payload = {
-        "productId": "prd_SPM",
-        "propertyName": propertyName,
-        "ruleFormat": "latest"
+    resp = session.get(url, params=params, headers={"Accept": "application/json"})
+
+    if resp.status_code != 200:
+        raise Exception(f"Failed to fetch latest version of {propertyId}: {resp.text}")
+
+    items = response_json(resp).get("versions", {}).get("items", [])
+    if not items:
+        raise Exception(f"Property {propertyId} has no versions")
+    return items[0]
+
+
+@traced()
+def create_property_version(session, baseurl, propertyId, fromVersion, etag,
+                            contractId, groupId, accountSwitchKey):
+    url = f"{baseurl}/papi/v1/properties/{propertyId}/versions"
+
+    params = {
+        "contractId": contractId,
+        "groupId": groupId,
+        "PAPI-Use-Prefixes": "true"
     }
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+
+    payload = {"createFromVersion": int(fromVersion)}
+    if etag:
+        payload["createFromVersionEtag"] = etag
 
-    resp = session.post(url, params=params, json=payload)
+    resp = send_json(session, "POST", url, payload, params=params)
 
     if resp.status_code not in (200, 201):
-        raise Exception(f"Property creation failed: {resp.text}")
+        raise Exception(f"Version creation failed: {resp.text}")
 
-    propertyId = resp.json()["propertyLink"].split("/properties/")[1].split("?")[0]
+    link = response_json(resp)["versionLink"]
+    return int(link.split("/versions/")[1].split("?")[0])
 
-    print(f"[SUCCESS] Created PM property {propertyId}")
-    return propertyId, 1
 
+@traced()
+def get_or_create_property(session, baseurl, propertyName, contractId, groupId, productId, ruleFormat,
+                           accountSwitchKey, verbose):
+    """
+    Reuses a property of the same name in the contract/group. Returns
+    (propertyId, editable version, reused): the latest version when it was
+    never activated, else a new version created from it.
+    """
+    index = list_properties(session, baseurl, contractId, groupId, accountSwitchKey)
+    matches = index.get(propertyName)
+
+    if not matches:
+        propertyId, version = create_property(
+            session, baseurl, propertyName, contractId, groupId, accountSwitchKey, verbose,
+            productId, ruleFormat
+        )
+        index.setdefault(propertyName, []).append({
+            "propertyId": propertyId, "propertyName": propertyName, "latestVersion": version
+        })
+        return propertyId, version, False
+
+    propertyId = matches[0]["propertyId"]
+    latest = get_latest_version_details(session, baseurl, propertyId, contractId, groupId, accountSwitchKey)
+
+    if latest.get("productId") and latest["productId"] != productId:
+        raise Exception(
+            f"Property '{propertyName}' ({propertyId}) exists with product {latest['productId']}, "
+            f"not {productId}; rename propertyManager.internalHarperHostname.internalPmConfigName"
+        )
+
+    version = int(latest["propertyVersion"])
+    active = "ACTIVE" in (latest.get("stagingStatus"), latest.get("productionStatus"))
+    if active or latest.get("stagingStatus") == "PENDING" or latest.get("productionStatus") == "PENDING":
+        version = create_property_version(
+            session, baseurl, propertyId, version, latest.get("etag"), contractId, groupId, accountSwitchKey
+        )
+        log.success("Reusing PM property %s → new version %s", propertyId, version)
+    else:
+        log.success("Reusing PM property %s, editing version %s", propertyId, version)
+
+    return propertyId, version, True
 
 
 # ===================================================================
-#  ADD INTERNAL HOSTNAME
+#  CREATE PROPERTY
 # ===================================================================
-def add_internal_hostname(session, baseurl, propertyId, version,
-                          cname_from, edge_hostname,
-                          contractId, groupId, accountSwitchKey, verbose):
+@traced()
+def create_property(session, baseurl, propertyName, contractId, groupId, accountSwitchKey, verbose,
+                    productId="prd_SPM", ruleFormat="latest"):
+    log.debug("ENTER create_property(%s)", propertyName)
 
-    dbg(verbose, f"ENTER add_internal_hostname({cname_from})")
-
-    url = f"{baseurl}/papi/v1/properties/{propertyId}/versions/{version}/hostnames"
+    url = f"{baseurl}/papi/v1/properties"
 
     params = {
         "contractId": contractId,
         "groupId": groupId,
-        "validateHostnames": "true",
         "PAPI-Use-Prefixes": "true"
     }
     if accountSwitchKey:
         params["accountSwitchKey"] = accountSwitchKey
 
-    payload = [{
-        "certProvisioningType": "DEFAULT",
-        "cnameFrom": cname_from,
-        "cnameTo": edge_hostname,
-        "cnameType": "EDGE_HOSTNAME"
-    }]
+    payload = {
+        "productId": productId,
+        "propertyName": propertyName,
+        "ruleFormat": ruleFormat
+    }
 
-    resp = session.put(url, params=params, json=payload)
+    resp = send_json(session, "POST", url, payload, params=params)
 
     if resp.status_code not in (200, 201):
-        raise Exception(f"Failed adding hostname: {resp.text}")
+        raise Exception(f"Property creation failed: {resp.text}")
 
-    print("[SUCCESS] Internal hostname added.")
+    propertyId = response_json(resp)["propertyLink"].split("/properties/")[1].split("?")[0]
+
+    log.success("Created PM property %s", propertyId)
+    return propertyId, 1
 
 
 
 # ===================================================================
 #  DOWNLOAD RULE TREE
 # ===================================================================
+@traced()
 def get_rule_tree(session, baseurl, propertyId, version,
                   contractId, groupId, accountSwitchKey, verbose):
 
-    dbg(verbose, "ENTER get_rule_tree()")
+    log.debug("ENTER get_rule_tree()")
 
     url = f"{baseurl}/papi/v1/properties/{propertyId}/versions/{version}/rules"
 
@@ -134,7 +265,7 @@ def get_rule_tree(session, baseurl, propertyId, version,
     if resp.status_code != 200:
         raise Exception(f"Failed to fetch rule tree: {resp.text}")
 
-    data = resp.json()
+    data = response_json(resp)
     return data["rules"], data["etag"]
 
 
@@ -143,7 +274,7 @@ def get_rule_tree(session, baseurl, propertyId, version,
 #  UPDATE ORIGIN
 # ===================================================================
 def update_origin_behavior1(rules, origin_hostname, custom_forward_header, verbose):
-    dbg(verbose, "ENTER update_origin_behavior()")
+    log.debug("ENTER update_origin_behavior()")
 
     for b in rules.get("behaviors", []):
         if b["name"] == "origin":
@@ -151,10 +282,11 @@ def update_origin_behavior1(rules, origin_hostname, custom_forward_header, verbo
             b["options"]["forwardHostHeader"] = "CUSTOM"
             b["options"]["customForwardHostHeader"] = custom_forward_header
 
-    print("[SUCCESS] Updated origin behavior.")
+    log.success("Updated origin behavior.")
 
+@traced()
 def update_origin_behavior(rules, origin_hostname, custom_forward_header, verbose):
-    dbg(verbose, "ENTER update_origin_behavior()")
+    log.debug("ENTER update_origin_behavior()")
 
     for b in rules.get("behaviors", []):
         if b["name"] == "origin":
@@ -204,42 +336,374 @@ def update_origin_behavior(rules, origin_hostname, custom_forward_header, verbos
                 if bad_field in opts:
                     del opts[bad_field]
 
-    print("[SUCCESS] Updated origin behavior.")
+    log.success("Updated origin behavior.")
+
+
+
+# ===================================================================
+#  ORIGIN PERFORMANCE PROFILES
+# ===================================================================
+# The edge keeps waiting on Harper after the EdgeWorker has given up, so origin
+# timeouts far beyond the budget only hold connections for answers nobody
+# reads. PAPI timeouts have 1s granularity, hence the floor and the cap
+# rounded up to whole seconds (150ms budget -> 2s).
+ORIGIN_TIMEOUT_BUDGET_MULTIPLIER = 10
+MIN_ORIGIN_TIMEOUT_MS = 1000
+
+ORIGIN_PERFORMANCE_PROFILES = {
+    "low-latency": {
+        "connectTimeout": "1s",
+        "readTimeout": "1s",
+        "firstByteTimeout": "1s",
+        "persistentConnections": True,
+        "persistentConnectionTimeout": "5m",
+        "sureRoute": True,
+        "originRttMs": 20
+    },
+    "balanced": {
+        "connectTimeout": "1s",
+        "readTimeout": "2s",
+        "firstByteTimeout": "2s",
+        "persistentConnections": True,
+        "persistentConnectionTimeout": "5m",
+        "sureRoute": True,
+        "originRttMs": 40
+    }
+}
+
+
+def duration_to_ms(value):
+    """Converts a PAPI duration such as "500ms", "5s" or "2m" to milliseconds."""
+    match = re.fullmatch(r"\s*(\d+)\s*(ms|s|m|h)\s*", str(value))
+    if not match:
+        raise Exception(f"Invalid duration '{value}' (expected e.g. 1s, 500ms, 5m)")
+
+    amount, unit = int(match.group(1)), match.group(2)
+    return amount * {"ms": 1, "s": 1000, "m": 60000, "h": 3600000}[unit]
+
+
+def resolve_origin_profile(profile_cfg):
+    """
+    internalHarperHostname.originProfile may be a profile name, or a dict with
+    an optional "name" base profile plus per-field overrides.
+    Returns (name, profile) or (None, None) when no profile is configured.
+    """
+    if not profile_cfg:
+        return None, None
+
+    # a retuned built-in that no default run could use fails every config that picks a profile
+    check_builtin_origin_profiles()
+
+    if isinstance(profile_cfg, str):
+        profile_cfg = {"name": profile_cfg}
+
+    name = profile_cfg.get("name", "low-latency")
+
+    if name not in ORIGIN_PERFORMANCE_PROFILES:
+        raise Exception(
+            f"Unknown origin profile '{name}'. "
+            f"Choose one of: {', '.join(sorted(ORIGIN_PERFORMANCE_PROFILES))}"
+        )
+
+    profile = dict(ORIGIN_PERFORMANCE_PROFILES[name])
+    profile.update({k: v for k, v in profile_cfg.items() if k != "name"})
+    return name, profile
+
+
+def origin_timeout_cap_ms(budget_ms):
+    """Longest origin timeout for the budget, in whole seconds (PAPI granularity)."""
+    cap_ms = max(MIN_ORIGIN_TIMEOUT_MS, budget_ms * ORIGIN_TIMEOUT_BUDGET_MULTIPLIER)
+    return -(-cap_ms // 1000) * 1000
+
+
+def validate_origin_profile(profile, budget_ms):
+    """
+    Checks that an origin profile is consistent with the EdgeWorker budget.
+    Raises on hard inconsistencies, returns a list of warning strings.
+    """
+    warnings = []
+
+    connect_ms = duration_to_ms(profile["connectTimeout"])
+    read_ms = duration_to_ms(profile["readTimeout"])
+    first_byte_ms = duration_to_ms(profile["firstByteTimeout"])
+
+    cap_ms = origin_timeout_cap_ms(budget_ms)
+
+    for label, value_ms in (("connectTimeout", connect_ms),
+                            ("readTimeout", read_ms),
+                            ("firstByteTimeout", first_byte_ms)):
+        if value_ms < MIN_ORIGIN_TIMEOUT_MS:
+            raise Exception(f"{label}={value_ms}ms is below the PAPI minimum of {MIN_ORIGIN_TIMEOUT_MS}ms")
+        if value_ms > cap_ms:
+            raise Exception(
+                f"{label}={value_ms}ms is inconsistent with the {budget_ms}ms EdgeWorker budget "
+                f"(max {cap_ms}ms)"
+            )
+
+    if first_byte_ms > read_ms:
+        raise Exception("firstByteTimeout must not exceed readTimeout")
+
+    # A cold TCP + TLS 1.3 handshake costs ~2 RTTs before the request is sent
+    handshake_ms = 2 * int(profile.get("originRttMs", 0))
+
+    if not profile.get("persistentConnections", True):
+        if handshake_ms >= budget_ms:
+            raise Exception(
+                f"persistentConnections disabled: a cold handshake (~{handshake_ms}ms) "
+                f"does not fit in the {budget_ms}ms EdgeWorker budget"
+            )
+        warnings.append(
+            f"persistentConnections disabled: every subrequest pays ~{handshake_ms}ms of handshake"
+        )
+    elif handshake_ms >= budget_ms:
+        warnings.append(
+            f"a cold handshake (~{handshake_ms}ms) exceeds the {budget_ms}ms budget; "
+            f"only reused connections will answer in time"
+        )
+
+    return warnings
+
+
+def check_builtin_origin_profiles(budget_ms=DEFAULT_SUBREQUEST_TIMEOUT_MS):
+    """Every built-in profile must validate against the default EdgeWorker budget."""
+    for name, profile in ORIGIN_PERFORMANCE_PROFILES.items():
+        try:
+            validate_origin_profile(profile, budget_ms)
+        except Exception as e:
+            raise Exception(f"Built-in origin profile '{name}' does not fit the {budget_ms}ms budget: {e}")
+
+
+def set_behavior_options(rule, name, options):
+    """Updates the first behavior called `name` on `rule`, or appends it."""
+    behaviors = rule.setdefault("behaviors", [])
+
+    for b in behaviors:
+        if b.get("name") == name:
+            b.setdefault("options", {}).update(options)
+            return b
+
+    behavior = {"name": name, "options": dict(options)}
+    behaviors.append(behavior)
+    return behavior
+
+
+def find_rule(rules, rule_name):
+    """Depth-first search for a child rule by name."""
+    for child in rules.get("children", []):
+        if child.get("name") == rule_name:
+            return child
+        found = find_rule(child, rule_name)
+        if found is not None:
+            return found
+    return None
+
+
+@traced()
+def apply_origin_performance_profile(rules, profile, custom_forward_header, verbose):
+    """
+    Sets connect/read timeouts, persistent connections and SureRoute on the
+    internal property. Behaviors go where the template keeps them
+    ("Origin connectivity", "Enable SureRoute"), or on the default rule when
+    those children are missing.
+    """
+    log.debug("ENTER apply_origin_performance_profile()")
+
+    connectivity = find_rule(rules, "Origin connectivity") or rules
+
+    set_behavior_options(connectivity, "timeout", {"value": profile["connectTimeout"]})
+    set_behavior_options(connectivity, "readTimeout", {
+        "value": profile["readTimeout"],
+        "firstByteTimeout": profile["firstByteTimeout"]
+    })
+    set_behavior_options(connectivity, "persistentConnection", {
+        "enabled": bool(profile["persistentConnections"]),
+        "timeout": profile["persistentConnectionTimeout"]
+    })
+
+    sureroute_rule = find_rule(rules, "Enable SureRoute") or connectivity
+
+    if profile.get("sureRoute"):
+        set_behavior_options(sureroute_rule, "sureRoute", {
+            "enabled": True,
+            "type": "PERFORMANCE",
+            "testObjectUrl": profile.get("sureRouteTestObject", "/status"),
+            "toHostStatus": "OTHER",
+            "toHost": custom_forward_header,
+            "raceStatTtl": "30m",
+            "forceSslForward": False,
+            "enableCustomKey": False,
+            "srDownloadLinkTitle": ""
+        })
+    else:
+        set_behavior_options(sureroute_rule, "sureRoute", {"enabled": False})
+
+    log.success("Applied origin performance profile.")
 
 
 
 # ===================================================================
 #  REMOVE CHILDREN UNDER “Offload origin”
 # ===================================================================
+@traced()
 def remove_offload_origin_children(rules, verbose):
-    dbg(verbose, "ENTER remove_offload_origin_children()")
+    log.debug("ENTER remove_offload_origin_children()")
 
     for child in rules.get("children", []):
         if child["name"] == "Offload origin":
             child["children"] = []
 
-    print("[SUCCESS] Removed Offload origin children.")
+    log.success("Removed Offload origin children.")
 
 
 
 # ===================================================================
 # REMOVE enhancedDebug
 # ===================================================================
+@traced()
 def remove_enhanced_debug(rules, verbose):
-    dbg(verbose, "ENTER remove_enhanced_debug()")
+    log.debug("ENTER remove_enhanced_debug()")
 
     rules["behaviors"] = [b for b in rules.get("behaviors", [])
                           if b.get("name") != "enhancedDebug"]
 
-    print("[SUCCESS] Removed enhancedDebug.")
+    log.success("Removed enhancedDebug.")
+
+
+
+# ===================================================================
+# HARPER RESPONSE CACHING (optional profile)
+# ===================================================================
+DEFAULT_HARPER_CACHING_PROFILE = {
+    "ttl": "30s",
+    "cachePath": "/handler",
+    "cacheKeyHeaders": ["Path"],
+    "cacheKeyQueryParams": ["isSafari", "v"],
+    "serveStaleTtl": "10s",
+    "prefreshPercent": 90
+}
+
+def build_harper_caching_rule(profile):
+    """
+    Builds the child rule that lets the internal property cache Harper
+    /handler decisions. The cache key is the Path header (the customer URL
+    the EdgeWorker asks about) plus the isSafari and v query parameters.
+    """
+    return {
+        "name": "Harper decision caching",
+        "children": [],
+        "behaviors": [
+            {
+                "name": "caching",
+                "options": {
+                    "behavior": "MAX_AGE",
+                    "mustRevalidate": False,
+                    "ttl": profile["ttl"]
+                }
+            },
+            {
+                "name": "cacheKeyQueryParams",
+                "options": {
+                    "behavior": "INCLUDE",
+                    "exactMatch": True,
+                    "parameters": list(profile["cacheKeyQueryParams"])
+                }
+            },
+            {
+                "name": "cacheId",
+                "options": {
+                    "rule": "INCLUDE_HEADERS",
+                    "includeValue": True,
+                    "optional": True,
+                    "elements": list(profile["cacheKeyHeaders"])
+                }
+            },
+            {
+                "name": "cacheError",
+                "options": {
+                    "enabled": True,
+                    "preserveStale": True,
+                    "ttl": profile["serveStaleTtl"]
+                }
+            },
+            {
+                "name": "prefreshCache",
+                "options": {
+                    "enabled": True,
+                    "prefreshval": int(profile["prefreshPercent"])
+                }
+            }
+        ],
+        "criteria": [
+            {
+                "name": "path",
+                "options": {
+                    "matchOperator": "MATCHES_ONE_OF",
+                    "matchCaseSensitive": False,
+                    "normalize": False,
+                    "values": [profile["cachePath"]]
+                }
+            }
+        ],
+        "criteriaMustSatisfy": "all",
+        "comments": "Caches Harper redirect / early hints decisions for the EdgeWorker subrequest."
+    }
+
+
+def resolve_caching_profile(caching_cfg):
+    """
+    internalHarperHostname.cachingProfile → effective profile (missing keys
+    fall back to DEFAULT_HARPER_CACHING_PROFILE), or None when caching is
+    not enabled.
+    """
+    if not caching_cfg:
+        return None
+    if not isinstance(caching_cfg, dict):
+        raise Exception(f"cachingProfile must be an object, got {caching_cfg!r}")
+    if not caching_cfg.get("enabled", True):
+        return None
+
+    profile = dict(DEFAULT_HARPER_CACHING_PROFILE)
+    profile.update({k: v for k, v in caching_cfg.items() if k != "enabled"})
+    return profile
+
+
+@traced()
+def apply_harper_caching_profile(rules, profile, verbose):
+    """
+    Adds the Harper caching rule under "Offload origin" (which was emptied by
+    remove_offload_origin_children). profile is the effective profile from
+    resolve_caching_profile(); None leaves the property uncached.
+    Returns the profile.
+    """
+    log.debug("ENTER apply_harper_caching_profile()")
+
+    if not profile:
+        log.info("Harper caching profile not enabled — internal property stays uncached.")
+        return None
+
+    caching_rule = build_harper_caching_rule(profile)
+
+    children = rules.setdefault("children", [])
+    offload = next((c for c in children if c.get("name") == "Offload origin"), None)
+
+    if offload is not None:
+        offload.setdefault("children", []).append(caching_rule)
+    else:
+        # a reused property may already carry the rule from an earlier run
+        children[:] = [c for c in children if c.get("name") != caching_rule["name"]]
+        children.append(caching_rule)
+
+    log.success("Applied Harper caching profile (ttl=%s).", profile["ttl"])
+    return profile
 
 
 
 # ===================================================================
 # UPDATE CP CODE
 # ===================================================================
+@traced()
 def update_cpcode_in_traffic_reporting(rules, cpcodeId, cpcodeName, verbose):
-    dbg(verbose, "ENTER update_cpcode_in_traffic_reporting()")
+    log.debug("ENTER update_cpcode_in_traffic_reporting()")
 
     for parent in rules.get("children", []):
         if parent["name"] == "Augment insights":
@@ -256,19 +720,20 @@ def update_cpcode_in_traffic_reporting(rules, cpcodeId, cpcodeName, verbose):
                         }
                     }]
 
-    print("[SUCCESS] Updated CP Code.")
+    log.success("Updated CP Code.")
 
 
 
 # ===================================================================
 # UPLOAD RULE TREE
 # ===================================================================
+@traced()
 def upload_rules(session, baseurl, propertyId,
-                 contractId, groupId, rules, accountSwitchKey, verbose):
+                 contractId, groupId, rules, accountSwitchKey, verbose, version=1):
 
-    dbg(verbose, "ENTER upload_rules()")
+    log.debug("ENTER upload_rules()")
 
-    url = f"{baseurl}/papi/v1/properties/{propertyId}/versions/1/rules"
+    url = f"{baseurl}/papi/v1/properties/{propertyId}/versions/{version}/rules"
 
     params = {
         "contractId": contractId,
@@ -281,23 +746,24 @@ def upload_rules(session, baseurl, propertyId,
 
     payload = {"rules": rules}
 
-    resp = session.put(url, params=params, json=payload)
+    resp = send_json(session, "PUT", url, payload, params=params, compress=True)
 
     if resp.status_code not in (200, 201):
         raise Exception(f"Rule upload failed: {resp.text}")
 
-    print("[SUCCESS] Uploaded rule tree.")
-    return 1
+    log.success("Uploaded rule tree.")
+    return version
 
 
 
 # ===================================================================
 # ACTIVATE PROPERTY VERSION
 # ===================================================================
+@traced()
 def activate_property_version(session, baseurl, propertyId, version,
                               contractId, groupId, network, emails, accountSwitchKey, verbose):
 
-    dbg(verbose, f"ENTER activate_property_version({network})")
+    log.debug("ENTER activate_property_version(%s)", network)
 
     url = f"{baseurl}/papi/v1/properties/{propertyId}/activations"
 
@@ -317,61 +783,71 @@ def activate_property_version(session, baseurl, propertyId, version,
         "acknowledgeWarnings": []
     }
 
-    resp = session.post(url, params=params, json=payload)
+    resp = send_json(session, "POST", url, payload, params=params)
 
     if resp.status_code not in (200, 201):
         raise Exception(f"Activation failed: {resp.text}")
 
-    print(f"[SUCCESS] Activation submitted for {network}.")
+    log.success("Activation submitted for %s.", network)
+    return response_json(resp)
 
 
 
 # ===================================================================
 # MASTER WORKFLOW
 # ===================================================================
+@traced()
 def run_pm_workflow(session, baseurl, config, activationMode, accountSwitchKey, verbose):
-    print("\n>>> ENTER: run_pm_workflow()")
+    log.debug(">>> ENTER: run_pm_workflow()")
 
     try:
-        pm_cfg = config["propertyManager"]
-        cfg = pm_cfg["internalHarperHostname"]
+        cfg = config.propertyManager.internal
+
+        contractId = config.contractId
+        groupId = config.groupId
+
+        internal_pm_name = cfg.internalPmConfigName
+        internal_hostname = cfg.internalHostname
+        origin_hostname = cfg.originHostname
+        forward_header = cfg.forwardCustomHeader
 
-        contractId = config["contractId"]
-        groupId = config["groupId"]
+        # Origin profile was resolved and validated with the config
+        origin_profile_name = cfg.originProfileName
+        origin_profile = cfg.originProfile
+        for warning in cfg.originProfileWarnings:
+            log.warning("Origin profile '%s': %s", origin_profile_name, warning)
 
-        internal_pm_name = cfg["internalPmConfigName"]
-        internal_hostname = cfg["internalHostname"]
-        edge_hostname = cfg["edgeHostname"]
-        origin_hostname = cfg["originHostname"]
-        forward_header = cfg["forwardCustomHeader"]
+        productId = config.propertyManager.productId
+        ruleFormat = config.propertyManager.ruleFormat
 
-        print(f"[INFO] Creating Internal Config: {internal_pm_name}")
+        log.info("Creating Internal Config: %s", internal_pm_name)
 
         # ========================================================
-        # CREATE CP CODE
+        # CP CODE (reused by name)
         # ========================================================
-        cpcodeId, cpcodeName = create_cpcode(
+        cpcodeId, cpcodeName, cpcode_reused = get_or_create_cpcode(
             session, baseurl, internal_hostname,
-            contractId, groupId, accountSwitchKey, verbose
+            contractId, groupId, productId, accountSwitchKey, verbose
         )
 
         # ========================================================
-        # CREATE PM PROPERTY
+        # PM PROPERTY (reused by name)
         # ========================================================
-        propertyId, version = create_property(
+        propertyId, version, property_reused = get_or_create_property(
             session, baseurl,
             internal_pm_name,
-            contractId, groupId, accountSwitchKey, verbose
+            contractId, groupId, productId, ruleFormat, accountSwitchKey, verbose
         )
 
         # ========================================================
-        # ADD INTERNAL HOSTNAME
+        # SYNC INTERNAL HOSTNAME (the property serves only this one)
         # ========================================================
-        add_internal_hostname(
+        hostnames = sync_property_hostnames(
             session, baseurl,
             propertyId, version,
-            internal_hostname, edge_hostname,
-            contractId, groupId, accountSwitchKey, verbose
+            internal_desired_hostnames(config),
+            contractId, groupId, accountSwitchKey,
+            prune=True
         )
 
         # ========================================================
@@ -387,9 +863,14 @@ def run_pm_workflow(session, baseurl, config, activationMode, accountSwitchKey,
         # UPDATE RULE LOGIC
         # ========================================================
         update_origin_behavior(rules, origin_hostname, forward_header, verbose)
+        if origin_profile:
+            apply_origin_performance_profile(rules, thaw(origin_profile), forward_header, verbose)
         remove_offload_origin_children(rules, verbose)
         remove_enhanced_debug(rules, verbose)
         update_cpcode_in_traffic_reporting(rules, cpcodeId, cpcodeName, verbose)
+        caching_profile = apply_harper_caching_profile(
+            rules, thaw(cfg.cachingProfile), verbose
+        )
 
         # ========================================================
         # UPLOAD UPDATED RULE TREE
@@ -397,18 +878,18 @@ def run_pm_workflow(session, baseurl, config, activationMode, accountSwitchKey,
         new_version = upload_rules(
             session, baseurl, propertyId,
             contractId, groupId, rules,
-            accountSwitchKey, verbose
+            accountSwitchKey, verbose, version
         )
 
-        print(f"[SUCCESS] Internal property updated → version {new_version}")
+        log.success("Internal property updated → version %s", new_version)
 
         # ========================================================
         # ACTIVATION (based on CLI)
         # ========================================================
         if activationMode.lower() == "saveonly":
-            print("[INFO] Activation skipped (saveonly mode).")
+            log.info("Activation skipped (saveonly mode).")
         else:
-            emails = config["activationEmails"]
+            emails = list(config.activationEmails)
 
             activate_property_version(
                 session, baseurl,
@@ -421,7 +902,17 @@ def run_pm_workflow(session, baseurl, config, activationMode, accountSwitchKey,
             )
 
     except Exception as e:
-        print(f"[ERROR] PM workflow failed: {e}")
+        log.error("PM workflow failed: %s", e)
         raise
 
-    print("<<< EXIT: run_pm_workflow()")
+    log.debug("<<< EXIT: run_pm_workflow()")
+
+    return {
+        "propertyId": propertyId,
+        "version": new_version,
+        "cpcodeId": cpcodeId,
+        "reused": {"property": property_reused, "cpcode": cpcode_reused},
+        "hostnames": hostnames,
+        "cachingProfile": caching_profile,
+        "originProfile": origin_profile_name
+    }
@@ -0,0 +1,265 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from tracing import span
+from log import get_logger
+
+log = get_logger("prefetch")
+
+
+# ============================================================
+# SNAPSHOT
+# ============================================================
+# Every remote read a run needs that follows from the config alone (property
+# lookup, base rule tree, GTM domain / datacenters, …) is issued at pipeline
+# start, concurrently, instead of each workflow discovering it serially. The
+# read functions take their value from the active snapshot first and only
+# call the API themselves when it is missing or failed.
+DEFAULT_WORKERS = 4
+
+# "not prefetched" (a prefetched value may itself be None, e.g. no GTM domain)
+MISS = object()
+
+
+class Snapshot:
+    """key -> Future; each value is handed out once (callers may modify it)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.taken = set()
+
+    def expect(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries[key] = Future()
+
+    def resolve(self, key, value):
+        future = self.entries.get(key)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def fail(self, key, error):
+        future = self.entries.get(key)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def take(self, key):
+        """Waits for the read; MISS if it was not planned, already taken or failed."""
+        with self.lock:
+            future = self.entries.get(key)
+            if future is None or key in self.taken:
+                return MISS
+            self.taken.add(key)
+
+        try:
+            value = future.result()
+        except Exception as e:
+            log.debug("Prefetched %s failed (%s); fetching again", key[0], e)
+            return MISS
+
+        log.debug("%s from prefetch snapshot", key[0])
+        return value
+
+
+# The snapshot is per context, like the tracer, so concurrent daemon jobs
+# never read each other's prefetch. Inside a read, its own keys are hidden
+# (it would wait on itself) but earlier reads' values are shared.
+_active = contextvars.ContextVar("active_snapshot", default=None)
+_own_keys = contextvars.ContextVar("own_keys", default=())
+
+
+def take(key):
+    snapshot = _active.get()
+    if snapshot is None or key in _own_keys.get():
+        return MISS
+    return snapshot.take(key)
+
+
+# ============================================================
+# READS
+# ============================================================
+class Read:
+    """
+    One chain of dependent reads. `keys` are known from the config; fn(expect,
+    resolve) announces each later key with expect(key) *before* resolving
+    the value it depends on, so a workflow that already has that value
+    waits for the prefetch instead of fetching twice. Keys left unresolved
+    fail with the chain's error.
+    """
+
+    def __init__(self, name, keys, fn):
+        self.name = name
+        self.keys = tuple(keys)
+        self.fn = fn
+
+
+def run_read(snapshot, read):
+    keys = list(read.keys)
+
+    def expect(key):
+        snapshot.expect([key])
+        keys.append(key)
+
+    active, own = _active.set(snapshot), _own_keys.set(keys)
+    with span(f"prefetch {read.name}"):
+        try:
+            read.fn(expect, snapshot.resolve)
+            error = Exception(f"{read.name} did not produce this value")
+        except Exception as e:
+            log.debug("Prefetch %s failed: %s", read.name, e)
+            error = e
+        finally:
+            _own_keys.reset(own)
+            _active.reset(active)
+        for key in keys:
+            snapshot.fail(key, error)
+
+
+@contextmanager
+def prefetched(session, reads, workers=DEFAULT_WORKERS):
+    """
+    Starts `reads` and activates their snapshot for the block. Sessions that
+    must see calls in a fixed order (--record / --replay) run them serially,
+    up front. Waits for unfinished reads on exit.
+    """
+    snapshot = Snapshot()
+    for read in reads:
+        snapshot.expect(read.keys)
+
+    executor = None
+    if getattr(session, "ordered", False) or workers <= 1:
+        for read in reads:
+            run_read(snapshot, read)
+    elif reads:
+        executor = ThreadPoolExecutor(max_workers=min(workers, len(reads)), thread_name_prefix="prefetch")
+        for read in reads:
+            # each task runs in a copy of this context: same tracer and job log
+            ctx = contextvars.copy_context()
+            executor.submit(ctx.run, run_read, snapshot, read)
+
+    token = _active.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        _active.reset(token)
+        if executor:
+            executor.shutdown(wait=True)
+
+
+# ============================================================
+# PLANS (what a run will read, from the config)
+# ============================================================
+def property_id_key(accountSwitchKey, contractId, groupId, propertyName):
+    return ("propertyId", accountSwitchKey, contractId.replace("ctr_", ""), groupId.replace("grp_", ""), propertyName)
+
+
+def rule_tree_key(accountSwitchKey, propertyId, version):
+    return ("ruleTree", accountSwitchKey, propertyId, int(version))
+
+
+def latest_version_key(accountSwitchKey, propertyId, network):
+    return ("latestVersion", accountSwitchKey, propertyId, network)
+
+
+def gtm_domain_key(accountSwitchKey, domain):
+    return ("gtmDomain", accountSwitchKey, domain)
+
+
+def gtm_datacenters_key(accountSwitchKey, domain):
+    return ("gtmDatacenters", accountSwitchKey, domain)
+
+
+def listing_reads(session, baseurl, config, accountSwitchKey, properties=True, cpcodes=True, edgeworkers=True):
+    """
+    The name listings get-or-create works from (see caches.listings). Plan
+    them ahead of reads that use them: serial sessions run reads in order.
+    """
+    from caches import session_section
+    from helpers import list_properties, properties_listing_key
+    from manage_property_manager import list_cpcodes, cpcodes_listing_key
+    from manage_edgeworker import list_edgeworker_ids, edgeworker_ids_listing_key
+
+    contractId, groupId = config.contractId, config.groupId
+    section = session_section(session)
+    reads = []
+
+    def listing(name, key, fn):
+        reads.append(Read(name, [key], lambda expect, resolve: resolve(key, fn())))
+
+    if properties:
+        listing("properties", properties_listing_key(section, contractId, groupId, accountSwitchKey),
+                lambda: list_properties(session, baseurl, contractId, groupId, accountSwitchKey))
+    if cpcodes:
+        listing("cpcodes", cpcodes_listing_key(section, contractId, groupId, accountSwitchKey),
+                lambda: list_cpcodes(session, baseurl, contractId, groupId, accountSwitchKey))
+    if edgeworkers:
+        groupIdNumeric = config.groupIdNumeric
+        listing("edgeworkerIds", edgeworker_ids_listing_key(section, groupIdNumeric, accountSwitchKey),
+                lambda: list_edgeworker_ids(session, baseurl, groupIdNumeric, accountSwitchKey))
+
+    return reads
+
+
+def customer_property_reads(session, baseurl, config, accountSwitchKey, property_id=None, kill_switch_network=MISS):
+    """
+    propertyId lookup, then the base rule tree: the configured version, or
+    with kill_switch_network the version active there (None = latest).
+    """
+    from helpers import find_property_id_by_name
+    from manage_customer_property import get_property_rules, get_latest_property_version
+
+    cf = config.propertyManager.customerFacing
+    kill_switch = kill_switch_network is not MISS
+
+    def version_key(prop_id):
+        if kill_switch:
+            return latest_version_key(accountSwitchKey, prop_id, kill_switch_network)
+        return rule_tree_key(accountSwitchKey, prop_id, cf.propertyVersion)
+
+    def read(expect, resolve):
+        if property_id:
+            prop_id = property_id
+        else:
+            prop_id = find_property_id_by_name(
+                session, baseurl, cf.propertyName, config.contractId, config.groupId, accountSwitchKey
+            )
+            expect(version_key(prop_id))
+            resolve(first_key, prop_id)
+
+        version = cf.propertyVersion
+        if kill_switch:
+            version = get_latest_property_version(
+                session, baseurl, prop_id, kill_switch_network, accountSwitchKey
+            )
+            expect(rule_tree_key(accountSwitchKey, prop_id, version))
+            resolve(version_key(prop_id), version)
+
+        resolve(rule_tree_key(accountSwitchKey, prop_id, version),
+                get_property_rules(session, baseurl, prop_id, version, accountSwitchKey))
+
+    if property_id:
+        first_key = version_key(property_id)
+    else:
+        first_key = property_id_key(accountSwitchKey, config.contractId, config.groupId, cf.propertyName)
+
+    return [Read("customerProperty", [first_key], read)]
+
+
+def gtm_reads(session, baseurl, config, accountSwitchKey):
+    from manage_gtm import get_gtm_domain, list_gtm_datacenters
+
+    domain = config.gtm.domain
+
+    return [
+        Read("gtmDomain", [gtm_domain_key(accountSwitchKey, domain)], lambda expect, resolve: resolve(
+            gtm_domain_key(accountSwitchKey, domain),
+            get_gtm_domain(session, baseurl, domain, accountSwitchKey)
+        )),
+        Read("gtmDatacenters", [gtm_datacenters_key(accountSwitchKey, domain)], lambda expect, resolve: resolve(
+            gtm_datacenters_key(accountSwitchKey, domain),
+            list_gtm_datacenters(session, baseurl, domain, accountSwitchKey)
+        ))
+    ]
@@ -0,0 +1,141 @@
+import io
+import os
+import sys
+import time
+import cProfile
+import resource
+import tracemalloc
+import datetime
+from contextlib import contextmanager
+
+from json_codec import write_file
+
+
+# ============================================================
+# SETTINGS
+# ============================================================
+PROFILE_FILE = "profile.json"
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 1
+
+
+def max_rss_bytes():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def short_path(filename):
+    try:
+        rel = os.path.relpath(filename)
+    except ValueError:
+        return filename
+    return filename if rel.startswith("..") else rel
+
+
+# ============================================================
+# REPORTS
+# ============================================================
+def top_functions(profile, limit=TOP_FUNCTIONS):
+    """Top functions by cumulative time, from a finished cProfile.Profile."""
+    import pstats  # ~10ms to import; only needed with --profile
+
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = []
+
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{short_path(filename)}:{line}({func})",
+            "calls": nc,
+            "primitiveCalls": cc,
+            "selfMs": round(tt * 1000, 3),
+            "cumulativeMs": round(ct * 1000, 3)
+        })
+
+    rows.sort(key=lambda r: r["cumulativeMs"], reverse=True)
+    return rows[:limit]
+
+
+def top_allocations(before, after, limit=TOP_ALLOCATIONS):
+    """Allocation sites by bytes still allocated when the workflow ended."""
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            "site": f"{short_path(frame.filename)}:{frame.lineno}",
+            "sizeBytes": stat.size,
+            "sizeDiffBytes": stat.size_diff,
+            "count": stat.count
+        })
+    return rows
+
+
+# ============================================================
+# PROFILER
+# ============================================================
+class WorkflowProfiler:
+    """
+    --profile: each workflow() block runs under cProfile and tracemalloc.
+    Disabled, workflow() is a plain pass-through.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reports = {}
+
+    @contextmanager
+    def workflow(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+
+        before = tracemalloc.take_snapshot()
+        rss_before = max_rss_bytes()
+        profile = cProfile.Profile()
+        error = None
+        start = time.perf_counter()
+
+        profile.enable()
+        try:
+            yield
+        except BaseException as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            profile.disable()
+            wall = time.perf_counter() - start
+
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+            report = {
+                "wallMs": round(wall * 1000, 3),
+                "topFunctions": top_functions(profile),
+                "topAllocations": top_allocations(before, after),
+                "peakTracedBytes": peak,
+                "peakRssBytes": max_rss_bytes(),
+                "rssGrowthBytes": max(0, max_rss_bytes() - rss_before)
+            }
+            if error:
+                report["error"] = error
+            self.reports[name] = report
+
+    def write(self, path=PROFILE_FILE):
+        if not self.enabled:
+            return None
+
+        write_file(path, {
+            "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+            "workflows": self.reports,
+            "peakRssBytes": max_rss_bytes()
+        })
+        return path
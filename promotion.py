@@ -0,0 +1,255 @@
+import math
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import traced, span
+from log import get_logger
+from smoke_checks import run_smoke_checks
+
+log = get_logger("promotion")
+
+
+# ============================================================
+# STAGING → PRODUCTION PROMOTION
+# ============================================================
+# The versions one build produced (internal property, EdgeWorker, customer
+# property) are activated on staging together, smoke-checked, and then the
+# very same versions are activated on production — nothing is rebuilt in
+# between, so production runs exactly what staging was checked with.
+#
+# On staging all three activate at once. On production the customer
+# property waits for the other two: its Harper rule calls the EdgeWorker,
+# which forwards to the internal hostname, so live traffic must never reach
+# a rule whose dependencies are not active yet. With a canary ramp, the
+# build saved one customer-property version per step; production walks
+# through them with the configured hold before the last one goes live.
+STAGING_WAVES = (("internalProperty", "edgeworker", "customerProperty"),)
+PRODUCTION_WAVES = (("internalProperty", "edgeworker"), ("customerProperty",))
+
+NETWORKS = ("staging", "production")
+
+DEFAULT_POLL_SECONDS = 30
+DEFAULT_ACTIVATION_TIMEOUT_S = 3600
+
+
+class PromotionError(Exception):
+    """A failed promotion; `report` holds what was done up to the failure."""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+def promotion_targets(results):
+    """
+    The versions a pipeline run built, from its results (or result.json):
+    {"internalProperty": {"propertyId", "version"}, "edgeworker":
+    {"edgeWorkerId", "version"}, "customerProperty": {"propertyId", "version"}}.
+    """
+    errors = [f"{key}: {value}" for key, value in results.items() if key.endswith("_error")]
+    if errors:
+        raise Exception("The build did not complete — " + "; ".join(errors))
+
+    pm = results.get("propertyManager") or {}
+    ew = results.get("edgeworker") or {}
+    harper = results.get("harperRule") or {}
+
+    targets = {
+        "internalProperty": {"propertyId": pm.get("propertyId"), "version": pm.get("version")},
+        "edgeworker": {"edgeWorkerId": ew.get("edgeWorkerId"), "version": ew.get("version")},
+        "customerProperty": {"propertyId": results.get("customerFacingPropertyId"), "version": harper.get("newVersion")}
+    }
+
+    missing = [kind for kind, target in targets.items() if None in target.values()]
+    if missing:
+        raise Exception(f"No built version for {', '.join(missing)} in the results")
+    return targets
+
+
+def canary_steps(results):
+    """
+    [(percent, version)] of the customer-property versions a canary build
+    saved (harperRule.canary), ending with the promoted version; empty
+    without a canary ramp.
+    """
+    harper = results.get("harperRule") or {}
+    steps = [(step.get("percent"), step.get("version")) for step in harper.get("canary") or []]
+
+    if steps and (any(None in step for step in steps) or steps[-1][1] != harper.get("newVersion")):
+        raise Exception(f"Incomplete canary versions in the results: {steps}")
+    return steps
+
+
+# ============================================================
+# ACTIVATIONS
+# ============================================================
+def active_versions(session, baseurl, config, kind, target, accountSwitchKey):
+    """{"staging": version, "production": version} of the target (None where nothing is active)."""
+    if kind == "edgeworker":
+        from manage_edgeworker import get_edgeworker_activations
+
+        # newest first: the latest completed activation per network is the live one
+        active = {}
+        for act in get_edgeworker_activations(session, baseurl, target["edgeWorkerId"], accountSwitchKey):
+            if act.get("status") == "COMPLETE":
+                active.setdefault(str(act.get("network")).lower(), act.get("version"))
+        return {network: active.get(network) for network in NETWORKS}
+
+    from manage_customer_property import get_property_status
+
+    status = get_property_status(session, baseurl, target["propertyId"], config.contractId, config.groupId,
+                                 accountSwitchKey)
+    return {network: status.get(f"{network}Version") for network in NETWORKS}
+
+
+def activate_target(session, baseurl, config, kind, target, network, accountSwitchKey, verbose, note=None):
+    """Activates one target on the network and waits until it is live."""
+    from manage_customer_property import activate_property, wait_for_property_activation
+
+    promotion = config.promotion
+    wait = {
+        "poll_seconds": promotion.pollSeconds,
+        "max_attempts": max(1, math.ceil(promotion.activationTimeoutS / promotion.pollSeconds))
+    }
+    version = target["version"]
+    started = time.perf_counter()
+
+    with span(f"activate {kind}", network=network, version=version):
+        if active_versions(session, baseurl, config, kind, target, accountSwitchKey)[network] == version:
+            log.info("%s version %s already active on %s.", kind, version, network)
+            return {**target, "status": "alreadyActive"}
+
+        if kind == "edgeworker":
+            from manage_edgeworker import activate_edgeworker, wait_for_edgeworker_activation
+
+            ew_id = target["edgeWorkerId"]
+            activation = activate_edgeworker(session, baseurl, ew_id, version, network, accountSwitchKey, verbose)
+            wait_for_edgeworker_activation(session, baseurl, ew_id, activation.get("activationId"),
+                                           accountSwitchKey, verbose, **wait)
+
+        elif kind == "internalProperty":
+            from manage_property_manager import activate_property_version
+
+            activation = activate_property_version(
+                session, baseurl, target["propertyId"], version, config.contractId, config.groupId,
+                network, list(config.activationEmails), accountSwitchKey, verbose
+            )
+            wait_for_property_activation(session, baseurl, activation, accountSwitchKey, verbose, **wait)
+
+        else:
+            activation = activate_property(
+                session, baseurl, target["propertyId"], version, list(config.activationEmails),
+                network, accountSwitchKey, verbose, note=note or f"Promotion of version {version} to {network}"
+            )
+            wait_for_property_activation(session, baseurl, activation, accountSwitchKey, verbose, **wait)
+
+    log.success("%s version %s active on %s.", kind, version, network)
+    return {**target, "status": "activated", "waitedS": round(time.perf_counter() - started, 1)}
+
+
+def ramp_production(session, baseurl, config, target, canary, accountSwitchKey, verbose):
+    """
+    Activates the canary versions of the customer property on production,
+    all but the last (the wave activates that one), each followed by
+    canaryHoldSeconds. A re-run resumes after the step already active.
+    Returns the step reports; stops at the first failed step.
+    """
+    hold_seconds = config.propertyManager.customerFacing.canaryHoldSeconds
+    steps = canary[:-1]
+
+    active = active_versions(session, baseurl, config, "customerProperty", target, accountSwitchKey)["production"]
+    # never step back from a version a previous run already reached
+    done = next((i + 1 for i, (_, version) in enumerate(canary) if version == active), 0)
+
+    reports = []
+    for percent, version in steps[done:]:
+        try:
+            report = activate_target(session, baseurl, config, "customerProperty", {**target, "version": version},
+                                     "production", accountSwitchKey, verbose,
+                                     note=f"Promotion canary {percent}% of version {target['version']} to production")
+        except Exception as e:
+            log.error("Canary %s%% activation on production failed: %s", percent, e)
+            reports.append({**target, "version": version, "percent": percent, "status": "failed", "error": str(e)})
+            break
+
+        reports.append({**report, "percent": percent})
+        log.info("Canary at %s%% on production — holding %ss before the next step…", percent, hold_seconds)
+        with span("canary_hold", kind="wait", percent=percent):
+            time.sleep(hold_seconds)
+
+    return reports
+
+
+def activate_wave(session, baseurl, config, targets, kinds, network, accountSwitchKey, verbose, note=None):
+    """
+    Activates `kinds` concurrently (in order for --record / --replay
+    sessions); every activation runs to the end even when one fails.
+    Returns kind -> report, with "error" for the failed ones.
+    """
+    def safe_activate(kind):
+        try:
+            return activate_target(session, baseurl, config, kind, targets[kind], network, accountSwitchKey,
+                                   verbose, note)
+        except Exception as e:
+            log.error("%s activation on %s failed: %s", kind, network, e)
+            return {**targets[kind], "status": "failed", "error": str(e)}
+
+    if getattr(session, "ordered", False):
+        return {kind: safe_activate(kind) for kind in kinds}
+
+    with ThreadPoolExecutor(max_workers=len(kinds), thread_name_prefix="promote") as executor:
+        # each activation runs in a copy of this context: same tracer and job log
+        futures = [executor.submit(contextvars.copy_context().run, safe_activate, kind) for kind in kinds]
+        return {kind: f.result() for kind, f in zip(kinds, futures)}
+
+
+# ============================================================
+# PROMOTION
+# ============================================================
+@traced()
+def run_promotion(session, baseurl, config, targets, accountSwitchKey, verbose, production=True, canary=()):
+    """
+    Staging, smoke checks, then (with production) the same versions on
+    production and its smoke checks. `canary` (see canary_steps) ramps the
+    customer property up on production. Returns the report; any failed
+    activation or smoke check raises PromotionError carrying it.
+    """
+    promotion = config.promotion
+    report = {"targets": targets}
+
+    for network, waves in (("staging", STAGING_WAVES), ("production", PRODUCTION_WAVES)):
+        if network == "production" and not production:
+            report["production"] = "skipped (staging only)"
+            break
+
+        log.step("Promoting to %s…", network)
+        step = report[network] = {"activations": {}}
+
+        with span(f"promote {network}", network=network):
+            for kinds in waves:
+                if network == "production" and "customerProperty" in kinds and len(canary) > 1:
+                    step["canary"] = ramp_production(session, baseurl, config, targets["customerProperty"],
+                                                     canary, accountSwitchKey, verbose)
+                    if any(r["status"] == "failed" for r in step["canary"]):
+                        raise PromotionError("Canary activation on production failed", report)
+
+                step["activations"].update(
+                    activate_wave(session, baseurl, config, targets, kinds, network, accountSwitchKey, verbose)
+                )
+                failed = [kind for kind, r in step["activations"].items() if r["status"] == "failed"]
+                if failed:
+                    raise PromotionError(f"Activation on {network} failed: {', '.join(failed)}", report)
+
+            step["smoke"] = run_smoke_checks(
+                promotion.smokeChecks, network, promotion.smokeTimeoutMs, promotion.smokeRetries
+            )
+
+        if not step["smoke"]["passed"]:
+            stop = " — production left untouched" if network == "staging" else ""
+            raise PromotionError(f"Smoke checks failed on {network}: {', '.join(step['smoke']['failed'])}{stop}",
+                                 report)
+
+        log.success("%s promoted and smoke-checked.", network.capitalize())
+
+    return report
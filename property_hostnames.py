@@ -0,0 +1,244 @@
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import traced
+from log import get_logger
+from json_codec import send_json, response_json
+
+log = get_logger("hostnames")
+
+
+# ============================================================
+# HOSTNAME SYNC
+# ============================================================
+# A property version's hostnames are diffed against the desired list and
+# the difference goes out as one PATCH (add + remove), however many
+# hostnames there are. Both PAPI calls ask for certStatus, so the sync
+# reports certificate provisioning without extra reads.
+DEFAULT_WORKERS = 4
+
+NETWORKS = ("staging", "production")
+
+
+def hostname_entry(cname_from, cname_to, cert_provisioning_type="DEFAULT"):
+    return {
+        "cnameType": "EDGE_HOSTNAME",
+        "cnameFrom": cname_from,
+        "cnameTo": cname_to,
+        "certProvisioningType": cert_provisioning_type
+    }
+
+
+def hostnames_params(contractId, groupId, accountSwitchKey, **extra):
+    params = {"includeCertStatus": "true", "PAPI-Use-Prefixes": "true", **extra}
+    if contractId:
+        params["contractId"] = contractId
+    if groupId:
+        params["groupId"] = groupId
+    if accountSwitchKey:
+        params["accountSwitchKey"] = accountSwitchKey
+    return params
+
+
+@traced()
+def get_property_hostnames(session, baseurl, propertyId, version, contractId, groupId, accountSwitchKey):
+    url = f"{baseurl}/papi/v1/properties/{propertyId}/versions/{version}/hostnames"
+
+    log.debug("GET %s", url)
+    resp = session.get(url, params=hostnames_params(contractId, groupId, accountSwitchKey),
+                       headers={"Accept": "application/json"})
+
+    if resp.status_code != 200:
+        raise Exception(f"Failed to fetch hostnames of {propertyId} v{version}: {resp.text}")
+
+    return response_json(resp).get("hostnames", {}).get("items", [])
+
+
+@traced()
+def patch_property_hostnames(session, baseurl, propertyId, version, add, remove,
+                             contractId, groupId, accountSwitchKey):
+    """One PATCH for the whole change; returns the version's new hostname list."""
+    url = f"{baseurl}/papi/v1/properties/{propertyId}/versions/{version}/hostnames"
+
+    params = hostnames_params(contractId, groupId, accountSwitchKey, validateHostnames="true")
+    payload = {"add": add, "remove": remove}
+
+    resp = send_json(session, "PATCH", url, payload, params=params, compress=True)
+
+    if resp.status_code not in (200, 201):
+        raise Exception(f"Hostname update failed: {resp.text}")
+
+    return response_json(resp).get("hostnames", {}).get("items", [])
+
+
+def diff_hostnames(current, desired, prune=False):
+    """
+    add: desired entries missing or pointing elsewhere; remove: cnameFrom of
+    changed entries (and with prune, of every hostname not desired).
+    Hostnames compare case-insensitively.
+    """
+    current_by_name = {h["cnameFrom"].lower(): h for h in current}
+    desired_by_name = {h["cnameFrom"].lower(): h for h in desired}
+
+    add, remove, unchanged = [], [], []
+    for name, want in desired_by_name.items():
+        have = current_by_name.get(name)
+        if have is None:
+            add.append(want)
+        elif (have.get("cnameTo"), have.get("certProvisioningType", "DEFAULT")) != \
+                (want["cnameTo"], want["certProvisioningType"]):
+            remove.append(have["cnameFrom"])
+            add.append(want)
+        else:
+            unchanged.append(have["cnameFrom"])
+
+    if prune:
+        remove += [h["cnameFrom"] for name, h in current_by_name.items() if name not in desired_by_name]
+
+    return {"add": add, "remove": remove, "unchanged": unchanged}
+
+
+# ============================================================
+# CERTIFICATE STATUS
+# ============================================================
+def cert_status(item):
+    """{"staging": status, "production": status} of one hostname's certificate."""
+    status = item.get("certStatus") or {}
+    return {net: ((status.get(net) or [{}])[0]).get("status", "UNKNOWN") for net in NETWORKS}
+
+
+def summarize_cert_status(items):
+    """Status counts per network, plus the hostnames not yet DEPLOYED on one of them."""
+    counts = {net: Counter() for net in NETWORKS}
+    not_deployed = []
+
+    for item in items:
+        status = cert_status(item)
+        for net in NETWORKS:
+            counts[net][status[net]] += 1
+        if any(s != "DEPLOYED" for s in status.values()):
+            not_deployed.append({"hostname": item["cnameFrom"], **status})
+
+    return {
+        "hostnames": len(items),
+        **{net: dict(counts[net]) for net in NETWORKS},
+        "notDeployed": not_deployed
+    }
+
+
+# ============================================================
+# SYNC
+# ============================================================
+@traced()
+def sync_property_hostnames(session, baseurl, propertyId, version, desired,
+                            contractId, groupId, accountSwitchKey, prune=False, current=None):
+    """
+    Brings the version's hostnames to `desired` (hostname_entry() dicts).
+    Without prune, hostnames that are not desired are left alone.
+    `current` skips the read when the caller already has the list.
+    """
+    if current is None:
+        current = get_property_hostnames(session, baseurl, propertyId, version, contractId, groupId, accountSwitchKey)
+
+    diff = diff_hostnames(current, desired, prune)
+    items = current
+
+    if diff["add"] or diff["remove"]:
+        items = patch_property_hostnames(
+            session, baseurl, propertyId, version, diff["add"], diff["remove"],
+            contractId, groupId, accountSwitchKey
+        )
+        log.success("Hostnames of %s v%s: %s added, %s removed, %s unchanged",
+                    propertyId, version, len(diff["add"]), len(diff["remove"]), len(diff["unchanged"]))
+    else:
+        log.info("Hostnames of %s v%s already in sync (%s).", propertyId, version, len(diff["unchanged"]))
+
+    report = sync_report(diff, items)
+    pending = report["certStatus"]["notDeployed"]
+    if pending:
+        log.warning("%s hostname certificate(s) not deployed yet on %s v%s", len(pending), propertyId, version)
+    return report
+
+
+def sync_report(diff, items):
+    return {
+        "added": [h["cnameFrom"] for h in diff["add"]],
+        "removed": diff["remove"],
+        "unchanged": len(diff["unchanged"]),
+        "certStatus": summarize_cert_status(items)
+    }
+
+
+# ============================================================
+# DESIRED HOSTNAMES (from the config)
+# ============================================================
+def internal_desired_hostnames(config):
+    internal = config.propertyManager.internal
+    return [hostname_entry(internal.internalHostname, internal.edgeHostname)]
+
+
+def default_edge_hostname(current):
+    """The edge hostname most of the property's hostnames already point to."""
+    targets = Counter(h.get("cnameTo") for h in current if h.get("cnameType", "EDGE_HOSTNAME") == "EDGE_HOSTNAME")
+    targets.pop(None, None)
+    return targets.most_common(1)[0][0] if targets else None
+
+
+def customer_desired_hostnames(config, current):
+    cf = config.propertyManager.customerFacing
+    if not cf.propertyHostnames:
+        return []
+
+    current_by_name = {h["cnameFrom"].lower(): h for h in current}
+    edge_hostname = cf.edgeHostname or default_edge_hostname(current)
+
+    desired = []
+    for name in cf.propertyHostnames:
+        have = current_by_name.get(name.lower())
+        if have is not None and not cf.edgeHostname:
+            # keep what the property already has; only add what is missing
+            desired.append(hostname_entry(have["cnameFrom"], have.get("cnameTo"),
+                                          have.get("certProvisioningType", "DEFAULT")))
+            continue
+        if not edge_hostname:
+            log.warning("Skipping %s: no edge hostname to point it at — set "
+                        "propertyManager.customerFacingHostname.edgeHostname", name)
+            continue
+        desired.append(hostname_entry(name, edge_hostname))
+    return desired
+
+
+# ============================================================
+# CONCURRENT REPORT (main.py hostnames)
+# ============================================================
+def hostname_plans(session, baseurl, targets, accountSwitchKey, workers=DEFAULT_WORKERS):
+    """
+    targets: [{"label", "propertyId", "version", "contractId", "groupId",
+    "desired": fn(current) -> entries, "prune"}]. Reads every target's
+    hostnames concurrently (in order for --record / --replay sessions) and
+    returns label -> the sync it would make.
+    """
+    def plan(target):
+        current = get_property_hostnames(
+            session, baseurl, target["propertyId"], target["version"],
+            target["contractId"], target["groupId"], accountSwitchKey
+        )
+        diff = diff_hostnames(current, target["desired"](current), target["prune"])
+        return {"propertyId": target["propertyId"], "version": target["version"], **sync_report(diff, current)}
+
+    def safe_plan(target):
+        try:
+            return plan(target)
+        except Exception as e:
+            return {"propertyId": target["propertyId"], "version": target["version"], "error": str(e)}
+
+    if not targets:
+        return {}
+    if getattr(session, "ordered", False):
+        return {t["label"]: safe_plan(t) for t in targets}
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(targets)), thread_name_prefix="hostnames") as executor:
+        # each read runs in a copy of this context: same tracer and job log
+        futures = [executor.submit(contextvars.copy_context().run, safe_plan, t) for t in targets]
+        return {t["label"]: f.result() for t, f in zip(targets, futures)}
@@ -0,0 +1,139 @@
+import gzip
+import json
+from urllib.parse import urlsplit
+
+from tracing import traced
+
+
+# ============================================================
+# LIMITS
+# ============================================================
+# Akamai EdgeWorkers product limit for the compressed code bundle
+MAX_BUNDLE_COMPRESSED_BYTES = 1024 * 1024
+
+REDIRECT_STATUS_CODES = (301, 302, 303, 307, 308)
+
+# Trie nodes keep their own redirect under this key; child keys always start
+# with "/" so they can never collide with it.
+TRIE_LEAF = "$"
+
+EMPTY_REDIRECTS_JS = (
+    "// Generated by redirect_compiler.py — do not edit.\n"
+    "export const EXACT_REDIRECTS = {};\n"
+    "export const PREFIX_REDIRECTS = {};\n"
+)
+
+
+# ============================================================
+# COMPILE
+# ============================================================
+def exact_key(key):
+    """
+    Full URLs become host + path[?query] (matched against request.host +
+    request.url); paths stay as given (matched against request.url, then
+    request.path).
+    """
+    parts = urlsplit(key)
+    if parts.netloc:
+        path = parts.path or "/"
+        return parts.netloc + (f"{path}?{parts.query}" if parts.query else path)
+    return key
+
+
+def redirect_entry(key, rule, append_path=False):
+    status = int(rule.get("statusCode", 301))
+    target = rule.get("redirectURL")
+
+    if status not in REDIRECT_STATUS_CODES:
+        raise Exception(f"Redirect '{key}': unsupported statusCode {status}")
+    if not isinstance(target, str) or not target:
+        raise Exception(f"Redirect '{key}': missing redirectURL")
+
+    return [status, target, 1] if append_path else [status, target]
+
+
+def compile_redirect_table(dataset):
+    """
+    Compiles a redirect dataset
+
+        {
+          "redirects":       {"/old": {"statusCode": 301, "redirectURL": "https://…/new"}},
+          "prefixRedirects": {"/legacy": {"statusCode": 301, "redirectURL": "https://…/archive", "appendPath": true}}
+        }
+
+    into an exact-match hash and a path-segment prefix trie. Entries are
+    compact [statusCode, location(, appendPath)] arrays.
+    """
+    exact = {}
+    for key, rule in dataset.get("redirects", {}).items():
+        exact[exact_key(key)] = redirect_entry(key, rule)
+
+    trie = {}
+    for prefix, rule in dataset.get("prefixRedirects", {}).items():
+        if not prefix.startswith("/"):
+            raise Exception(f"Prefix redirect '{prefix}' must start with '/'")
+
+        node = trie
+        for segment in [s for s in prefix.split("/") if s]:
+            node = node.setdefault("/" + segment, {})
+        node[TRIE_LEAF] = redirect_entry(prefix, rule, rule.get("appendPath", False))
+
+    return exact, trie
+
+
+def render_redirects_js(exact, trie):
+    compact = {"separators": (",", ":"), "ensure_ascii": False, "sort_keys": True}
+    return (
+        "// Generated by redirect_compiler.py — do not edit.\n"
+        f"export const EXACT_REDIRECTS = {json.dumps(exact, **compact)};\n"
+        f"export const PREFIX_REDIRECTS = {json.dumps(trie, **compact)};\n"
+    )
+
+
+def count_trie_rules(node):
+    return (1 if TRIE_LEAF in node else 0) + sum(
+        count_trie_rules(child) for key, child in node.items() if key != TRIE_LEAF
+    )
+
+
+# ============================================================
+# PIPELINE STAGE (runs before create_bundle)
+# ============================================================
+@traced()
+def build_redirect_module(dataset_path, output_js):
+    """
+    Writes redirects.js for the bundle. With no dataset configured an empty
+    table is written so main.js's import always resolves.
+    Returns a size / compression report.
+    """
+    if not dataset_path:
+        with open(output_js, "w") as f:
+            f.write(EMPTY_REDIRECTS_JS)
+        return {"enabled": False}
+
+    with open(dataset_path, "rb") as f:
+        source = f.read()
+
+    exact, trie = compile_redirect_table(json.loads(source))
+    module = render_redirects_js(exact, trie).encode("utf-8")
+    compressed = len(gzip.compress(module, compresslevel=9))
+
+    if compressed > MAX_BUNDLE_COMPRESSED_BYTES:
+        raise Exception(
+            f"Compiled redirect table is {compressed} bytes gzipped — over the "
+            f"{MAX_BUNDLE_COMPRESSED_BYTES} byte EdgeWorker bundle limit"
+        )
+
+    with open(output_js, "wb") as f:
+        f.write(module)
+
+    return {
+        "enabled": True,
+        "dataset": dataset_path,
+        "exactRedirects": len(exact),
+        "prefixRedirects": count_trie_rules(trie),
+        "sourceBytes": len(source),
+        "moduleBytes": len(module),
+        "gzipBytes": compressed,
+        "compressionRatio": round(len(source) / compressed, 2) if compressed else None
+    }
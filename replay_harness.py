@@ -0,0 +1,324 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+from stats import percentile
+from harper_standin import HarperStandIn, load_dataset
+from redirect_compiler import compile_redirect_table
+from edgeworker_model import (
+    make_client_request,
+    lookup_local_redirect,
+    build_subrequest_url,
+    build_subrequest_headers,
+    decide
+)
+
+
+# ============================================================
+# LOAD REQUEST LOG
+# ============================================================
+def load_request_log(path):
+    """
+    Reads a request log: one request per line, either a bare URL or a JSON
+    object with "url" and optional "brandName" (e.g. "Safari").
+    Returns (requests, skipped_line_count).
+    """
+    requests_out = []
+    skipped = 0
+
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith("{"):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+            else:
+                entry = {"url": line}
+
+            url = entry.get("url")
+            if not url or not urlsplit(url).netloc:
+                skipped += 1
+                continue
+
+            requests_out.append(make_client_request(url, entry.get("brandName", "")))
+
+    return requests_out, skipped
+
+
+# ============================================================
+# KEEP-ALIVE HTTP CLIENT (one connection per worker)
+# ============================================================
+class HarperConnection:
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def get(self, url, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        parts = urlsplit(url)
+        target = f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by Harper")
+        status = int(status_line.split()[1])
+
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value.strip())
+
+        body = await self.reader.readexactly(length) if length else b""
+        return status, body
+
+
+# ============================================================
+# REPLAY
+# ============================================================
+async def replay(client_requests, host, port, base_url, token, concurrency, timeout_ms,
+                 redirect_table=None):
+    """
+    Pushes every client request through the EdgeWorker model against a Harper
+    endpoint at host:port. With a compiled redirect_table (exact, trie),
+    local hits are answered without a subrequest, as in main.js.
+    Returns one result dict per request.
+    """
+    queue = asyncio.Queue()
+    for req in client_requests:
+        queue.put_nowait(req)
+
+    results = []
+
+    async def worker():
+        conn = HarperConnection(host, port)
+
+        while True:
+            try:
+                req = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+
+            started = time.perf_counter()
+
+            if redirect_table and lookup_local_redirect(redirect_table[0], redirect_table[1], req):
+                results.append({
+                    "url": f"{req['scheme']}://{req['host']}{req['url']}",
+                    "status": None,
+                    "latencyMs": (time.perf_counter() - started) * 1000.0,
+                    "outcome": "localRedirect"
+                })
+                continue
+
+            url = build_subrequest_url(base_url, req)
+            headers = build_subrequest_headers(token, req)
+
+            try:
+                status, raw = await asyncio.wait_for(conn.get(url, headers), timeout_ms / 1000.0)
+                latency_ms = (time.perf_counter() - started) * 1000.0
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = None
+                decision = decide(status, body)
+                results.append({
+                    "url": headers["Path"],
+                    "status": status,
+                    "latencyMs": latency_ms,
+                    "outcome": decision["action"] if status == 200 else "error"
+                })
+            except asyncio.TimeoutError:
+                # The response may still arrive on this socket; start clean
+                await conn.close()
+                results.append({
+                    "url": headers["Path"],
+                    "status": None,
+                    "latencyMs": float(timeout_ms),
+                    "outcome": "timeout"
+                })
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                await conn.close()
+                results.append({
+                    "url": headers["Path"],
+                    "status": None,
+                    "latencyMs": (time.perf_counter() - started) * 1000.0,
+                    "outcome": "error"
+                })
+
+        await conn.close()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return results
+
+
+# ============================================================
+# REPORT
+# ============================================================
+def summarize(results, wall_time_s, skipped=0):
+    """
+    latencyMs is the TTFB the subrequest adds: every request that made one,
+    timeouts counted at the timeout (censored), so p99 reaches the budget
+    as the timeout rate grows. Local redirects make no subrequest.
+    """
+    total = len(results)
+    added = sorted(round(r["latencyMs"], 2) for r in results if r["outcome"] != "localRedirect")
+
+    counts = {}
+    for r in results:
+        counts[r["outcome"]] = counts.get(r["outcome"], 0) + 1
+
+    def ratio(outcome):
+        return round(counts.get(outcome, 0) / total, 4) if total else 0.0
+
+    return {
+        "requests": total,
+        "skippedLogLines": skipped,
+        "wallTimeS": round(wall_time_s, 3),
+        "throughputRps": round(total / wall_time_s, 1) if wall_time_s else None,
+        "latencyMs": {
+            "p50": percentile(added, 50),
+            "p90": percentile(added, 90),
+            "p95": percentile(added, 95),
+            "p99": percentile(added, 99),
+            "max": added[-1] if added else None,
+            "mean": round(sum(added) / len(added), 2) if added else None
+        },
+        "timeoutRate": ratio("timeout"),
+        "errorRate": ratio("error"),
+        "localRedirectRatio": ratio("localRedirect"),
+        "redirectRatio": ratio("redirect"),
+        "hintsRatio": ratio("hints"),
+        "noneRatio": ratio("none")
+    }
+
+
+def write_samples(results, timeout_ms, path):
+    """
+    One JSON line per request. Timed-out requests are written as censored
+    samples: the real latency is only known to be >= timeoutMs.
+    """
+    with open(path, "w") as f:
+        for r in results:
+            if r["outcome"] == "localRedirect":
+                continue
+            sample = {"latencyMs": round(r["latencyMs"], 3), "outcome": r["outcome"]}
+            if r["outcome"] == "timeout":
+                sample["censored"] = True
+                sample["timeoutMs"] = timeout_ms
+            f.write(json.dumps(sample) + "\n")
+
+
+async def run_replay(client_requests, dataset, latency, concurrency, timeout_ms,
+                     error_rate=0.0, token="xxxxxxx", target=None, redirect_table=None):
+    """
+    Replays against `target` ("host:port") when given, otherwise against an
+    in-process HarperStandIn. Returns (report, results).
+    """
+    standin = None
+
+    if target:
+        host, _, port = target.rpartition(":")
+        port = int(port)
+    else:
+        standin = await HarperStandIn(dataset, latency, error_rate=error_rate, token=token).start()
+        host, port = standin.host, standin.port
+
+    base_url = f"http://{host}:{port}"
+
+    try:
+        started = time.perf_counter()
+        results = await replay(client_requests, host, port, base_url, token, concurrency, timeout_ms,
+                               redirect_table)
+        wall = time.perf_counter() - started
+    finally:
+        if standin:
+            await standin.stop()
+
+    return summarize(results, wall), results
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Replay a request log through the EdgeWorker model and a Harper stand-in")
+    parser.add_argument("--log", required=True, help="Request log (URL per line or JSON lines with url/brandName)")
+    parser.add_argument("--dataset", help="Redirect / hints dataset JSON for the stand-in")
+    parser.add_argument("--latency", default="lognormal:20:0.5", help="Stand-in latency spec")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stand-in answers that are 503")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout-ms", type=float, default=150, help="EdgeWorker subrequest timeout")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the log this many times")
+    parser.add_argument("--redirect-dataset", help="Compile this redirect dataset into a local table, as the bundle does")
+    parser.add_argument("--target", help="Replay against an already running Harper at host:port")
+    parser.add_argument("--output", help="Write the report JSON here")
+    parser.add_argument("--samples-out", help="Write per-request latency samples (JSON lines) for timeout_calibrator.py")
+    args = parser.parse_args()
+
+    client_requests, skipped = load_request_log(args.log)
+    if not client_requests:
+        print(f"[ERROR] No replayable requests in {args.log} ({skipped} lines skipped)")
+        sys.exit(1)
+
+    client_requests = client_requests * max(1, args.repeat)
+
+    redirect_table = None
+    if args.redirect_dataset:
+        with open(args.redirect_dataset, "r") as f:
+            redirect_table = compile_redirect_table(json.load(f))
+
+    print(f"[STEP] Replaying {len(client_requests)} requests (concurrency={args.concurrency})…")
+
+    report, results = asyncio.run(run_replay(
+        client_requests,
+        load_dataset(args.dataset),
+        args.latency,
+        args.concurrency,
+        args.timeout_ms,
+        error_rate=args.error_rate,
+        target=args.target,
+        redirect_table=redirect_table
+    ))
+    report["skippedLogLines"] = skipped
+
+    print(json.dumps(report, indent=2))
+
+    if args.samples_out:
+        write_samples(results, args.timeout_ms, args.samples_out)
+        print(f"[SUCCESS] {len(results)} latency samples written to {args.samples_out}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"[SUCCESS] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
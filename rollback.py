@@ -0,0 +1,166 @@
+import os
+import uuid
+import datetime
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import traced
+from caches import session_section
+from log import get_logger
+from json_codec import canonical
+from run_history import load_history
+from promotion import active_versions, activate_wave, NETWORKS
+
+log = get_logger("rollback")
+
+
+# ============================================================
+# SNAPSHOTS
+# ============================================================
+# Before a run activates anything, the versions active on staging and
+# production for the internal property, the customer property and the
+# EdgeWorker are appended to history/snapshots.jsonl. `rollback` re-activates
+# one snapshot's versions: no build, no rule-tree work, only activations.
+SNAPSHOT_FILE = "history/snapshots.jsonl"
+
+KINDS = ("internalProperty", "edgeworker", "customerProperty")
+
+# concurrent daemon jobs append to the same file
+_append_lock = threading.Lock()
+
+
+class RollbackError(Exception):
+    """A failed rollback; `report` holds every activation's outcome."""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+def snapshot_targets(session, baseurl, config, accountSwitchKey, property_id=None):
+    """
+    kind -> {"propertyId"} / {"edgeWorkerId"} for the objects that already
+    exist, from the cached name listings (nothing new to list in a run).
+    """
+    from helpers import list_properties
+    from manage_edgeworker import list_edgeworker_ids
+
+    properties = list_properties(session, baseurl, config.contractId, config.groupId, accountSwitchKey)
+    targets = {}
+
+    internal = properties.get(config.propertyManager.internal.internalPmConfigName)
+    if internal:
+        targets["internalProperty"] = {"propertyId": internal[0]["propertyId"]}
+
+    ews = list_edgeworker_ids(session, baseurl, config.groupIdNumeric, accountSwitchKey).get(config.edgeworker.name, [])
+    # the ID get_or_create_edgeworker_id() reuses: same resource tier
+    ew = next((i for i in ews if i.get("resourceTierId") == config.edgeworker.resourceTierId), None)
+    if ew:
+        targets["edgeworker"] = {"edgeWorkerId": ew["edgeWorkerId"]}
+
+    customer = property_id
+    if not customer:
+        matches = properties.get(config.propertyManager.customerFacing.propertyName)
+        customer = matches[0]["propertyId"] if matches else None
+    if customer:
+        targets["customerProperty"] = {"propertyId": customer}
+
+    return targets
+
+
+@traced()
+def take_snapshot(session, baseurl, config, accountSwitchKey, reason, property_id=None, path=SNAPSHOT_FILE):
+    """Reads every target's active versions (concurrently) and appends the snapshot."""
+    targets = snapshot_targets(session, baseurl, config, accountSwitchKey, property_id)
+
+    def read(kind):
+        return {**targets[kind], **active_versions(session, baseurl, config, kind, targets[kind], accountSwitchKey)}
+
+    if getattr(session, "ordered", False) or len(targets) <= 1:
+        versions = {kind: read(kind) for kind in targets}
+    else:
+        with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="snapshot") as executor:
+            # each read runs in a copy of this context: same tracer and job log
+            futures = {kind: executor.submit(contextvars.copy_context().run, read, kind) for kind in targets}
+            versions = {kind: f.result() for kind, f in futures.items()}
+
+    record = {
+        "snapshotId": uuid.uuid4().hex[:12],
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "reason": reason,
+        "edgercSection": session_section(session),
+        "accountSwitchKey": accountSwitchKey,
+        "contractId": config.contractId,
+        "propertyName": config.propertyManager.customerFacing.propertyName,
+        "targets": versions
+    }
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _append_lock, open(path, "ab") as f:
+        f.write(canonical(record) + b"\n")
+
+    log.info("Snapshot %s of the active versions recorded (%s).", record["snapshotId"],
+             ", ".join(f"{kind} {v['staging']}/{v['production']}" for kind, v in versions.items()) or "nothing active")
+    return record
+
+
+def find_snapshot(config, section, accountSwitchKey, snapshot_id=None, path=SNAPSHOT_FILE):
+    """
+    The snapshot with snapshot_id, else the newest one for this customer
+    property, edgerc section and account: the state before the latest
+    rollout. A rollback takes no snapshot of its own, so running it twice
+    is harmless.
+    """
+    snapshots = load_history(path)
+
+    if snapshot_id:
+        match = next((s for s in snapshots if s.get("snapshotId") == snapshot_id), None)
+        if match is None:
+            raise Exception(f"Snapshot {snapshot_id} not found in {path}")
+        return match
+
+    for snapshot in reversed(snapshots):
+        if snapshot.get("edgercSection") == section \
+                and snapshot.get("accountSwitchKey") == accountSwitchKey \
+                and snapshot.get("contractId") == config.contractId \
+                and snapshot.get("propertyName") == config.propertyManager.customerFacing.propertyName:
+            return snapshot
+
+    raise Exception(f"No snapshot for {config.propertyManager.customerFacing.propertyName} "
+                    f"(edgerc section {section}) in {path}")
+
+
+# ============================================================
+# ROLLBACK
+# ============================================================
+@traced()
+def run_rollback(session, baseurl, config, snapshot, network, accountSwitchKey, verbose):
+    """
+    Re-activates the snapshot's versions on `network`, all targets at once,
+    and waits until they are live. Targets that had nothing active are left
+    as they are (there is no version to go back to).
+    """
+    targets, skipped = {}, {}
+    for kind in KINDS:
+        entry = snapshot["targets"].get(kind)
+        version = entry.get(network) if entry else None
+        if version is None:
+            skipped[kind] = f"nothing was active on {network}"
+            continue
+        targets[kind] = {**{k: v for k, v in entry.items() if k not in NETWORKS}, "version": version}
+
+    log.step("Rolling back %s on %s to snapshot %s (%s)…", ", ".join(targets) or "nothing", network,
+             snapshot["snapshotId"], snapshot["timestamp"])
+
+    report = {"snapshotId": snapshot["snapshotId"], "network": network, "skipped": skipped, "activations": {}}
+    if targets:
+        report["activations"] = activate_wave(
+            session, baseurl, config, targets, tuple(targets), network, accountSwitchKey, verbose,
+            note=f"Rollback to snapshot {snapshot['snapshotId']}"
+        )
+
+    failed = [kind for kind, r in report["activations"].items() if r["status"] == "failed"]
+    if failed:
+        raise RollbackError(f"Rollback on {network} failed: {', '.join(failed)}", report)
+    return report
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import uuid
+import argparse
+import threading
+import datetime
+import statistics
+
+from stats import percentile
+from json_codec import canonical, digest, loads
+
+
+# ============================================================
+# STORE
+# ============================================================
+# history/runs.jsonl gets one compact line per run and is only ever appended
+# to. Full result payloads are kept only with --history-full, stored once
+# per content hash under history/payloads/.
+HISTORY_FILE = "history/runs.jsonl"
+PAYLOAD_DIR = "history/payloads"
+
+# result.json key -> span name of the workflow in result["trace"]["steps"]
+STEP_SPANS = {
+    "gtm": "run_gtm_workflow",
+    "propertyManager": "run_pm_workflow",
+    "edgeworker": "run_edgeworker_workflow",
+    "harperRule": "run_harper_redirect_earlyhints_workflow",
+    "killSwitch": "run_harper_kill_switch_workflow",
+    "propertyActivation": "activate_property",
+    "edgeworkerActivation": "activate_edgeworker",
+    "promotion": "run_promotion",
+    "rollback": "run_rollback"
+}
+
+# Scalar fields worth keeping in the compact summary (top level or one
+# dict below, e.g. activation.activationLink)
+SUMMARY_KEYS = (
+    "propertyId", "version", "newVersion", "baseVersion", "cpcodeId",
+    "edgeWorkerId", "activationLink", "activationId", "network",
+    "harperEnabled", "timeoutOverrideMs", "originProfile",
+    "compressedBytes", "uncompressedBytes"
+)
+
+# concurrent daemon jobs append to the same file
+_append_lock = threading.Lock()
+
+
+def content_hash(encoded):
+    return digest(encoded)
+
+
+def summarize_payload(payload):
+    summary = {}
+    if not isinstance(payload, dict):
+        return summary
+
+    for key, value in payload.items():
+        if key in SUMMARY_KEYS and not isinstance(value, (dict, list)):
+            summary[key] = value
+        elif isinstance(value, dict):
+            for sub, sub_value in value.items():
+                if sub in SUMMARY_KEYS and not isinstance(sub_value, (dict, list)):
+                    summary[f"{key}.{sub}"] = sub_value
+
+    if isinstance(payload.get("canary"), list):
+        summary["canarySteps"] = [c.get("percent") for c in payload["canary"]]
+    return summary
+
+
+def compact_run(results, run_id=None):
+    """One history line: per-step IDs, versions, durations and hashes."""
+    durations = {s["name"]: s["durationMs"] for s in results.get("trace", {}).get("steps", [])}
+
+    steps = {}
+    for key, span_name in STEP_SPANS.items():
+        payload = results.get(key)
+        error = results.get(f"{key}_error")
+        if payload is None and error is None:
+            continue
+
+        step = {"ok": error is None, "durationMs": durations.get(span_name)}
+        if payload is not None:
+            encoded = canonical(payload)
+            step["hash"] = content_hash(encoded)
+            step["bytes"] = len(encoded)
+            step.update(summarize_payload(payload))
+        if error is not None:
+            step["error"] = str(error)[:500]
+        steps[key] = step
+
+    endpoints = {
+        name: {k: e[k] for k in ("count", "errors", "retries", "totalMs", "p50Ms", "maxMs")}
+        for name, e in results.get("trace", {}).get("endpoints", {}).items()
+    }
+
+    return {
+        "runId": run_id or uuid.uuid4().hex[:12],
+        "timestamp": results.get("timestamp") or datetime.datetime.utcnow().isoformat() + "Z",
+        "propertyId": results.get("customerFacingPropertyId"),
+        "ok": all(s["ok"] for s in steps.values()),
+        "totalMs": results.get("trace", {}).get("totalMs"),
+        "steps": steps,
+        "endpoints": endpoints
+    }
+
+
+def append_run_history(results, full=False, path=HISTORY_FILE, payload_dir=PAYLOAD_DIR):
+    """Appends the compact record; with full=True also stores the whole payload once per hash."""
+    record = compact_run(results)
+
+    if full:
+        encoded = canonical(results)
+        os.makedirs(payload_dir, exist_ok=True)
+        payload_path = os.path.join(payload_dir, f"{content_hash(encoded)}.json")
+        if not os.path.exists(payload_path):
+            with open(payload_path, "wb") as f:
+                f.write(encoded)
+        record["payload"] = payload_path
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _append_lock, open(path, "ab") as f:
+        f.write(canonical(record) + b"\n")
+
+    return record
+
+
+def load_history(path=HISTORY_FILE, since=None):
+    runs = []
+    if not os.path.exists(path):
+        return runs
+
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                run = loads(line)
+            except ValueError:
+                # a crash mid-append leaves at most one torn last line
+                continue
+            if since and run.get("timestamp", "") < since:
+                continue
+            runs.append(run)
+    return runs
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+def step_trends(runs):
+    """Per step: runs, failure rate, duration p50 / p90 / last."""
+    out = {}
+    for run in runs:
+        for name, step in run.get("steps", {}).items():
+            entry = out.setdefault(name, {"runs": 0, "failures": 0, "durations": []})
+            entry["runs"] += 1
+            entry["failures"] += 0 if step.get("ok") else 1
+            if step.get("durationMs") is not None:
+                entry["durations"].append(step["durationMs"])
+
+    for name, entry in out.items():
+        d = entry.pop("durations")
+        entry["failureRate"] = round(entry["failures"] / entry["runs"], 4)
+        entry["p50Ms"] = round(statistics.median(d), 2) if d else None
+        entry["p90Ms"] = round(percentile(sorted(d), 90), 2) if d else None
+        entry["lastMs"] = d[-1] if d else None
+    return out
+
+
+def endpoint_failures(runs):
+    """Per endpoint template: calls, errors, retries, error rate, mean latency."""
+    out = {}
+    for run in runs:
+        for name, e in run.get("endpoints", {}).items():
+            entry = out.setdefault(name, {"calls": 0, "errors": 0, "retries": 0, "totalMs": 0.0})
+            entry["calls"] += e.get("count", 0)
+            entry["errors"] += e.get("errors", 0)
+            entry["retries"] += e.get("retries", 0)
+            entry["totalMs"] += e.get("totalMs") or 0
+
+    for entry in out.values():
+        entry["errorRate"] = round(entry["errors"] / entry["calls"], 4) if entry["calls"] else None
+        entry["meanMs"] = round(entry.pop("totalMs") / entry["calls"], 2) if entry["calls"] else None
+    return dict(sorted(out.items(), key=lambda kv: -(kv[1]["errorRate"] or 0)))
+
+
+def step_series(runs, step):
+    """Duration of one step over time."""
+    return [
+        {"timestamp": r["timestamp"], "runId": r["runId"],
+         "durationMs": r["steps"][step].get("durationMs"), "ok": r["steps"][step].get("ok")}
+        for r in runs if step in r.get("steps", {})
+    ]
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Query the append-only run history")
+    parser.add_argument("query", choices=["runs", "steps", "endpoints", "series"])
+    parser.add_argument("--step", help="Step name for 'series' (e.g. propertyManager)")
+    parser.add_argument("--since", help="Only runs at or after this ISO timestamp (e.g. 2025-12-01)")
+    parser.add_argument("--last", type=int, default=20, help="Rows for 'runs' / 'series'")
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    runs = load_history(args.history, args.since)
+    if not runs:
+        print(f"[INFO] No runs in {args.history}")
+        return
+
+    if args.query == "runs":
+        data = runs[-args.last:]
+        if args.json:
+            print(json.dumps(data, indent=2))
+            return
+        for r in data:
+            steps = " ".join(f"{k}={'ok' if s['ok'] else 'FAIL'}" for k, s in r["steps"].items())
+            print(f"{r['timestamp']}  {r['runId']}  {r.get('totalMs') or '-':>10}ms  {steps}")
+
+    elif args.query == "steps":
+        data = step_trends(runs)
+        if args.json:
+            print(json.dumps(data, indent=2))
+            return
+        print(f"{'step':<18} {'runs':>5} {'fail%':>7} {'p50':>10} {'p90':>10} {'last':>10}")
+        for name, e in data.items():
+            print(f"{name:<18} {e['runs']:>5} {e['failureRate']:>7.1%} {e['p50Ms'] or '-':>10} "
+                  f"{e['p90Ms'] or '-':>10} {e['lastMs'] or '-':>10}")
+
+    elif args.query == "endpoints":
+        data = endpoint_failures(runs)
+        if args.json:
+            print(json.dumps(data, indent=2))
+            return
+        print(f"{'calls':>6} {'err%':>7} {'retries':>8} {'mean':>9}  endpoint")
+        for name, e in data.items():
+            print(f"{e['calls']:>6} {e['errorRate'] or 0:>7.1%} {e['retries']:>8} {e['meanMs'] or 0:>7.1f}ms  {name}")
+
+    elif args.query == "series":
+        if not args.step:
+            print("[ERROR] 'series' needs --step")
+            sys.exit(1)
+        data = step_series(runs, args.step)[-args.last:]
+        if args.json:
+            print(json.dumps(data, indent=2))
+            return
+        for row in data:
+            print(f"{row['timestamp']}  {row['runId']}  {row['durationMs'] or '-':>10}ms  {'ok' if row['ok'] else 'FAIL'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import time
+import functools
+import threading
+
+from helpers import init_edgegrid_session
+from tracing import instrument_session, span
+from log import get_logger
+
+log = get_logger("sessions")
+
+
+# ============================================================
+# ACCOUNT-BOUND SESSIONS
+# ============================================================
+# One authenticated session per (edgerc section, accountSwitchKey), shared by
+# every job for that account: ~/.edgerc is read once, TLS connections to the
+# API host are pooled, and the account's calls are capped at max_concurrent
+# in flight no matter how many jobs use it. Different accounts never wait
+# for each other.
+DEFAULT_SECTION = "default"
+# above one run's own concurrency (prefetch workers + the workflow)
+DEFAULT_MAX_CONCURRENT = 8
+
+
+def bind_account(session, accountSwitchKey=None, max_concurrent=DEFAULT_MAX_CONCURRENT, section=DEFAULT_SECTION):
+    """
+    Wraps session.request: every call carries accountSwitchKey (unless the
+    caller already set one) and waits for one of max_concurrent slots.
+    Sizes the connection pool to match, so no slot opens a new connection.
+    `section` is the edgerc section the session authenticates with; the
+    caches key on it (see caches.session_section).
+    """
+    from requests.adapters import HTTPAdapter  # requests is loaded by then
+
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent))
+
+    request = session.request
+    slots = threading.BoundedSemaphore(max_concurrent)
+    stats = {"calls": 0, "inFlight": 0, "peakInFlight": 0, "waits": 0, "waitedMs": 0.0}
+    lock = threading.Lock()
+
+    @functools.wraps(request)
+    def account_request(method, url, params=None, **kwargs):
+        if accountSwitchKey:
+            params = dict(params or {})
+            params.setdefault("accountSwitchKey", accountSwitchKey)
+
+        if not slots.acquire(blocking=False):
+            started = time.perf_counter()
+            with span("account_slot", kind="wait", maxConcurrent=max_concurrent):
+                slots.acquire()
+            with lock:
+                stats["waits"] += 1
+                stats["waitedMs"] += (time.perf_counter() - started) * 1000
+
+        with lock:
+            stats["calls"] += 1
+            stats["inFlight"] += 1
+            stats["peakInFlight"] = max(stats["peakInFlight"], stats["inFlight"])
+        try:
+            return request(method, url, params=params, **kwargs)
+        finally:
+            with lock:
+                stats["inFlight"] -= 1
+            slots.release()
+
+    session.request = account_request
+    session.accountSwitchKey = accountSwitchKey
+    session.edgercSection = section or DEFAULT_SECTION
+    session.maxConcurrent = max_concurrent
+    session.accountStats = stats
+    return session
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+class SessionRegistry:
+    """
+    (section, accountSwitchKey) -> (session, baseurl), created on first use.
+    `limits` overrides max_concurrent per accountSwitchKey.
+    """
+
+    def __init__(self, factory=init_edgegrid_session, max_concurrent=DEFAULT_MAX_CONCURRENT, limits=None):
+        self.factory = factory
+        self.max_concurrent = max_concurrent
+        self.limits = dict(limits or {})
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def get(self, config, section=None, accountSwitchKey=None):
+        key = (section or DEFAULT_SECTION, accountSwitchKey)
+
+        with self.lock:
+            entry = self.sessions.get(key)
+            if entry is None:
+                session, baseurl = self.factory(config, section=key[0])
+                limit = self.limits.get(accountSwitchKey, self.max_concurrent)
+                session = instrument_session(bind_account(session, accountSwitchKey, limit, key[0]))
+                entry = self.sessions[key] = (session, baseurl)
+                log.info("EdgeGrid session for %s initialized (%s concurrent calls).", describe(*key), limit)
+
+        return entry
+
+    def stats(self):
+        with self.lock:
+            entries = list(self.sessions.items())
+        return [
+            {"section": section, "accountSwitchKey": ask, "maxConcurrent": session.maxConcurrent,
+             **{k: round(v, 1) if isinstance(v, float) else v for k, v in session.accountStats.items()}}
+            for (section, ask), (session, _) in entries
+        ]
+
+    def close(self):
+        with self.lock:
+            entries, self.sessions = list(self.sessions.values()), {}
+        for session, _ in entries:
+            session.close()
+
+
+def describe(section, accountSwitchKey):
+    return f"[{section}]" + (f" account {accountSwitchKey}" if accountSwitchKey else "")
@@ -0,0 +1,182 @@
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import traced, span
+from log import get_logger
+
+log = get_logger("smoke")
+
+
+# ============================================================
+# SMOKE CHECKS
+# ============================================================
+# Plain HTTP requests against the customer hostnames after an activation:
+# a status, optional headers and an optional body fragment per check. A
+# check is retried a few times, because a version reported ACTIVE can take
+# a moment to reach every edge server. They run concurrently, outside the
+# EdgeGrid session (no credentials, no accountSwitchKey).
+NETWORKS = ("staging", "production")
+METHODS = ("GET", "HEAD")
+
+DEFAULT_TIMEOUT_MS = 5000
+DEFAULT_RETRIES = 2
+RETRY_DELAY_S = 2
+DEFAULT_WORKERS = 4
+
+
+def resolve_smoke_checks(checks):
+    """
+    promotion.smokeChecks → list of normalized checks:
+
+        {"name": "harper redirect", "url": "https://www.example.com/old-page",
+         "stagingUrl": "https://www.example.com.edgesuite-staging.net/old-page",
+         "method": "GET", "headers": {"Host": "www.example.com"},
+         "expectStatus": [301], "expectHeaders": {"location": "/new"},
+         "expectBodyContains": null, "networks": ["staging", "production"]}
+
+    name and url are required, and stagingUrl too for a check that runs on
+    staging (the default): staging checks only ever use stagingUrl, as url
+    still serves the old production version. expectStatus defaults to [200].
+    """
+    if checks is None:
+        return []
+    if not isinstance(checks, list):
+        raise Exception(f"smokeChecks must be a list of checks, got {checks!r}")
+
+    resolved, names = [], set()
+    for i, check in enumerate(checks):
+        where = f"smokeChecks[{i}]"
+        if not isinstance(check, dict):
+            raise Exception(f"{where} must be an object, got {check!r}")
+
+        name = check.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise Exception(f"{where}.name: required non-empty string")
+        if name in names:
+            raise Exception(f"{where}.name: duplicate check name {name!r}")
+        names.add(name)
+
+        for key in ("url", "stagingUrl"):
+            url = check.get(key)
+            if (key == "url" or url is not None) and (not isinstance(url, str) or not url.startswith(("http://", "https://"))):
+                raise Exception(f"{where}.{key}: must be an http(s) URL, got {url!r}")
+
+        method = str(check.get("method", "GET")).upper()
+        if method not in METHODS:
+            raise Exception(f"{where}.method: must be one of {', '.join(METHODS)}, got {method!r}")
+
+        status = check.get("expectStatus", [200])
+        status = [status] if isinstance(status, int) and not isinstance(status, bool) else status
+        if not isinstance(status, list) or not status or \
+                any(isinstance(s, bool) or not isinstance(s, int) or not 100 <= s <= 599 for s in status):
+            raise Exception(f"{where}.expectStatus: must be an HTTP status or a list of them, got {status!r}")
+
+        for key in ("headers", "expectHeaders"):
+            value = check.get(key, {})
+            if not isinstance(value, dict) or any(not isinstance(v, str) for v in value.values()):
+                raise Exception(f"{where}.{key}: must be an object of strings, got {value!r}")
+
+        body = check.get("expectBodyContains")
+        if body is not None and (not isinstance(body, str) or method == "HEAD"):
+            raise Exception(f"{where}.expectBodyContains: must be a string (and not with HEAD), got {body!r}")
+
+        networks = check.get("networks", list(NETWORKS))
+        if not isinstance(networks, list) or not networks or any(n not in NETWORKS for n in networks):
+            raise Exception(f"{where}.networks: must be a list of {' / '.join(NETWORKS)}, got {networks!r}")
+        if "staging" in networks and check.get("stagingUrl") is None:
+            raise Exception(f"{where}.stagingUrl: required for a check that runs on staging "
+                            f"(url reaches production), or set networks to [\"production\"]")
+
+        resolved.append({
+            "name": name,
+            "url": check["url"],
+            "stagingUrl": check.get("stagingUrl"),
+            "method": method,
+            "headers": dict(check.get("headers", {})),
+            "expectStatus": list(status),
+            "expectHeaders": dict(check.get("expectHeaders", {})),
+            "expectBodyContains": body,
+            "networks": list(networks)
+        })
+
+    return resolved
+
+
+def check_response(check, resp):
+    """The problems with one response; empty when the check passes."""
+    problems = []
+
+    if resp.status_code not in check["expectStatus"]:
+        problems.append(f"status {resp.status_code}, expected {' or '.join(map(str, check['expectStatus']))}")
+
+    for name, fragment in check["expectHeaders"].items():
+        value = resp.headers.get(name)
+        if value is None:
+            problems.append(f"header {name} missing")
+        elif fragment not in value:
+            problems.append(f"header {name}: {value!r} does not contain {fragment!r}")
+
+    fragment = check["expectBodyContains"]
+    if fragment is not None and fragment not in resp.text:
+        problems.append(f"body does not contain {fragment!r}")
+
+    return problems
+
+
+def run_smoke_check(http, check, network, timeout_ms=DEFAULT_TIMEOUT_MS, retries=DEFAULT_RETRIES):
+    url = check["stagingUrl"] if network == "staging" else check["url"]
+    result = {"name": check["name"], "url": url}
+
+    with span(f"smoke {check['name']}", network=network, url=url):
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(RETRY_DELAY_S * attempt)
+
+            started = time.perf_counter()
+            try:
+                resp = http.request(check["method"], url, headers=dict(check["headers"]),
+                                    timeout=timeout_ms / 1000, allow_redirects=False)
+                problems = check_response(check, resp)
+                result["status"] = resp.status_code
+            except Exception as e:
+                problems = [f"request failed: {e}"]
+
+            result.update(attempts=attempt + 1, ms=round((time.perf_counter() - started) * 1000, 1))
+            if not problems:
+                break
+            log.debug("Smoke check %s on %s, attempt %s: %s", check["name"], network, attempt + 1, "; ".join(problems))
+
+    result["passed"] = not problems
+    if problems:
+        result["problems"] = problems
+        log.error("Smoke check %s failed on %s: %s", check["name"], network, "; ".join(problems))
+    else:
+        log.success("Smoke check %s passed on %s", check["name"], network)
+    return result
+
+
+@traced()
+def run_smoke_checks(checks, network, timeout_ms=DEFAULT_TIMEOUT_MS, retries=DEFAULT_RETRIES,
+                     workers=DEFAULT_WORKERS):
+    """
+    Runs the checks meant for `network` concurrently and returns {"network", "passed", "checks": [...], "failed": [names]}.
+    """
+    import requests
+
+    checks = [c for c in checks if network in c["networks"]]
+    if not checks:
+        log.info("No smoke checks for %s.", network)
+        return {"network": network, "passed": True, "checks": [], "failed": []}
+
+    log.step("Running %s smoke check(s) on %s…", len(checks), network)
+
+    with requests.Session() as http, \
+            ThreadPoolExecutor(max_workers=min(workers, len(checks)), thread_name_prefix="smoke") as executor:
+        # each check runs in a copy of this context: same tracer and job log
+        futures = [executor.submit(contextvars.copy_context().run, run_smoke_check,
+                                   http, c, network, timeout_ms, retries) for c in checks]
+        results = [f.result() for f in futures]
+
+    failed = [r["name"] for r in results if not r["passed"]]
+    return {"network": network, "passed": not failed, "checks": results, "failed": failed}
@@ -0,0 +1,16 @@
+import math
+
+
+# ============================================================
+# PERCENTILES (shared by the tracer, the replay harness, the
+# timeout calibrator and the run history)
+# ============================================================
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list: the smallest value
+    with at least pct% of the samples at or below it. None when empty.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
@@ -0,0 +1,228 @@
+import re
+import sys
+import json
+import math
+import argparse
+
+from stats import percentile as nearest_rank
+from helpers import load_requirements, get_subrequest_timeout_ms
+
+
+# ============================================================
+# LOAD LATENCY SAMPLES
+# ============================================================
+LATENCY_KEYS = ("latencyMs", "latency_ms", "durationMs", "duration_ms")
+# failed subrequests (connection errors, non-200 answers) end early and say
+# nothing about how long Harper takes to answer
+SKIPPED_OUTCOMES = ("error", "localRedirect")
+
+def load_latency_samples(paths):
+    """
+    Reads Harper latency samples from one or more files. Each line is either
+    a bare number (ms) or a JSON object with latencyMs (or latency_ms /
+    durationMs). Lines with "censored": true (timeouts written by
+    replay_harness.py --samples-out) only tell us latency >= that value;
+    lines whose outcome is in SKIPPED_OUTCOMES are not latency samples.
+
+    Returns (observed, censored) as sorted lists of milliseconds.
+    """
+    observed = []
+    censored = []
+
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+
+                if line.startswith("{"):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("outcome") in SKIPPED_OUTCOMES:
+                        continue
+                    value = next((entry[k] for k in LATENCY_KEYS if k in entry), None)
+                    is_censored = bool(entry.get("censored"))
+                else:
+                    value = line.split(",")[0]
+                    is_censored = False
+
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+
+                (censored if is_censored else observed).append(value)
+
+    observed.sort()
+    censored.sort()
+    return observed, censored
+
+
+# ============================================================
+# TRADE-OFF MODEL
+# ============================================================
+def evaluate_timeout(observed, censored, timeout_ms):
+    """
+    For a candidate timeout: the share of Harper answers that would arrive
+    too late (lost redirects / hints) and the TTFB the subrequest adds.
+    Censored samples are counted as lost (pessimistic).
+    """
+    total = len(observed) + len(censored)
+    if not total:
+        raise Exception("No latency samples to evaluate")
+
+    late = sum(1 for v in observed if v > timeout_ms) + len(censored)
+    added = sum(min(v, timeout_ms) for v in observed) + timeout_ms * len(censored)
+
+    return {
+        "timeoutMs": timeout_ms,
+        "lossRate": round(late / total, 5),
+        "meanAddedTtfbMs": round(added / total, 2),
+        "worstCaseAddedTtfbMs": timeout_ms
+    }
+
+
+def recommend_timeout(observed, censored, percentile=99.0, headroom_ms=10,
+                      step_ms=10, min_ms=50, max_ms=1000):
+    """
+    Recommends the smallest timeout (rounded up to step_ms) that still answers
+    `percentile` percent of Harper requests, plus headroom for the edge's own
+    scheduling. Clamped to [min_ms, max_ms].
+    """
+    if not observed:
+        raise Exception("No uncensored latency samples — re-run the replay with a larger --timeout-ms")
+
+    warnings = []
+    total = len(observed) + len(censored)
+    censored_share = len(censored) / total
+
+    if censored_share > (100.0 - percentile) / 100.0:
+        warnings.append(
+            f"{censored_share:.2%} of samples timed out, so p{percentile:g} is not observable; "
+            f"re-measure with a larger timeout"
+        )
+        # Best lower bound: the smallest censoring value
+        observed_pct = censored[0]
+    else:
+        # Censored samples sit above every observed value of the same run
+        observed_pct = nearest_rank(observed + [math.inf] * len(censored), percentile)
+
+    timeout_ms = int(math.ceil((observed_pct + headroom_ms) / step_ms) * step_ms)
+
+    if timeout_ms > max_ms:
+        warnings.append(f"p{percentile:g} + headroom ({timeout_ms}ms) exceeds max {max_ms}ms; clamped")
+    timeout_ms = max(min_ms, min(max_ms, timeout_ms))
+
+    all_values = observed + censored
+    candidates = sorted({
+        max(min_ms, min(max_ms, int(math.ceil(nearest_rank(observed, p) / step_ms) * step_ms)))
+        for p in (50, 90, 95, 99, 99.9)
+    } | {timeout_ms})
+
+    return {
+        "samples": len(all_values),
+        "censoredSamples": len(censored),
+        "percentile": percentile,
+        "observedPercentileMs": round(observed_pct, 2),
+        "headroomMs": headroom_ms,
+        "recommendedTimeoutMs": timeout_ms,
+        "recommended": evaluate_timeout(observed, censored, timeout_ms),
+        "tradeoff": [evaluate_timeout(observed, censored, c) for c in candidates],
+        "warnings": warnings
+    }
+
+
+# ============================================================
+# CLI
+# ============================================================
+def update_requirements_timeout(timeout_ms, filename="requirements.json"):
+    """
+    Sets edgeworker.subrequestTimeoutMs in place: only that value changes
+    (or one line is added for it), the rest of the file keeps its layout.
+    """
+    with open(filename, "r") as f:
+        text = f.read()
+
+    section = re.search(r'"edgeworker"\s*:\s*\{', text)
+    if section is None:
+        raise Exception(f"No edgeworker object in {filename}")
+    start = section.end() - 1
+    _, end = json.JSONDecoder().raw_decode(text, start)
+
+    body = text[start:end]
+    field = re.search(r'("subrequestTimeoutMs"\s*:\s*)[^,\s}]+', body)
+    if field:
+        body = body[:field.start()] + field.group(1) + str(timeout_ms) + body[field.end():]
+    else:
+        member = re.match(r"\{(\s*)(?=\S)", body)
+        if body[member.end()] == "}":
+            body = "{" + f'"subrequestTimeoutMs": {timeout_ms}' + body[member.start(1):]
+        else:
+            # first member, with the indentation of the one after it
+            body = "{" + member.group(1) + f'"subrequestTimeoutMs": {timeout_ms},' + body[1:]
+    updated = text[:start] + body + text[end:]
+
+    if json.loads(updated).get("edgeworker", {}).get("subrequestTimeoutMs") != timeout_ms:
+        raise Exception(f"Could not update edgeworker.subrequestTimeoutMs in {filename}")
+
+    with open(filename, "w") as f:
+        f.write(updated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend the EdgeWorker → Harper subrequest timeout from measured latency")
+    parser.add_argument("--samples", nargs="+", required=True, help="Latency sample files (replay_harness.py --samples-out or recorded logs)")
+    parser.add_argument("--percentile", type=float, default=99.0, help="Share of Harper answers the timeout must keep")
+    parser.add_argument("--headroom-ms", type=int, default=10)
+    parser.add_argument("--step-ms", type=int, default=10)
+    parser.add_argument("--min-ms", type=int, default=50)
+    parser.add_argument("--max-ms", type=int, default=1000)
+    parser.add_argument("--output", help="Write the recommendation JSON here")
+    parser.add_argument("--update-requirements", action="store_true", help="Write the recommendation to edgeworker.subrequestTimeoutMs")
+    args = parser.parse_args()
+
+    observed, censored = load_latency_samples(args.samples)
+
+    try:
+        rec = recommend_timeout(
+            observed, censored, args.percentile, args.headroom_ms,
+            args.step_ms, args.min_ms, args.max_ms
+        )
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+    try:
+        current = get_subrequest_timeout_ms(load_requirements())
+        rec["current"] = evaluate_timeout(observed, censored, current)
+    except Exception:
+        current = None
+
+    print(f"\n{'timeout':>9} {'lost':>8} {'mean added':>11} {'worst added':>12}")
+    rows = rec["tradeoff"] + ([rec["current"]] if current and current not in [t["timeoutMs"] for t in rec["tradeoff"]] else [])
+    for row in sorted(rows, key=lambda r: r["timeoutMs"]):
+        marks = " <- recommended" if row["timeoutMs"] == rec["recommendedTimeoutMs"] else ""
+        marks += " <- current" if row["timeoutMs"] == current else ""
+        print(f"{row['timeoutMs']:>7}ms {row['lossRate']:>8.2%} {row['meanAddedTtfbMs']:>9.1f}ms {row['worstCaseAddedTtfbMs']:>10}ms{marks}")
+
+    for warning in rec["warnings"]:
+        print(f"[WARNING] {warning}")
+
+    print(f"\n[INFO] Recommended subrequestTimeoutMs = {rec['recommendedTimeoutMs']} "
+          f"(p{args.percentile:g} = {rec['observedPercentileMs']}ms + {args.headroom_ms}ms headroom)")
+
+    if args.update_requirements:
+        update_requirements_timeout(rec["recommendedTimeoutMs"])
+        print("[SUCCESS] requirements.json updated (edgeworker.subrequestTimeoutMs)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rec, f, indent=4)
+        print(f"[SUCCESS] Recommendation written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
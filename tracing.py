@@ -0,0 +1,349 @@
+import re
+import time
+import functools
+import contextvars
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from stats import percentile
+from json_codec import write_file
+
+
+# ============================================================
+# SPANS
+# ============================================================
+# One trace per run. Workflow steps (@traced / span()) and every HTTP call on
+# an instrumented session become spans; HTTP spans hang under whichever step
+# was open on that thread. Without an active trace everything is a no-op.
+
+HISTOGRAM_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class Span:
+    __slots__ = ("name", "kind", "attrs", "start", "end", "parent", "children", "thread")
+
+    def __init__(self, name, kind, attrs, start, parent):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.start = start
+        self.end = None
+        self.parent = parent
+        self.children = []
+        self.thread = threading.get_ident()
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Tracer:
+
+    def __init__(self, name="run"):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.root = Span(name, "run", {}, time.perf_counter(), None)
+        self.spans = [self.root]
+
+    def current(self):
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else self.root
+
+    def open(self, name, kind, attrs):
+        parent = self.current()
+        s = Span(name, kind, attrs, time.perf_counter(), parent)
+        with self.lock:
+            parent.children.append(s)
+            self.spans.append(s)
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        self.local.stack.append(s)
+        return s
+
+    def close(self, s):
+        s.end = time.perf_counter()
+        if self.local.stack and self.local.stack[-1] is s:
+            self.local.stack.pop()
+
+
+# The active tracer is per context, so concurrent jobs (harper_daemon.py)
+# each trace into their own run.
+_active = contextvars.ContextVar("active_tracer", default=None)
+
+
+def start_trace(name="run"):
+    tracer = Tracer(name)
+    _active.set(tracer)
+    return tracer
+
+
+def stop_trace():
+    tracer = _active.get()
+    _active.set(None)
+    if tracer:
+        tracer.root.end = time.perf_counter()
+    return tracer
+
+
+@contextmanager
+def span(name, kind="step", **attrs):
+    tracer = _active.get()
+    if tracer is None:
+        yield None
+        return
+
+    s = tracer.open(name, kind, attrs)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        tracer.close(s)
+
+
+def traced(name=None, kind="step"):
+    """Decorator: runs the function inside a span named after it."""
+    def decorate(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ============================================================
+# HTTP INSTRUMENTATION
+# ============================================================
+ENDPOINT_TEMPLATES = [
+    (r"^/papi/", [
+        (r"/prp_\d+", "/{propertyId}"),
+        (r"/versions/\d+", "/versions/{version}"),
+        (r"/activations/atv_\d+", "/activations/{activationId}"),
+        (r"/cpcodes/cpc_\d+", "/cpcodes/{cpcodeId}")
+    ]),
+    (r"^/config-gtm/", [
+        (r"^/config-gtm/v1/domains/[^/]+", "/config-gtm/v1/domains/{domain}"),
+        (r"/datacenters/\d+", "/datacenters/{datacenterId}"),
+        (r"/properties/[^/]+", "/properties/{property}")
+    ]),
+    (r"^/edgeworkers/", [
+        (r"/ids/\d+", "/ids/{edgeWorkerId}"),
+        (r"/versions/[^/]+", "/versions/{version}"),
+        (r"/activations/\d+", "/activations/{activationId}")
+    ])
+]
+
+
+def endpoint_template(path):
+    """/papi/v1/properties/prp_1/versions/3/rules -> /papi/v1/properties/{propertyId}/versions/{version}/rules"""
+    for prefix, substitutions in ENDPOINT_TEMPLATES:
+        if re.match(prefix, path):
+            for pattern, repl in substitutions:
+                path = re.sub(pattern, repl, path)
+            return path
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+
+def body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0
+
+
+def instrument_session(session):
+    """
+    Wraps session.send so each call becomes an "http" span. A call that
+    repeats the previous call of the same step after a 429 / 5xx / network
+    error is flagged as a retry.
+    """
+    send = session.send
+
+    @functools.wraps(send)
+    def traced_send(request, **kwargs):
+        tracer = _active.get()
+        if tracer is None:
+            return send(request, **kwargs)
+
+        path = urlsplit(request.url).path
+        parent = tracer.current()
+        previous = next((c for c in reversed(parent.children) if c.kind == "http"), None)
+
+        s = tracer.open(f"{request.method} {endpoint_template(path)}", "http", {
+            "method": request.method,
+            "endpoint": endpoint_template(path),
+            "path": path,
+            "bytesOut": body_size(request.body),
+            "retry": bool(
+                previous
+                and previous.attrs.get("method") == request.method
+                and previous.attrs.get("path") == path
+                and (previous.attrs.get("status") in RETRYABLE_STATUS or "error" in previous.attrs)
+            )
+        })
+        try:
+            resp = send(request, **kwargs)
+            s.attrs["status"] = resp.status_code
+            s.attrs["bytesIn"] = len(resp.content)
+            return resp
+        except BaseException as e:
+            s.attrs["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            tracer.close(s)
+
+    session.send = traced_send
+    return session
+
+
+# ============================================================
+# SUMMARY (written into result.json)
+# ============================================================
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def endpoint_histograms(tracer):
+    grouped = {}
+    for s in tracer.spans:
+        if s.kind == "http":
+            grouped.setdefault(s.name, []).append(s)
+
+    out = {}
+    for name, spans in sorted(grouped.items()):
+        durations = sorted(ms(s.duration) for s in spans)
+        buckets = {f"le{b}": 0 for b in HISTOGRAM_BUCKETS_MS}
+        buckets["inf"] = 0
+        for d in durations:
+            key = next((f"le{b}" for b in HISTOGRAM_BUCKETS_MS if d <= b), "inf")
+            buckets[key] += 1
+
+        out[name] = {
+            "count": len(spans),
+            "errors": sum(1 for s in spans if "error" in s.attrs or s.attrs.get("status", 0) >= 400),
+            "retries": sum(1 for s in spans if s.attrs.get("retry")),
+            "bytesOut": sum(s.attrs.get("bytesOut", 0) for s in spans),
+            "bytesIn": sum(s.attrs.get("bytesIn", 0) for s in spans),
+            "totalMs": round(sum(durations), 2),
+            "p50Ms": percentile(durations, 50),
+            "p90Ms": percentile(durations, 90),
+            "p99Ms": percentile(durations, 99),
+            "maxMs": durations[-1],
+            "histogramMs": buckets
+        }
+    return out
+
+
+def critical_path(s):
+    """
+    Spans on the longest chain through s: walking back from s's end, take
+    the child that finished last, then the one that finished before that
+    child started, and so on. Sequential runs simply get every child.
+    """
+    path = []
+    t = s.end if s.end is not None else time.perf_counter()
+    remaining = sorted((c for c in s.children if c.end is not None), key=lambda c: c.end)
+
+    while remaining:
+        candidates = [c for c in remaining if c.end <= t + 1e-9]
+        if not candidates:
+            break
+        child = candidates[-1]
+        path.append(child)
+        t = child.start
+        remaining = [c for c in remaining if c.end <= t + 1e-9]
+
+    path.reverse()
+    return path
+
+
+def critical_path_breakdown(tracer):
+    """Splits the run's critical path into API, waiting and local processing time."""
+    totals = {"httpMs": 0.0, "waitMs": 0.0, "processingMs": 0.0}
+    by_endpoint = {}
+
+    def walk(s):
+        chain = critical_path(s)
+        own = s.duration - sum(c.duration for c in chain)
+
+        if s.kind == "http":
+            totals["httpMs"] += s.duration
+            by_endpoint[s.name] = by_endpoint.get(s.name, 0.0) + s.duration
+            return
+        totals["waitMs" if s.kind == "wait" else "processingMs"] += max(0.0, own)
+
+        for c in chain:
+            walk(c)
+
+    walk(tracer.root)
+
+    steps = []
+    for c in critical_path(tracer.root):
+        steps.append({"name": c.name, "durationMs": ms(c.duration),
+                      "share": round(c.duration / tracer.root.duration, 4) if tracer.root.duration else None})
+
+    return {
+        "totalMs": ms(tracer.root.duration),
+        "httpMs": ms(totals["httpMs"]),
+        "waitMs": ms(totals["waitMs"]),
+        "processingMs": ms(totals["processingMs"]),
+        "httpByEndpointMs": {k: ms(v) for k, v in sorted(by_endpoint.items(), key=lambda kv: -kv[1])},
+        "steps": steps
+    }
+
+
+def step_tree(s):
+    node = {"name": s.name, "durationMs": ms(s.duration)}
+    if "error" in s.attrs:
+        node["error"] = s.attrs["error"]
+    children = [step_tree(c) for c in s.children if c.kind != "http"]
+    http = [c for c in s.children if c.kind == "http"]
+    if http:
+        node["httpCalls"] = len(http)
+        node["httpMs"] = ms(sum(c.duration for c in http))
+    if children:
+        node["children"] = children
+    return node
+
+
+def summarize_trace(tracer):
+    return {
+        "totalMs": ms(tracer.root.duration),
+        "httpCalls": sum(1 for s in tracer.spans if s.kind == "http"),
+        "steps": [step_tree(c) for c in tracer.root.children if c.kind != "http"],
+        "endpoints": endpoint_histograms(tracer),
+        "criticalPath": critical_path_breakdown(tracer)
+    }
+
+
+# ============================================================
+# EXPORT (Chrome trace-event format: chrome://tracing, Perfetto)
+# ============================================================
+def export_trace(tracer, path):
+    origin = tracer.root.start
+    threads = {}
+    events = []
+
+    for s in tracer.spans:
+        tid = threads.setdefault(s.thread, len(threads) + 1)
+        events.append({
+            "name": s.name,
+            "cat": s.kind,
+            "ph": "X",
+            "ts": round((s.start - origin) * 1e6, 1),
+            "dur": round(s.duration * 1e6, 1),
+            "pid": 1,
+            "tid": tid,
+            "args": s.attrs
+        })
+
+    write_file(path, {"traceEvents": events, "displayTimeUnit": "ms"}, indent=False)